@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import streamlit as st
+
+from app.embedding_cache import normalize_query
+from utils.paths import CACHE_DIR
+
+
+def answer_scope(filters, answer_detail, corpus_version, search_comprehensiveness=1.0):
+    """Everything besides the prompt that an answer depends on, as one hash."""
+    query_filter = {}
+    for f in filters:
+        if f:
+            query_filter.update(f)
+    payload = json.dumps({"filter": query_filter, "detail": round(float(answer_detail), 2),
+                          "comprehensiveness": round(float(search_comprehensiveness), 2), "corpus": corpus_version}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class AnswerCache:
+    """
+    Completed BRAG answers keyed by (normalised prompt, filters, answer detail,
+    search comprehensiveness, corpus version).
+
+    A lookup first tries the exact key. If `similarity` is set and the prompt
+    embedding is given, it then accepts the closest cached prompt within the same
+    scope whose cosine similarity reaches the threshold. This is off by default:
+    preset and country-template prompts that differ only in a country or currency
+    name score above 0.97, so a threshold must be checked against such
+    near-duplicates before it is turned on. Because the corpus
+    version is part of the scope, ingesting documents makes every older answer
+    unreachable; `get` deletes those rows the first time it sees a new version.
+    """
+
+    def __init__(self, path=os.path.join(CACHE_DIR, "answers.sqlite"), ttl_seconds=24 * 3600, similarity=None):
+        self.ttl_seconds = ttl_seconds
+        self.similarity = similarity
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS answers (
+                key TEXT PRIMARY KEY,
+                scope TEXT NOT NULL,
+                corpus_version TEXT NOT NULL,
+                prompt TEXT NOT NULL,
+                embedding BLOB,
+                answer TEXT NOT NULL,
+                sources TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS answers_scope ON answers (scope)")
+        self._db.commit()
+        self._corpus_version = None
+
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(prompt, scope):
+        return hashlib.sha256(f"{scope}\0{normalize_query(prompt)}".encode()).hexdigest()
+
+    def _check_version(self, corpus_version):
+        # Caller holds self._lock
+        if corpus_version != self._corpus_version:
+            deleted = self._db.execute("DELETE FROM answers WHERE corpus_version != ?", (corpus_version,)).rowcount
+            self._db.commit()
+            if deleted:
+                print(f"Answer cache: dropped {deleted} answers from an older corpus")
+            self._corpus_version = corpus_version
+
+    def get(self, prompt, filters, answer_detail, corpus_version, search_comprehensiveness=1.0, embedding=None):
+        """Return {"answer", "sources"} for a cached answer, or None."""
+        scope = answer_scope(filters, answer_detail, corpus_version, search_comprehensiveness)
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            self._check_version(corpus_version)
+            row = self._db.execute(
+                "SELECT answer, sources FROM answers WHERE key = ? AND created_at >= ?", (self.key(prompt, scope), cutoff)
+            ).fetchone()
+            if row is not None:
+                self.hits += 1
+                return {"answer": row[0], "sources": json.loads(row[1])}
+
+            if self.similarity and embedding is not None:
+                rows = self._db.execute(
+                    "SELECT embedding, answer, sources FROM answers WHERE scope = ? AND created_at >= ? AND embedding IS NOT NULL",
+                    (scope, cutoff)
+                ).fetchall()
+                if rows:
+                    query = np.asarray(embedding, dtype=np.float32)
+                    query /= max(np.linalg.norm(query), 1e-12)
+                    cached = np.stack([np.frombuffer(r[0], dtype=np.float32) for r in rows])
+                    scores = cached @ query
+                    best = int(np.argmax(scores))
+                    if scores[best] >= self.similarity:
+                        self.similar_hits += 1
+                        return {"answer": rows[best][1], "sources": json.loads(rows[best][2])}
+
+            self.misses += 1
+            return None
+
+    def put(self, prompt, filters, answer_detail, corpus_version, answer, sources, search_comprehensiveness=1.0, embedding=None):
+        scope = answer_scope(filters, answer_detail, corpus_version, search_comprehensiveness)
+        if embedding is not None:
+            embedding = np.asarray(embedding, dtype=np.float32)
+            embedding = (embedding / max(np.linalg.norm(embedding), 1e-12)).tobytes()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO answers (key, scope, corpus_version, prompt, embedding, answer, sources, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.key(prompt, scope), scope, corpus_version, prompt, embedding, answer, json.dumps(sources, default=str), time.time())
+            )
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM answers")
+            self._db.commit()
+
+    def stats(self):
+        return {"hits": self.hits, "similar_hits": self.similar_hits, "misses": self.misses}
+
+
+def replay_answer(answer, words_per_chunk=8):
+    """Yield a cached answer in small pieces so the chat UI renders it like a live stream."""
+    pieces = re.findall(r'\S+\s*', answer)
+    for i in range(0, len(pieces), words_per_chunk):
+        yield "".join(pieces[i:i + words_per_chunk])
+
+
+def cache_completion(completion, on_complete):
+    """Pass a streamed completion through unchanged, then hand the full text to `on_complete`."""
+    text = ""
+    for response in completion:
+        if response.choices and response.choices[0].delta.content is not None:
+            text += response.choices[0].delta.content
+        yield response
+    if text:
+        on_complete(text)
+
+
+@st.cache_resource
+def get_answer_cache():
+    return AnswerCache(similarity=st.secrets.get("ANSWER_CACHE_SIMILARITY"))
@@ -0,0 +1,78 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+
+class NeighbourChunkCache:
+    """
+    LRU of chunk id -> chunk content for the prechunk/postchunk neighbours of matches.
+
+    Adjacent chunks are shared between hits on the same document and between
+    follow-up questions, so most neighbours are served without a round-trip.
+    """
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, ids):
+        found = {}
+        with self._lock:
+            for chunk_id in ids:
+                if chunk_id in self._entries:
+                    self._entries.move_to_end(chunk_id)
+                    found[chunk_id] = self._entries[chunk_id]
+            self.hits += len(found)
+            self.misses += len(ids) - len(found)
+        return found
+
+    def put_many(self, contents):
+        with self._lock:
+            for chunk_id, content in contents.items():
+                self._entries[chunk_id] = content
+                self._entries.move_to_end(chunk_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def fetch_chunk_contents(index, ids, cache=None, batch_size=100, max_workers=4):
+    """
+    Return {chunk_id: content} for `ids`, deduplicated, using one index.fetch per
+    `batch_size` ids not already in `cache` (batches run concurrently).
+    Ids the index does not know map to ''.
+    """
+    ids = list(dict.fromkeys(chunk_id for chunk_id in ids if chunk_id))
+    contents = cache.get_many(ids) if cache is not None else {}
+    missing = [chunk_id for chunk_id in ids if chunk_id not in contents]
+
+    def fetch(batch):
+        vectors = index.fetch(ids=batch)["vectors"]
+        return {chunk_id: vector.get("metadata", {}).get("content", "") for chunk_id, vector in vectors.items()}
+
+    if missing:
+        batches = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+        if len(batches) == 1:
+            fetched = [fetch(batches[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as executor:
+                fetched = list(executor.map(fetch, batches))
+        for batch_contents in fetched:
+            if cache is not None:
+                cache.put_many(batch_contents)
+            contents.update(batch_contents)
+
+    return {chunk_id: contents.get(chunk_id, "") for chunk_id in ids}
+
+
+@st.cache_resource
+def get_neighbour_chunk_cache():
+    return NeighbourChunkCache()
@@ -0,0 +1,95 @@
+import streamlit as st
+import tiktoken
+
+DEFAULT_CONTEXT_TOKENS = 12000
+DEFAULT_CONVERSATION_TOKENS = 3000
+
+
+@st.cache_resource
+def get_tokenizer(model="gpt-4o-mini"):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text, tokenizer=None):
+    return len((tokenizer or get_tokenizer()).encode(text or "", disallowed_special=()))
+
+
+def format_chunk(record, prechunk="", postchunk=""):
+    parts = [f"[{record['source_id']}] {record['title']}", ""]
+    if prechunk:
+        parts.append(prechunk)
+    parts.append(record["content"])
+    if postchunk:
+        parts.append(postchunk)
+    return "\n".join(parts) + "\n"
+
+
+def neighbour_text(records, neighbour_chars=400):
+    """
+    Return {chunk_id: (prechunk, postchunk)} with duplicated context removed: a
+    neighbour that is itself one of the retrieved chunks is dropped, and a
+    neighbour shared by two chunks (e.g. A's postchunk is C's prechunk) is kept
+    only on the first, higher-ranked chunk.
+    """
+    retrieved = {record["id"] for record in records}
+    emitted = set()
+    context = {}
+    for record in sorted(records, key=lambda r: r["rank"]):
+        pieces = []
+        for key, text, tail in (("prechunk_id", record.get("prechunk", ""), True), ("postchunk_id", record.get("postchunk", ""), False)):
+            neighbour_id = record.get(key) or ""
+            if not text or not neighbour_id or neighbour_id in retrieved or neighbour_id in emitted:
+                pieces.append("")
+                continue
+            emitted.add(neighbour_id)
+            pieces.append(text[-neighbour_chars:] if tail else text[:neighbour_chars])
+        context[record["id"]] = tuple(pieces)
+    return context
+
+
+def pack_context(records, budget=DEFAULT_CONTEXT_TOKENS, tokenizer=None, diversity_decay=0.7, neighbour_chars=400):
+    """
+    Greedily fill `budget` tokens with retrieved chunk records.
+
+    Records are taken best-first by retrieval rank, discounted by
+    `diversity_decay` for every chunk already packed from the same source, so
+    one long report cannot crowd out the others. A record that does not fit is
+    retried without its neighbour context before being dropped. Returns
+    (chunk_texts in retrieval order, stats).
+    """
+    tokenizer = tokenizer or get_tokenizer()
+    context = neighbour_text(records, neighbour_chars)
+    remaining = list(records)
+    per_source = {}
+    packed = []
+    dropped = []
+    used = 0
+
+    while remaining:
+        best = max(remaining, key=lambda r: (diversity_decay ** per_source.get(r["source_id"], 0)) / (1 + r["rank"]))
+        remaining.remove(best)
+        prechunk, postchunk = context[best["id"]]
+        for text in (format_chunk(best, prechunk, postchunk), format_chunk(best)):
+            tokens = count_tokens(text, tokenizer)
+            if used + tokens <= budget:
+                packed.append((best["rank"], text))
+                per_source[best["source_id"]] = per_source.get(best["source_id"], 0) + 1
+                used += tokens
+                break
+        else:
+            dropped.append(best["id"])
+
+    stats = {"packed": len(packed), "dropped": dropped, "tokens": used, "budget": budget}
+    return [text for _, text in sorted(packed)], stats
+
+
+def trim_conversation(conversation, budget=DEFAULT_CONVERSATION_TOKENS, tokenizer=None):
+    """Keep the most recent `budget` tokens of the conversation history."""
+    tokenizer = tokenizer or get_tokenizer()
+    tokens = tokenizer.encode(conversation or "", disallowed_special=())
+    if len(tokens) <= budget:
+        return conversation or ""
+    return tokenizer.decode(tokens[-budget:])
@@ -0,0 +1,270 @@
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+import streamlit as st
+
+from app.vector_store import list_chunk_ids, open_vector_store
+from utils.paths import CACHE_DIR
+
+# Catalog columns under the metadata names the portal already uses
+DOCUMENT_COLUMNS = "doc_id, title AS document_title, sender AS file_sender, created_at AS file_created_at, web_url, chunk_count"
+
+
+def _created_at(metadata):
+    """(ISO created_at, YYYY-MM-DD, unix seconds) from chunk metadata."""
+    created_at = metadata.get("file_created_at")
+    unix = metadata.get("file_created_at_unix")
+    if isinstance(created_at, (int, float)):
+        unix = unix if unix is not None else created_at
+        created_at = datetime.fromtimestamp(created_at, timezone.utc).isoformat()
+    created_at = str(created_at or "")
+    if unix is None and created_at:
+        try:
+            unix = datetime.fromisoformat(created_at.replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            unix = None
+    return created_at, created_at.split("T")[0], int(unix) if unix is not None else None
+
+
+class DocumentCatalog:
+    """
+    One row per ingested document (title, sender, created_at, web_url, chunk
+    count), kept in SQLite so the Research Portal can list documents without
+    downloading chunk metadata from the vector store.
+
+    A `chunks` table maps chunk ids to documents; `add_chunks` / `remove_chunks`
+    update it incrementally and recount only the documents they touch.
+    """
+
+    def __init__(self, path=os.path.join(CACHE_DIR, "documents.sqlite")):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                doc_id TEXT PRIMARY KEY,
+                title TEXT NOT NULL,
+                sender TEXT NOT NULL DEFAULT '',
+                created_at TEXT NOT NULL DEFAULT '',
+                created_date TEXT NOT NULL DEFAULT '',
+                created_at_unix INTEGER,
+                web_url TEXT NOT NULL DEFAULT '',
+                chunk_count INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS documents_created ON documents (created_date, created_at_unix);
+            CREATE INDEX IF NOT EXISTS documents_sender ON documents (sender, created_date);
+            CREATE INDEX IF NOT EXISTS documents_title ON documents (title);
+            CREATE TABLE IF NOT EXISTS chunks (
+                chunk_id TEXT PRIMARY KEY,
+                doc_id TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS chunks_doc ON chunks (doc_id);
+            CREATE TABLE IF NOT EXISTS catalog_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            """
+        )
+        self._db.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    # Updates ############################################################################
+    def chunk_ids(self):
+        with self._lock:
+            return {row[0] for row in self._db.execute("SELECT chunk_id FROM chunks")}
+
+    def add_chunks(self, chunks):
+        """Record [(chunk_id, metadata)] from the ingestion pipeline or a vector store fetch."""
+        chunk_rows = []
+        documents = {}
+        for chunk_id, metadata in chunks:
+            doc_id = metadata.get("doc_id")
+            if not doc_id:
+                continue
+            chunk_rows.append((chunk_id, doc_id))
+            created_at, created_date, unix = _created_at(metadata)
+            documents[doc_id] = (doc_id, metadata.get("document_title", ""), metadata.get("file_sender", "") or "",
+                                 created_at, created_date, unix, metadata.get("web_url", "") or "")
+        if not chunk_rows:
+            return
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO chunks (chunk_id, doc_id) VALUES (?, ?)", chunk_rows)
+            self._db.executemany(
+                """
+                INSERT INTO documents (doc_id, title, sender, created_at, created_date, created_at_unix, web_url)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (doc_id) DO UPDATE SET
+                    title = excluded.title, sender = excluded.sender, created_at = excluded.created_at,
+                    created_date = excluded.created_date, created_at_unix = excluded.created_at_unix, web_url = excluded.web_url
+                """,
+                list(documents.values())
+            )
+            self._recount(list(documents))
+            self._touch()
+            self._db.commit()
+
+    def remove_chunks(self, chunk_ids):
+        chunk_ids = list(chunk_ids)
+        with self._lock:
+            doc_ids = set()
+            for start in range(0, len(chunk_ids), 500):
+                batch = chunk_ids[start:start + 500]
+                marks = ",".join("?" * len(batch))
+                doc_ids.update(row[0] for row in self._db.execute(f"SELECT DISTINCT doc_id FROM chunks WHERE chunk_id IN ({marks})", batch))
+                self._db.execute(f"DELETE FROM chunks WHERE chunk_id IN ({marks})", batch)
+            self._recount(list(doc_ids))
+            self._db.execute("DELETE FROM documents WHERE chunk_count = 0")
+            self._touch()
+            self._db.commit()
+
+    def _recount(self, doc_ids):
+        # Caller holds self._lock
+        for start in range(0, len(doc_ids), 500):
+            batch = doc_ids[start:start + 500]
+            self._db.execute(
+                f"""
+                UPDATE documents SET chunk_count = (SELECT COUNT(*) FROM chunks WHERE chunks.doc_id = documents.doc_id)
+                WHERE doc_id IN ({",".join("?" * len(batch))})
+                """,
+                batch
+            )
+
+    def _touch(self):
+        # Caller holds self._lock
+        self._db.execute("INSERT OR REPLACE INTO catalog_meta (key, value) VALUES ('version', ?)", (str(time.time()),))
+
+    def version(self):
+        """Changes whenever documents are added or removed."""
+        with self._lock:
+            row = self._db.execute("SELECT value FROM catalog_meta WHERE key = 'version'").fetchone()
+        return row[0] if row else ""
+
+    def last_synced(self):
+        with self._lock:
+            row = self._db.execute("SELECT value FROM catalog_meta WHERE key = 'last_synced'").fetchone()
+        return float(row[0]) if row else 0.0
+
+    def mark_synced(self):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO catalog_meta (key, value) VALUES ('last_synced', ?)", (str(time.time()),))
+            self._db.commit()
+
+    # Queries ############################################################################
+    def documents(self):
+        """Every document as a dict, newest first; filtering is done by app.document_filter."""
+        with self._lock:
+            rows = self._db.execute(f"SELECT {DOCUMENT_COLUMNS} FROM documents ORDER BY created_at_unix DESC, doc_id").fetchall()
+        return [dict(row) for row in rows]
+
+    def titles(self):
+        with self._lock:
+            return [row[0] for row in self._db.execute("SELECT DISTINCT title FROM documents ORDER BY title")]
+
+    def senders(self):
+        with self._lock:
+            return [row[0] for row in self._db.execute("SELECT DISTINCT sender FROM documents WHERE sender != '' ORDER BY sender")]
+
+    def daily_counts(self):
+        """[(YYYY-MM-DD, number of documents)] in date order."""
+        with self._lock:
+            return [tuple(row) for row in self._db.execute(
+                "SELECT created_date, COUNT(*) FROM documents WHERE created_date != '' GROUP BY created_date ORDER BY created_date")]
+
+
+def sync_document_catalog(catalog, store, batch_size=100):
+    """
+    Bring the catalog in line with the vector store: fetch metadata only for chunk
+    ids it has not seen and drop chunks that were deleted. Returns (added, removed).
+    """
+    ids = list_chunk_ids(store)
+    known = catalog.chunk_ids()
+    listed = set(ids)
+    removed = [chunk_id for chunk_id in known if chunk_id not in listed]
+    if removed:
+        catalog.remove_chunks(removed)
+    new = [chunk_id for chunk_id in ids if chunk_id not in known]
+    for start in range(0, len(new), batch_size):
+        vectors = store.fetch(ids=new[start:start + batch_size])["vectors"]
+        catalog.add_chunks((chunk_id, dict(vector.get("metadata") or {})) for chunk_id, vector in vectors.items())
+    catalog.mark_synced()
+    return len(new), len(removed)
+
+
+class CatalogSync:
+    """
+    Daemon thread that keeps a DocumentCatalog in step with the vector store,
+    so neither page renders nor RAG questions wait on a full id listing. The
+    first sync runs once the last one is `interval` seconds old (straight away
+    for a fresh catalog), then every `interval` seconds.
+    """
+
+    def __init__(self, catalog, store, interval=900):
+        self.catalog = catalog
+        self.store = store
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sync_now(self):
+        """Sync in the calling thread, after any background sync already running."""
+        with self._lock:
+            added, removed = sync_document_catalog(self.catalog, self.store)
+        print(f"Document catalog: {added} chunks added, {removed} removed")
+        return added, removed
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="document-catalog-sync", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        wait = max(0.0, self.catalog.last_synced() + self.interval - time.time())
+        while not self._stop.wait(wait):
+            try:
+                self.sync_now()
+            except Exception as e:
+                print(f"Document catalog sync failed: {e}")
+            wait = self.interval
+
+
+@st.cache_resource
+def get_catalog_sync(_store):
+    """The process-wide background sync of the document catalog from `_store`."""
+    sync = CatalogSync(get_document_catalog(), _store, interval=st.secrets.get("CATALOG_SYNC_SECONDS", 900))
+    sync.start()
+    return sync
+
+
+@st.cache_resource
+def get_document_catalog():
+    return DocumentCatalog(st.secrets.get("DOCUMENT_CATALOG_PATH", os.path.join(CACHE_DIR, "documents.sqlite")))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the Research Portal document catalog")
+    parser.add_argument("command", choices=["update", "rebuild"])
+    args = parser.parse_args()
+
+    path = st.secrets.get("DOCUMENT_CATALOG_PATH", os.path.join(CACHE_DIR, "documents.sqlite"))
+    if args.command == "rebuild" and os.path.exists(path):
+        os.remove(path)
+    catalog = DocumentCatalog(path)
+    added, removed = sync_document_catalog(catalog, open_vector_store())
+    print(f"Document catalog: {added} chunks added, {removed} removed, {len(catalog)} documents")
+
+
+if __name__ == "__main__":
+    main()
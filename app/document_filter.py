@@ -0,0 +1,112 @@
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.chat_funcs import generate_chat_url
+
+NGRAM = 3
+# The BRAG summary prompt, split around the document title
+SUMMARY_PREFIX = "Provide a summary of the analysis contained within the document titled "
+SUMMARY_SUFFIX = ". Include all key points and findings."
+
+
+def ngrams(text, n=NGRAM):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class NgramIndex:
+    """
+    Lower-cased substring search over a fixed column of strings. Every n-gram
+    maps to the sorted rows containing it; a query's candidates are the
+    intersection of its n-grams' rows, confirmed with a substring check on
+    those rows only. Queries shorter than n fall back to a scan.
+    """
+
+    def __init__(self, values, n=NGRAM):
+        self.n = n
+        self.values = np.asarray([str(v or "").lower() for v in values], dtype=object)
+        postings = defaultdict(list)
+        for row, value in enumerate(self.values):
+            for gram in ngrams(value, n):
+                postings[gram].append(row)
+        self.postings = {gram: np.asarray(rows, dtype=np.int64) for gram, rows in postings.items()}
+
+    def mask(self, query):
+        query = query.lower()
+        result = np.zeros(len(self.values), dtype=bool)
+        if len(query) < self.n:
+            result[:] = [query in value for value in self.values]
+            return result
+
+        lists = []
+        for gram in ngrams(query, self.n):
+            rows = self.postings.get(gram)
+            if rows is None:
+                return result
+            lists.append(rows)
+        lists.sort(key=len)
+        candidates = lists[0]
+        for rows in lists[1:]:
+            candidates = np.intersect1d(candidates, rows, assume_unique=True)
+            if not len(candidates):
+                return result
+        result[candidates] = [query in value for value in self.values[candidates]]
+        return result
+
+
+class DocumentFilter:
+    """
+    The Research Portal's document list prepared once for interactive filtering:
+    created dates as int64 day numbers, n-gram indexes over titles and senders,
+    and title/sender columns for exact-match filters. `mask` returns a boolean
+    array; `page` builds the display columns for one slice of the matches.
+    """
+
+    def __init__(self, documents):
+        self.frame = pd.DataFrame(documents, columns=["doc_id", "document_title", "file_sender", "file_created_at", "web_url"]).fillna("")
+        dates = pd.to_datetime(self.frame["file_created_at"].str.slice(0, 10), format="%Y-%m-%d", errors="coerce")
+        self.days = dates.values.astype("datetime64[D]").astype(np.int64)
+        self.days[dates.isna().values] = np.iinfo(np.int64).min
+        self.titles = self.frame["document_title"].to_numpy(dtype=object)
+        self.senders = self.frame["file_sender"].to_numpy(dtype=object)
+        self.title_index = NgramIndex(self.titles)
+        self.sender_index = NgramIndex(self.senders)
+
+    def __len__(self):
+        return len(self.frame)
+
+    @staticmethod
+    def _day(date):
+        return np.datetime64(date, "D").astype(np.int64)
+
+    def mask(self, text=None, titles=None, senders=None, sender_text=None, start_date=None, end_date=None):
+        mask = np.ones(len(self.frame), dtype=bool)
+        if text:
+            mask &= self.title_index.mask(text)
+        if titles:
+            mask &= np.isin(self.titles, titles)
+        if sender_text:
+            mask &= self.sender_index.mask(sender_text)
+        if senders:
+            mask &= np.isin(self.senders, senders)
+        if start_date and end_date:
+            mask &= (self.days >= self._day(start_date)) & (self.days <= self._day(end_date))
+        return mask
+
+    def page(self, mask, offset=0, limit=50):
+        """Rows `offset`..`offset + limit` of the matches, with the portal's display columns."""
+        rows = np.flatnonzero(mask)[offset:offset + limit]
+        page = self.frame.iloc[rows].copy()
+        page["BRAG Summary"] = (generate_chat_url(prompt=SUMMARY_PREFIX) + page["document_title"] + SUMMARY_SUFFIX
+                                + "&doc_id=" + page["doc_id"].astype(str))
+        page["web_url"] = page["web_url"].where(page["web_url"] != "", "No URL available")
+        page["formatted_datetime"] = page["file_created_at"].str.split("T").str[0]
+        return page
+
+
+@st.cache_resource(max_entries=2)
+def get_document_filter(catalog_version, _catalog):
+    """A DocumentFilter over the whole catalog, rebuilt when the catalog changes."""
+    return DocumentFilter(_catalog.documents())
@@ -0,0 +1,148 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+import streamlit as st
+
+from utils.paths import CACHE_DIR
+
+
+def normalize_query(text):
+    """Case- and whitespace-insensitive form of a query, used as the cache key."""
+    text = unicodedata.normalize('NFKC', text or "")
+    return re.sub(r'\s+', ' ', text).strip().casefold()
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache of query embeddings keyed by (model, normalised text).
+
+    Lookups hit an in-process LRU first, then a SQLite table of float32 vectors
+    shared by every session and surviving restarts. Entries older than
+    `ttl_seconds` are treated as misses and re-embedded.
+    """
+
+    def __init__(self, path=os.path.join(CACHE_DIR, "embeddings.sqlite"), max_memory_entries=1024, ttl_seconds=7 * 24 * 3600):
+        self.max_memory_entries = max_memory_entries
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                vector BLOB NOT NULL
+            )
+            """
+        )
+        self._db.commit()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model, text):
+        return hashlib.sha256(f"{model}\0{normalize_query(text)}".encode()).hexdigest()
+
+    def get(self, model, text):
+        key = self.key(model, text)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[0] < self.ttl_seconds:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return entry[1]
+
+            row = self._db.execute("SELECT created_at, vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[0] < self.ttl_seconds:
+                vector = np.frombuffer(row[1], dtype=np.float32).tolist()
+                self._remember(key, row[0], vector)
+                self.disk_hits += 1
+                return vector
+
+            self.misses += 1
+            return None
+
+    def put(self, model, text, vector):
+        key = self.key(model, text)
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, created_at, list(vector))
+            self._db.execute(
+                "INSERT OR REPLACE INTO embeddings (key, model, created_at, vector) VALUES (?, ?, ?, ?)",
+                (key, model, created_at, np.asarray(vector, dtype=np.float32).tobytes())
+            )
+            self._db.commit()
+
+    def _remember(self, key, created_at, vector):
+        # Caller holds self._lock
+        self._memory[key] = (created_at, vector)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def purge_expired(self):
+        with self._lock:
+            self._db.execute("DELETE FROM embeddings WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+            self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "entries": entries,
+        }
+
+
+class CachedEncoder:
+    """
+    Drop-in wrapper for a semantic_router encoder: `encoder(docs)` returns one
+    vector per doc, calling the wrapped encoder once for the cache misses only.
+    """
+
+    def __init__(self, encoder, cache, model=None):
+        self.encoder = encoder
+        self.cache = cache
+        self.model = model or getattr(encoder, "name", type(encoder).__name__)
+
+    def __call__(self, docs):
+        vectors = [self.cache.get(self.model, doc) for doc in docs]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            for i, vector in zip(missing, self.encoder([docs[i] for i in missing])):
+                self.cache.put(self.model, docs[i], vector)
+                vectors[i] = vector
+        return vectors
+
+
+@st.cache_resource
+def get_embedding_cache():
+    cache = EmbeddingCache()
+    cache.purge_expired()
+    return cache
+
+
+def show_embedding_cache_stats():
+    stats = get_embedding_cache().stats()
+    st.sidebar.caption(
+        f"Embedding cache: {stats['hit_rate']:.0%} hit rate ({stats['memory_hits']} memory, "
+        f"{stats['disk_hits']} disk, {stats['misses']} misses)"
+    )
@@ -0,0 +1,216 @@
+import argparse
+import math
+import os
+import pickle
+import re
+import threading
+from collections import Counter, defaultdict
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from app.vector_store import METADATA_COLUMNS, filter_mask, list_chunk_ids, open_vector_store
+from utils.paths import CACHE_DIR
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+(?:[./][a-z0-9]+)*')
+
+
+def tokenize(text):
+    """Lower-cased word tokens; keeps tickers, pairs and decimals like 'aud/usd' or '4.35' whole."""
+    return TOKEN_PATTERN.findall((text or "").lower())
+
+
+class LexicalIndex:
+    """
+    Incremental BM25 index over chunk content and document titles.
+
+    Chunks are added or replaced one at a time (`add`, `remove`); postings are
+    kept as Python dicts while writing and compiled to numpy arrays on the first
+    search after a change. The filterable metadata columns are kept alongside so
+    searches take the same Pinecone-style filters as the vector store. Titles are
+    repeated `title_weight` times so report names weigh more than body text.
+    """
+
+    def __init__(self, k1=1.2, b=0.75, title_weight=3):
+        self.k1 = k1
+        self.b = b
+        self.title_weight = title_weight
+
+        self._lock = threading.Lock()
+        self.ids = []
+        self.rows = {}
+        self.lengths = []
+        self.row_terms = []
+        self.metadata = {column: [] for column in METADATA_COLUMNS}
+        self.postings = defaultdict(dict)
+        self._compiled = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        state['_compiled'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def add(self, chunk_id, content, title="", metadata=None):
+        terms = Counter(tokenize(content))
+        for _ in range(self.title_weight):
+            terms.update(tokenize(title))
+        metadata = metadata or {}
+        with self._lock:
+            if chunk_id in self.rows:
+                self._remove(chunk_id)
+            row = len(self.ids)
+            self.ids.append(chunk_id)
+            self.rows[chunk_id] = row
+            self.lengths.append(sum(terms.values()))
+            self.row_terms.append(list(terms))
+            for column in METADATA_COLUMNS:
+                self.metadata[column].append(metadata.get(column))
+            for term, tf in terms.items():
+                self.postings[term][row] = tf
+            self._compiled = None
+
+    def remove(self, chunk_id):
+        with self._lock:
+            self._remove(chunk_id)
+            self._compiled = None
+
+    def _remove(self, chunk_id):
+        # Caller holds self._lock. The row stays as a tombstone with no postings.
+        row = self.rows.pop(chunk_id, None)
+        if row is None:
+            return
+        for term in self.row_terms[row]:
+            postings = self.postings[term]
+            postings.pop(row, None)
+            if not postings:
+                del self.postings[term]
+        self.lengths[row] = 0
+        self.row_terms[row] = []
+
+    def _compile(self):
+        # Caller holds self._lock
+        if self._compiled is None:
+            lengths = np.asarray(self.lengths, dtype=np.float32)
+            avgdl = float(lengths.sum() / max(len(self.rows), 1)) or 1.0
+            postings = {
+                term: (np.fromiter(rows.keys(), dtype=np.int64, count=len(rows)),
+                       np.fromiter(rows.values(), dtype=np.float32, count=len(rows)))
+                for term, rows in self.postings.items()
+            }
+            self._compiled = (lengths, avgdl, postings, pd.DataFrame(self.metadata))
+        return self._compiled
+
+    def search(self, query, top_k, filter=None):
+        """Return [(chunk_id, bm25_score)] for the best `top_k` chunks matching `filter`."""
+        terms = set(tokenize(query))
+        with self._lock:
+            lengths, avgdl, postings, metadata = self._compile()
+            ids = self.ids
+        if not terms or not len(lengths):
+            return []
+
+        n = len(self.rows)
+        norm = self.k1 * (1 - self.b + self.b * lengths / avgdl)
+        scores = np.zeros(len(lengths), dtype=np.float32)
+        for term in terms:
+            if term not in postings:
+                continue
+            rows, tfs = postings[term]
+            idf = math.log(1 + (n - len(rows) + 0.5) / (len(rows) + 0.5))
+            scores[rows] += idf * tfs * (self.k1 + 1) / (tfs + norm[rows])
+
+        if filter:
+            scores[~filter_mask(metadata, filter)] = 0
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(ids[row], float(scores[row])) for row in candidates]
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._lock:
+            with open(path + ".tmp", "wb") as f:
+                pickle.dump(self, f)
+        os.replace(path + ".tmp", path)
+
+    @staticmethod
+    def load(path):
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Fuse several best-first lists of ids into [(id, score)] by sum of 1 / (k + rank)."""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, start=1):
+            scores[item_id] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def lexical_index_path():
+    return st.secrets.get("LEXICAL_INDEX_PATH", os.path.join(CACHE_DIR, "vector_store", "lexical.pkl"))
+
+
+@st.cache_resource(max_entries=1)
+def load_lexical_index(path, mtime):
+    return LexicalIndex.load(path)
+
+
+def get_lexical_index():
+    """
+    The BM25 index built next to the vector store, or None if it has not been
+    built yet. Reloaded whenever the CLI rewrites the file.
+    """
+    path = lexical_index_path()
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    return load_lexical_index(path, mtime)
+
+
+def sync_lexical_index(lexical, ids, fetch, batch_size=100):
+    """
+    Bring `lexical` in line with the vector store's chunk ids: index chunks it has
+    not seen (metadata via `fetch`, one call per batch) and drop deleted ones.
+    Returns (added, removed).
+    """
+    listed = set(ids)
+    removed = [chunk_id for chunk_id in list(lexical.rows) if chunk_id not in listed]
+    for chunk_id in removed:
+        lexical.remove(chunk_id)
+    new = [chunk_id for chunk_id in ids if chunk_id not in lexical.rows]
+    for start in range(0, len(new), batch_size):
+        vectors = fetch(new[start:start + batch_size])["vectors"]
+        for chunk_id, vector in vectors.items():
+            metadata = dict(vector.get("metadata") or {})
+            lexical.add(chunk_id, metadata.get("content", ""), metadata.get("document_title", ""), metadata)
+    return len(new), len(removed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the BM25 index next to the vector store")
+    parser.add_argument("command", choices=["update", "rebuild"])
+    args = parser.parse_args()
+
+    path = lexical_index_path()
+    lexical = LexicalIndex.load(path) if args.command == "update" and os.path.exists(path) else LexicalIndex()
+    store = open_vector_store()
+    added, removed = sync_lexical_index(lexical, list_chunk_ids(store), store.fetch)
+    lexical.save(path)
+    print(f"Lexical index: {added} chunks added, {removed} removed, {len(lexical)} total")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,59 +1,69 @@
+import asyncio
 import time
 import json
+from contextlib import contextmanager
 import unicodedata
 import re
 from semantic_router.encoders import OpenAIEncoder
-from pinecone import Pinecone, ServerlessSpec
 from openai import OpenAI
 import streamlit as st
+from app.chunk_cache import fetch_chunk_contents, get_neighbour_chunk_cache
+from app.embedding_cache import CachedEncoder, get_embedding_cache
+from app.vector_store import open_vector_store
+from app.document_catalog import get_catalog_sync
+from app.lexical_index import get_lexical_index, reciprocal_rank_fusion
+from app.answer_cache import cache_completion, get_answer_cache, replay_answer
+from app.context_packer import DEFAULT_CONTEXT_TOKENS, DEFAULT_CONVERSATION_TOKENS, count_tokens, get_tokenizer, pack_context, trim_conversation
+from app.rag_trace import get_rag_tracer
+from app.reranker import get_reranker
 
 @st.cache_resource
 def init_connections():
-    encoder = OpenAIEncoder(name="text-embedding-3-large", openai_api_key=st.secrets["OPENAI_API_KEY_MKR"])
-    pc = Pinecone(api_key=st.secrets["PINECONE_API_KEY"])
-    spec = ServerlessSpec(cloud="aws", region="us-east-1")
-    index_name = st.secrets["PINECONE_INDEX_NAME"]
-    if index_name not in pc.list_indexes().names():
-        st.write("Index not found. Try again later.")
-    else:
-        index = pc.Index(index_name)
+    encoder = CachedEncoder(OpenAIEncoder(name="text-embedding-3-large", openai_api_key=st.secrets["OPENAI_API_KEY_MKR"]), get_embedding_cache())
+    # Pinecone or the local memory-mapped index, depending on the VECTOR_STORE secret
+    index = open_vector_store()
+    if index is not None:
+        # Keeps the document catalog, and with it the corpus version, current off the request path
+        get_catalog_sync(index)
     oai_client = OpenAI(api_key=st.secrets["OPENAI_API_KEY_MKR"])
     return encoder, index, oai_client
 
 
-def gen_query_context(text, index, encoder, filters, search_comprehensiveness, doc_id=None):
+def fuse_lexical_matches(text, vector_matches, index, lexical_index, query_filter, top_k, lexical_hits=None):
     """
-    Generate query context with adaptive retrieval based on query type and document focus.
-    
-    Parameters:
-    - text: The query text
-    - index: Pinecone index
-    - encoder: Text encoder
-    - filters: List of filter dictionaries
-    - search_comprehensiveness: Float indicating search depth multiplier
-    - doc_id: Optional specific document ID to focus on
-    
-    Returns:
-    - chunks: List of relevant text chunks
-    - sources: List of source documents
+    Merge the vector matches with BM25 hits by reciprocal rank fusion and keep
+    the best `top_k`. Lexical-only hits get their metadata in one index.fetch.
+    Pass `lexical_hits` if the BM25 search has already been run.
     """
+    vector_hits = {m["id"]: m for m in vector_matches["matches"]}
+    if lexical_hits is None:
+        lexical_hits = lexical_index.search(text, top_k, filter=query_filter)
+    fused = reciprocal_rank_fusion([list(vector_hits), [chunk_id for chunk_id, _ in lexical_hits]])[:top_k]
+
+    missing = [chunk_id for chunk_id, _ in fused if chunk_id not in vector_hits]
+    fetched = index.fetch(ids=missing)["vectors"] if missing else {}
+
+    matches = []
+    for chunk_id, score in fused:
+        if chunk_id in vector_hits:
+            metadata = vector_hits[chunk_id]["metadata"]
+        elif chunk_id in fetched:
+            metadata = fetched[chunk_id].get("metadata", {})
+        else:
+            continue
+        matches.append({"id": chunk_id, "score": score, "metadata": metadata})
+    return {"matches": matches}
+
+
+def plan_query(filters, search_comprehensiveness):
+    """Merge the filter dicts and pick top_k for the first query. Returns (query_filter, top_k)."""
     query_filter = {}
     for f in filters:
         if f:  # Only update if filter is not None
             query_filter.update(f)
-    
-    encoded_query = encoder([text])[0]
-    print(f"Encoded query: {encoded_query}")
 
-    # Check if filters contains doc_id
-    if 'doc_id' in query_filter:
-        doc_id = query_filter['doc_id']
-    else:
-        doc_id = None
-    
-    if doc_id:
+    if query_filter.get('doc_id'):
         # For single-document queries, retrieve more chunks from that specific document
-        query_filter['doc_id'] = doc_id
         base_k = 15  # Higher base_k for single document to get more context
     else:
         # For general queries, use a lower base_k but scale with document length
@@ -64,109 +74,144 @@ def gen_query_context(text, index, encoder, filters, search_comprehensiveness, d
     
     # Set reasonable bounds
     top_k = min(max(top_k, 5), 30)  # Never less than 5 or more than 30 chunks
-    
-    # First query to get initial matches
-    matches = index.query(
-        vector=encoded_query,
-        top_k=top_k,
-        include_metadata=True,
-        filter=query_filter
-    )
-    
-    chunks = []
-    sources = []
-    source_ids = {}
-    source_counter = 1
-    
-    # Track which documents we're pulling from
+    return query_filter, top_k
+
+
+def neighbour_ids(matches):
+    ids = []
+    for m in matches["matches"]:
+        ids.extend([m["metadata"]["prechunk_id"], m["metadata"]["postchunk_id"]])
+    return ids
+
+
+def focus_filter(matches, query_filter):
+    """Filter for the follow-up query on the most referenced document, or None if nothing matched."""
     doc_chunk_counts = {}
-    
     for m in matches["matches"]:
-        content = m["metadata"]["content"]
-        title = m["metadata"]["document_title"]
         doc_id = m["metadata"]["doc_id"]
-        web_url = m["metadata"].get("web_url", "")
-        
-        # Track chunks per document
         doc_chunk_counts[doc_id] = doc_chunk_counts.get(doc_id, 0) + 1
-        
-        # Get surrounding context
-        pre = m["metadata"]["prechunk_id"]
-        post = m["metadata"]["postchunk_id"]
-        ids_to_fetch = [id for id in [pre, post] if id != '']
-        
-        if ids_to_fetch:
-            other_chunks = index.fetch(ids=ids_to_fetch)["vectors"]
-        else:
-            other_chunks = {}
+    if not doc_chunk_counts:
+        return None
+    additional_filter = query_filter.copy()
+    additional_filter['doc_id'] = max(doc_chunk_counts.items(), key=lambda x: x[1])[0]
+    return additional_filter
 
-        # Print chunk relevance
-        print(f"Chunk relevance: {m['score']}")
-            
-        prechunk = other_chunks.get(pre, {}).get("metadata", {}).get("content", "")
-        postchunk = other_chunks.get(post, {}).get("metadata", {}).get("content", "")
-        
-        # Add source information
+
+def assemble_context(matches, neighbours, additional_matches=None):
+    """Turn the matches, their neighbour text and the focus-query matches into (chunks, sources)."""
+    chunks = []
+    sources = []
+    source_ids = {}
+    source_counter = 1
+
+    def source_for(m):
+        nonlocal source_counter
+        title = m["metadata"]["document_title"]
         if title not in source_ids:
             source_ids[title] = source_counter
             source_counter += 1
             sources.append({
                 "id": source_ids[title],
                 "title": title,
-                "url": web_url,
+                "url": m["metadata"].get("web_url", ""),
                 "created_at": m["metadata"]["file_created_at"]
             })
+        return source_ids[title]
+    
+    for m in matches["matches"]:
+        # Print chunk relevance
+        print(f"Chunk relevance: {m['score']}")
+        prechunk_id = m["metadata"]["prechunk_id"]
+        postchunk_id = m["metadata"]["postchunk_id"]
         
-        source_id = source_ids[title]
-        
-        # Format chunk with context
-        chunk = f"""[{source_id}] {title}
+        # Chunk with its context; the context packer formats and budgets these
+        chunks.append({
+            "id": m["id"],
+            "rank": len(chunks),
+            "score": m["score"],
+            "source_id": source_for(m),
+            "title": m["metadata"]["document_title"],
+            "content": m["metadata"]["content"],
+            "prechunk_id": prechunk_id,
+            "postchunk_id": postchunk_id,
+            "prechunk": neighbours.get(prechunk_id, ""),
+            "postchunk": neighbours.get(postchunk_id, ""),
+        })
+    
+    # Add new chunks from the focus query that weren't in the original results
+    if additional_matches is not None:
+        existing_chunk_ids = {m["id"] for m in matches["matches"]}
+        for m in additional_matches["matches"]:
+            if m["id"] not in existing_chunk_ids:
+                chunks.append({
+                    "id": m["id"],
+                    "rank": len(chunks),
+                    "score": m["score"],
+                    "source_id": source_for(m),
+                    "title": m["metadata"]["document_title"],
+                    "content": m["metadata"]["content"],
+                })
+    
+    return chunks, sources
+
 
-        {prechunk[-400:]}
-        {content}
-        {postchunk[:400]}"""
-        chunks.append(chunk)
+def gen_query_context(text, index, encoder, filters, search_comprehensiveness, doc_id=None, chunk_cache=None, lexical_index=None, reranker=None):
+    """
+    Generate query context with adaptive retrieval based on query type and document focus.
     
-    # If we're heavily focused on one document, get additional context
-    if doc_id or max(doc_chunk_counts.values(), default=0) > top_k * 0.6:
-        most_referenced_doc = max(doc_chunk_counts.items(), key=lambda x: x[1])[0]
-        additional_filter = query_filter.copy()
-        additional_filter['doc_id'] = most_referenced_doc
-        
-        # Get additional chunks from the most referenced document
+    Parameters:
+    - text: The query text
+    - index: Vector store (Pinecone or local)
+    - encoder: Text encoder
+    - filters: List of filter dictionaries
+    - search_comprehensiveness: Float indicating search depth multiplier
+    - doc_id: Optional specific document ID to focus on
+    - chunk_cache: Optional NeighbourChunkCache for prechunk/postchunk content
+    - lexical_index: Optional LexicalIndex fused with the vector matches by reciprocal rank
+    - reranker: Optional LexicalReranker; over-fetches candidates and keeps the best top_k
+    
+    Returns:
+    - chunks: List of relevant chunk records (id, rank, source_id, title, content, neighbours)
+    - sources: List of source documents
+    """
+    if doc_id:
+        filters = list(filters) + [{'doc_id': doc_id}]
+    query_filter, top_k = plan_query(filters, search_comprehensiveness)
+    candidate_k = reranker.candidates(top_k) if reranker is not None else top_k
+    
+    encoded_query = encoder([text])[0]
+
+    # First query to get initial matches
+    matches = index.query(
+        vector=encoded_query,
+        top_k=candidate_k,
+        include_metadata=True,
+        filter=query_filter
+    )
+
+    # Blend in exact-term hits (tickers, event names, report titles) the embedding may miss
+    if lexical_index is not None:
+        matches = fuse_lexical_matches(text, matches, index, lexical_index, query_filter, candidate_k)
+
+    if reranker is not None:
+        matches, rerank_stats = reranker.rerank(text, matches, top_k)
+        print(f"Reranker: {rerank_stats}")
+
+    # Surrounding context for every match, fetched in one deduplicated batch
+    neighbours = fetch_chunk_contents(index, neighbour_ids(matches), cache=chunk_cache)
+
+    # Get a few more chunks from the most referenced document
+    additional_filter = focus_filter(matches, query_filter)
+    additional_matches = None
+    if additional_filter is not None:
         additional_matches = index.query(
             vector=encoded_query,
-            top_k=5,  # Get a few more chunks for context
+            top_k=5,
             include_metadata=True,
             filter=additional_filter
         )
-        
-        # Add new chunks that weren't in the original results
-        existing_chunk_ids = {m["id"] for m in matches["matches"]}
-        for m in additional_matches["matches"]:
-            if m["id"] not in existing_chunk_ids:
-                # Process and add the new chunk (similar to above)
-                content = m["metadata"]["content"]
-                title = m["metadata"]["document_title"]
-                web_url = m["metadata"].get("web_url", "")
-                
-                if title not in source_ids:
-                    source_ids[title] = source_counter
-                    source_counter += 1
-                    sources.append({
-                        "id": source_ids[title],
-                        "title": title,
-                        "url": web_url,
-                        "created_at": m["metadata"]["file_created_at"]
-                    })
-                
-                source_id = source_ids[title]
-                chunk = f"""[{source_id}] {title}
-
-                {content}"""
-                chunks.append(chunk)
-    
-    return chunks, sources
+
+    return assemble_context(matches, neighbours, additional_matches)
 
 # def gen_query_context(text, index, encoder, filters, search_comprehensiveness):
 #     query_filter = {}
@@ -221,7 +266,8 @@ def gen_query_context(text, index, encoder, filters, search_comprehensiveness, d
 #         chunks.append(chunk)
 #     return chunks, sources
 
-def query_openai(question, chunks, conversation, oai_client, sources, model="gpt-4o-mini", answer_detail=1.0):
+def query_openai(question, chunks, conversation, oai_client, sources, model="gpt-4o-mini", answer_detail=1.0, trace=None,
+                 context_budget=None, conversation_budget=None):
     base_system_message = (
         f"You are an AI financial analyst assistant. When providing answers, ensure that you:\n"
         f"1. Include as many relevant perspectives and views as possible from the context, eliminating any directional bias.\n"
@@ -248,10 +294,27 @@ def query_openai(question, chunks, conversation, oai_client, sources, model="gpt
         text = re.sub(r'[^\x20-\x7E\n\t]', '', text)
         return text.replace("\xa0", " ").replace("■", "-").replace("\u2028", " ").replace("\u2029", " ")
     
-    sanitized_chunks = [sanitize_text(chunk) for chunk in chunks]
+    sanitized_records = [
+        {**chunk, **{key: sanitize_text(chunk.get(key)) for key in ("title", "content", "prechunk", "postchunk")}}
+        for chunk in chunks
+    ]
     sanitized_conversation = sanitize_text(conversation)
     sanitized_question = sanitize_text(question)
 
+    # Bound the prompt: best chunks first within the token budget, recent conversation only
+    tokenizer = get_tokenizer(model)
+    sanitized_chunks, pack_stats = pack_context(
+        sanitized_records,
+        budget=context_budget or st.secrets.get("CONTEXT_TOKEN_BUDGET", DEFAULT_CONTEXT_TOKENS),
+        tokenizer=tokenizer
+    )
+    sanitized_conversation = trim_conversation(
+        sanitized_conversation,
+        budget=conversation_budget or st.secrets.get("CONVERSATION_TOKEN_BUDGET", DEFAULT_CONVERSATION_TOKENS),
+        tokenizer=tokenizer
+    )
+    print(f"Context packer: {pack_stats['packed']} chunks, {pack_stats['tokens']}/{pack_stats['budget']} tokens, dropped {pack_stats['dropped']}")
+
     source_strings = [f"[{source['id']}] {source['title']}" for source in sources]
     sanitized_sources = [sanitize_text(source_str) for source_str in source_strings]
 
@@ -266,10 +329,12 @@ def query_openai(question, chunks, conversation, oai_client, sources, model="gpt
         "Answer:"
     )
 
-    # Write user_content to a test file
-    with open("test_user_content.txt", "w") as f:
-        f.write(user_content)
-        f.write(f"\n\nDocument filter: {st.session_state.doc_filter}")
+    # Token counts for the trace log, only when tracing is on
+    if trace is not None:
+        trace["model"] = model
+        trace["context_tokens"] = pack_stats["tokens"]
+        trace["dropped_chunks"] = pack_stats["dropped"]
+        trace["prompt_tokens"] = count_tokens(system_message, tokenizer) + count_tokens(user_content, tokenizer)
 
     try:
         completion = oai_client.chat.completions.create(
@@ -286,13 +351,182 @@ def query_openai(question, chunks, conversation, oai_client, sources, model="gpt
         return f"An error occurred while querying OpenAI: {e}"
     
 def rag_pipeline(question, index, conversation, encoder, oai_client, filters, search_comprehensiveness, answer_detail):
-    chunks, sources = gen_query_context(question, index, encoder, filters, search_comprehensiveness)
+    # Opening questions (presets, Research Portal links) repeat across analysts; follow-ups depend on the conversation
+    answer_cache = get_answer_cache() if not conversation else None
+    if answer_cache is not None:
+        corpus_version = index.corpus_version()
+        embedding = encoder([question])[0]
+        cached = answer_cache.get(question, filters, answer_detail, corpus_version, search_comprehensiveness, embedding=embedding)
+        if cached is not None:
+            print("Answer cache hit")
+            return replay_answer(cached["answer"]), cached["sources"]
+
+    chunks, sources = gen_query_context(question, index, encoder, filters, search_comprehensiveness, chunk_cache=get_neighbour_chunk_cache(), lexical_index=get_lexical_index(), reranker=get_reranker())
     if len(chunks) == 0:
         return "No context found for this question. Please try again", []
-    return query_openai(
+    completion = query_openai(
         question=question, 
         chunks=chunks, 
         conversation=conversation, 
         oai_client=oai_client, 
         sources=sources,
-        answer_detail=answer_detail), sources
\ No newline at end of file
+        answer_detail=answer_detail)
+    if answer_cache is not None and not isinstance(completion, str):
+        completion = cache_completion(completion, lambda answer: answer_cache.put(
+            question, filters, answer_detail, corpus_version, answer, sources, search_comprehensiveness, embedding=embedding))
+    return completion, sources
+
+
+# Async pipeline ##################################################################################################
+class StageTimer:
+    """Wall-clock seconds spent in each pipeline stage, plus time to first token."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - started
+
+    def mark(self, name):
+        self.timings.setdefault(name, time.perf_counter() - self.start)
+
+    def summary(self):
+        return ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in self.timings.items())
+
+
+async def stream_completion(completion, on_text=None, timer=None):
+    """
+    Read a streamed completion (or an iterable of text pieces) without blocking
+    the event loop, calling `on_text` with the text so far after every piece.
+    Returns the full text.
+    """
+    if isinstance(completion, str):
+        if on_text:
+            on_text(completion)
+        return completion
+
+    text = ""
+    iterator = iter(completion)
+    while True:
+        response = await asyncio.to_thread(next, iterator, None)
+        if response is None:
+            break
+        if isinstance(response, str):
+            delta = response
+        else:
+            delta = response.choices[0].delta.content if response.choices else None
+        if delta:
+            if timer is not None:
+                timer.mark("first_token")
+            text += delta
+            if on_text:
+                on_text(text)
+    return text
+
+
+async def gen_query_context_async(text, index, encoder, filters, search_comprehensiveness, chunk_cache=None, lexical_index=None, reranker=None, timer=None):
+    """
+    gen_query_context with the independent round-trips overlapped: the vector and
+    BM25 searches run together, and the focus query on the most referenced
+    document is started alongside the neighbour fetch instead of after it.
+    """
+    timer = timer or StageTimer()
+    query_filter, top_k = plan_query(filters, search_comprehensiveness)
+    candidate_k = reranker.candidates(top_k) if reranker is not None else top_k
+
+    with timer.stage("embed"):
+        encoded_query = (await asyncio.to_thread(encoder, [text]))[0]
+
+    with timer.stage("search"):
+        vector_search = asyncio.to_thread(index.query, vector=encoded_query, top_k=candidate_k, include_metadata=True, filter=query_filter)
+        if lexical_index is not None:
+            matches, lexical_hits = await asyncio.gather(
+                vector_search, asyncio.to_thread(lexical_index.search, text, candidate_k, query_filter))
+            matches = await asyncio.to_thread(
+                fuse_lexical_matches, text, matches, index, lexical_index, query_filter, candidate_k, lexical_hits)
+        else:
+            matches = await vector_search
+
+    if reranker is not None:
+        with timer.stage("rerank"):
+            matches, rerank_stats = reranker.rerank(text, matches, top_k)
+        print(f"Reranker: {rerank_stats}")
+
+    with timer.stage("context"):
+        additional_filter = focus_filter(matches, query_filter)
+        fetches = [asyncio.to_thread(fetch_chunk_contents, index, neighbour_ids(matches), chunk_cache)]
+        if additional_filter is not None:
+            fetches.append(asyncio.to_thread(index.query, vector=encoded_query, top_k=5, include_metadata=True, filter=additional_filter))
+        results = await asyncio.gather(*fetches)
+        neighbours = results[0]
+        additional_matches = results[1] if len(results) > 1 else None
+
+    return assemble_context(matches, neighbours, additional_matches)
+
+
+async def rag_pipeline_async(question, index, conversation, encoder, oai_client, filters, search_comprehensiveness, answer_detail, on_text=None, timer=None):
+    """
+    Async rag_pipeline: streams the answer into `on_text` as soon as the
+    completion opens and returns (answer_text, sources). Stage timings are
+    recorded on `timer`.
+    """
+    timer = timer or StageTimer()
+    tracer = get_rag_tracer()
+    trace = {"query": question, "filters": filters, "search_comprehensiveness": search_comprehensiveness,
+             "answer_detail": answer_detail, "followup": bool(conversation)} if tracer is not None else None
+
+    answer_cache = get_answer_cache() if not conversation else None
+    if answer_cache is not None:
+        with timer.stage("answer_cache"):
+            corpus_version, embedding = await asyncio.gather(
+                asyncio.to_thread(index.corpus_version), asyncio.to_thread(encoder, [question]))
+            embedding = embedding[0]
+            cached = answer_cache.get(question, filters, answer_detail, corpus_version, search_comprehensiveness, embedding=embedding)
+        if cached is not None:
+            print("Answer cache hit")
+            text = await stream_completion(replay_answer(cached["answer"]), on_text, timer)
+            if tracer is not None:
+                timer.mark("total")
+                tracer.record(**trace, answer_cache="hit", timings=dict(timer.timings))
+            return text, cached["sources"]
+
+    chunks, sources = await gen_query_context_async(
+        question, index, encoder, filters, search_comprehensiveness,
+        chunk_cache=get_neighbour_chunk_cache(), lexical_index=get_lexical_index(), reranker=get_reranker(), timer=timer)
+    if len(chunks) == 0:
+        text = "No context found for this question. Please try again"
+        if on_text:
+            on_text(text)
+        if tracer is not None:
+            timer.mark("total")
+            tracer.record(**trace, retrieved=[], timings=dict(timer.timings))
+        return text, []
+
+    with timer.stage("prompt"):
+        completion = await asyncio.to_thread(
+            query_openai, question=question, chunks=chunks, conversation=conversation,
+            oai_client=oai_client, sources=sources, answer_detail=answer_detail, trace=trace)
+    if answer_cache is not None and not isinstance(completion, str):
+        completion = cache_completion(completion, lambda answer: answer_cache.put(
+            question, filters, answer_detail, corpus_version, answer, sources, search_comprehensiveness, embedding=embedding))
+
+    with timer.stage("generation"):
+        text = await stream_completion(completion, on_text, timer)
+    timer.mark("total")
+    print(f"RAG timings: {timer.summary()}")
+    if tracer is not None:
+        tracer.record(
+            **trace,
+            answer_cache="miss" if answer_cache is not None else "skipped",
+            retrieved=[{"id": c["id"], "score": c["score"], "source_id": c["source_id"]} for c in chunks],
+            completion_tokens=count_tokens(text, get_tokenizer(trace.get("model", "gpt-4o-mini"))),
+            error=isinstance(completion, str),
+            timings=dict(timer.timings),
+        )
+    return text, sources
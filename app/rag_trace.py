@@ -0,0 +1,85 @@
+import json
+import os
+import queue
+import threading
+import time
+
+import streamlit as st
+
+from utils.paths import CACHE_DIR
+
+
+class RagTracer:
+    """
+    Appends one JSON line per answered question to a size-rotated file.
+
+    `record` only puts the dict on a bounded queue; a daemon thread serialises
+    and writes it, so the request path never touches the disk. If the writer
+    falls behind, records are dropped and counted rather than blocking.
+    """
+
+    def __init__(self, path=os.path.join(CACHE_DIR, "rag_trace.jsonl"), max_bytes=10 * 1024 * 1024, backups=3, queue_size=1000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.dropped = 0
+        self.written = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="rag-trace", daemon=True)
+        self._thread.start()
+
+    def record(self, **fields):
+        fields.setdefault("ts", time.time())
+        try:
+            self._queue.put_nowait(fields)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout=5.0):
+        """Wait until everything queued so far has been written."""
+        done = threading.Event()
+        self._queue.put(done, timeout=timeout)
+        done.wait(timeout)
+
+    def _rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            # Write whatever else has queued up in the same pass
+            while len(batch) < 100:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines = [json.dumps(r, default=str) + "\n" for r in batch if isinstance(r, dict)]
+            try:
+                if lines and os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                    self._rotate()
+                if lines:
+                    with open(self.path, "a", encoding="utf-8") as f:
+                        f.writelines(lines)
+                    self.written += len(lines)
+            except OSError as e:
+                print(f"RAG trace write failed: {e}")
+            for r in batch:
+                if isinstance(r, threading.Event):
+                    r.set()
+
+
+@st.cache_resource
+def get_rag_tracer():
+    """The trace writer if the RAG_TRACE secret is set, otherwise None."""
+    if not st.secrets.get("RAG_TRACE", False):
+        return None
+    return RagTracer(
+        path=st.secrets.get("RAG_TRACE_PATH", os.path.join(CACHE_DIR, "rag_trace.jsonl")),
+        max_bytes=int(st.secrets.get("RAG_TRACE_MAX_MB", 10)) * 1024 * 1024,
+    )
@@ -0,0 +1,110 @@
+import time
+from collections import Counter
+
+import numpy as np
+import streamlit as st
+
+from app.lexical_index import tokenize
+
+
+class LexicalReranker:
+    """
+    Re-orders an over-fetched candidate list by a blend of the retrieval score
+    and BM25-style overlap with the question, then keeps the best `keep` with at
+    most `max_per_doc` chunks per document (backfilled in score order if the cap
+    leaves fewer than `keep`).
+
+    Candidates are tokenised in batches of `batch_size`; if `budget_ms` runs out
+    before every candidate has been tokenised, the retrieval order is kept.
+    Scoring itself is one set of numpy operations over the candidate x
+    question-term matrix.
+    """
+
+    def __init__(self, alpha=0.5, max_per_doc=3, overfetch=3, max_candidates=100, budget_ms=50, batch_size=32,
+                 k1=1.2, b=0.75, title_weight=3):
+        self.alpha = alpha
+        self.max_per_doc = max_per_doc
+        self.overfetch = overfetch
+        self.max_candidates = max_candidates
+        self.budget_ms = budget_ms
+        self.batch_size = batch_size
+        self.k1 = k1
+        self.b = b
+        self.title_weight = title_weight
+
+    def candidates(self, top_k):
+        """How many matches to retrieve for a final `top_k`."""
+        return max(top_k, min(top_k * self.overfetch, self.max_candidates))
+
+    def _overlap(self, question, candidates, deadline):
+        # Returns one lexical score per candidate, or None if the deadline passed
+        terms = sorted(set(tokenize(question)))
+        if not terms:
+            return None
+        tf = np.zeros((len(candidates), len(terms)), dtype=np.float32)
+        lengths = np.zeros(len(candidates), dtype=np.float32)
+        for start in range(0, len(candidates), self.batch_size):
+            if time.perf_counter() > deadline:
+                return None
+            for row in range(start, min(start + self.batch_size, len(candidates))):
+                metadata = candidates[row]["metadata"]
+                counts = Counter(tokenize(metadata.get("content", "")))
+                for _ in range(self.title_weight):
+                    counts.update(tokenize(metadata.get("document_title", "")))
+                lengths[row] = sum(counts.values())
+                tf[row] = [counts.get(term, 0) for term in terms]
+
+        df = (tf > 0).sum(axis=0)
+        idf = np.log(1 + (len(candidates) - df + 0.5) / (df + 0.5))
+        norm = self.k1 * (1 - self.b + self.b * lengths / max(float(lengths.mean()), 1.0))
+        return ((tf * (self.k1 + 1) / (tf + norm[:, None])) * idf).sum(axis=1)
+
+    def rerank(self, question, matches, keep):
+        """Return ({"matches": best `keep` matches}, stats)."""
+        started = time.perf_counter()
+        candidates = matches["matches"]
+        order = np.arange(len(candidates))
+        reranked = False
+
+        if len(candidates) > 1:
+            lexical = self._overlap(question, candidates, started + self.budget_ms / 1000)
+            if lexical is not None:
+                vector = np.asarray([m["score"] for m in candidates], dtype=np.float32)
+                spread = float(vector.max() - vector.min())
+                vector = (vector - vector.min()) / spread if spread > 0 else np.ones_like(vector)
+                top = float(lexical.max())
+                lexical = lexical / top if top > 0 else lexical
+                order = np.argsort(-(self.alpha * vector + (1 - self.alpha) * lexical), kind="stable")
+                reranked = True
+
+        kept = []
+        overflow = []
+        per_doc = Counter()
+        for i in order:
+            m = candidates[int(i)]
+            doc_id = m["metadata"].get("doc_id")
+            if self.max_per_doc and per_doc[doc_id] >= self.max_per_doc:
+                overflow.append(m)
+                continue
+            per_doc[doc_id] += 1
+            kept.append(m)
+            if len(kept) == keep:
+                break
+        kept.extend(overflow[:keep - len(kept)])
+
+        stats = {"candidates": len(candidates), "kept": len(kept), "reranked": reranked,
+                 "ms": round((time.perf_counter() - started) * 1000, 2)}
+        return {"matches": kept}, stats
+
+
+@st.cache_resource
+def get_reranker():
+    """The reranker configured by the RERANK_* secrets, or None if RERANKER is "none"."""
+    if st.secrets.get("RERANKER", "lexical") == "none":
+        return None
+    return LexicalReranker(
+        alpha=st.secrets.get("RERANK_ALPHA", 0.5),
+        max_per_doc=st.secrets.get("RERANK_MAX_PER_DOC", 3),
+        overfetch=st.secrets.get("RERANK_OVERFETCH", 3),
+        budget_ms=st.secrets.get("RERANK_BUDGET_MS", 50),
+    )
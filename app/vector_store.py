@@ -0,0 +1,338 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from pinecone import Pinecone
+
+from utils.paths import CACHE_DIR
+
+METADATA_COLUMNS = ['doc_id', 'file_created_at_unix', 'prechunk_id', 'postchunk_id', 'file_sender']
+
+
+class VectorStore:
+    """
+    The subset of the Pinecone index API the app relies on. `query` and `fetch`
+    return plain dicts shaped like Pinecone's responses, so callers can index
+    them with ["matches"] / ["vectors"] regardless of the backend.
+    """
+
+    def query(self, vector, top_k, include_metadata=True, filter=None):
+        raise NotImplementedError
+
+    def query_many(self, vectors, top_k, include_metadata=True, filter=None):
+        return [self.query(vector, top_k, include_metadata=include_metadata, filter=filter) for vector in vectors]
+
+    def fetch(self, ids):
+        raise NotImplementedError
+
+    def corpus_version(self):
+        """A string that changes whenever chunks are added to or removed from the store."""
+        raise NotImplementedError
+
+
+class PineconeVectorStore(VectorStore):
+    """
+    `catalog` is the DocumentCatalog kept in step with the index by the
+    ingestion job, the document_catalog CLI or the app's background sync; its
+    version changes whenever chunks are added or removed, so it stands in for
+    the corpus version.
+    """
+
+    def __init__(self, index, catalog):
+        self.index = index
+        self.catalog = catalog
+
+    def corpus_version(self):
+        return f"pinecone:{self.catalog.version()}"
+
+    def query(self, vector, top_k, include_metadata=True, filter=None):
+        return self.index.query(vector=vector, top_k=top_k, include_metadata=include_metadata, filter=filter)
+
+    def fetch(self, ids):
+        return self.index.fetch(ids=ids)
+
+
+def filter_mask(metadata, query_filter):
+    """
+    Boolean mask over a metadata frame for a Pinecone-style filter: scalar
+    equality, or a dict of $eq / $ne / $gte / $gt / $lte / $lt / $in / $nin.
+    Rows missing the field never match.
+    """
+    mask = np.ones(len(metadata), dtype=bool)
+    for key, condition in (query_filter or {}).items():
+        if key not in metadata.columns:
+            return np.zeros(len(metadata), dtype=bool)
+        column = metadata[key]
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, operand in condition.items():
+            if op == "$eq":
+                mask &= (column == operand).to_numpy()
+            elif op == "$ne":
+                mask &= (column != operand).to_numpy()
+            elif op == "$gte":
+                mask &= (column >= operand).to_numpy()
+            elif op == "$gt":
+                mask &= (column > operand).to_numpy()
+            elif op == "$lte":
+                mask &= (column <= operand).to_numpy()
+            elif op == "$lt":
+                mask &= (column < operand).to_numpy()
+            elif op == "$in":
+                mask &= column.isin(operand).to_numpy()
+            elif op == "$nin":
+                mask &= ~column.isin(operand).to_numpy()
+            else:
+                raise ValueError(f"Unsupported filter operator {op}")
+        mask &= column.notna().to_numpy()
+    return mask
+
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process vector index over a directory written by `build`:
+
+        vectors.f32      N x dim float32 matrix of unit vectors, memory-mapped
+        metadata.parquet one row per vector (id plus the chunk metadata)
+        ivf.npz          optional coarse centroids and list assignments
+
+    Exact search scans the matrix in `block_rows` blocks; approximate search only
+    scores the `n_probe` inverted lists whose centroids are closest to the query.
+    Filters matching fewer than `exact_below` rows, and queries whose probed
+    lists hold fewer than top_k matching rows, fall back to the exact scan.
+    """
+
+    def __init__(self, root, approximate=False, n_probe=8, block_rows=65536, exact_below=10_000):
+        with open(os.path.join(root, "meta.json")) as f:
+            meta = json.load(f)
+        self.root = root
+        self.dim = meta["dim"]
+        self.vectors = np.memmap(os.path.join(root, "vectors.f32"), dtype=np.float32, mode="r", shape=(meta["count"], meta["dim"]))
+        self.metadata = pd.read_parquet(os.path.join(root, "metadata.parquet"))
+        self.ids = self.metadata.pop("id").tolist()
+        self.rows = {chunk_id: row for row, chunk_id in enumerate(self.ids)}
+        self.block_rows = block_rows
+        self.n_probe = n_probe
+        self.exact_below = exact_below
+
+        self.centroids = None
+        self.lists = None
+        ivf_path = os.path.join(root, "ivf.npz")
+        if approximate and os.path.exists(ivf_path):
+            ivf = np.load(ivf_path)
+            self.centroids = ivf["centroids"]
+            assignments = ivf["assignments"]
+            self.lists = [np.flatnonzero(assignments == i) for i in range(len(self.centroids))]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def corpus_version(self):
+        return f"local:{len(self.ids)}:{os.path.getmtime(os.path.join(self.root, 'meta.json'))}"
+
+    # Search #############################################################################
+    def _probe(self, query, mask):
+        """Rows passing `mask` in the `n_probe` inverted lists closest to the query."""
+        probe = np.argsort(-(self.centroids @ query))[:self.n_probe]
+        rows = np.sort(np.concatenate([self.lists[i] for i in probe]))
+        return rows[mask[rows]]
+
+    def _candidates(self, mask):
+        """Yield (row_indices, vectors) blocks of the rows passing `mask`."""
+        for start in range(0, len(self.ids), self.block_rows):
+            stop = min(start + self.block_rows, len(self.ids))
+            block_mask = mask[start:stop]
+            if block_mask.all():
+                yield np.arange(start, stop), self.vectors[start:stop]
+            elif block_mask.any():
+                rows = start + np.flatnonzero(block_mask)
+                yield rows, self.vectors[rows]
+
+    def _top_k(self, queries, top_k, mask):
+        queries = np.asarray(queries, dtype=np.float32)
+        queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        best = [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in queries]
+
+        exact = list(range(len(queries)))
+        if self.centroids is not None and mask.sum() >= self.exact_below:
+            exact = []
+            for q, query in enumerate(queries):
+                rows = self._probe(query, mask)
+                if len(rows) < top_k:
+                    # A selective filter left too few rows in the probed lists
+                    exact.append(q)
+                    continue
+                best[q] = self._merge(best[q], rows, self.vectors[rows] @ query, top_k)
+        if not exact:
+            return best
+
+        # Exact search: score every query against each block in one matrix product
+        for rows, block in self._candidates(mask):
+            scores = block @ queries[exact].T
+            for i, q in enumerate(exact):
+                best[q] = self._merge(best[q], rows, scores[:, i], top_k)
+        return best
+
+    @staticmethod
+    def _merge(best, rows, scores, top_k):
+        rows = np.concatenate([best[0], rows])
+        scores = np.concatenate([best[1], scores])
+        if len(scores) > top_k:
+            keep = np.argpartition(-scores, top_k - 1)[:top_k]
+            rows, scores = rows[keep], scores[keep]
+        order = np.argsort(-scores, kind="stable")
+        return rows[order], scores[order]
+
+    def _match(self, row, score, include_metadata):
+        match = {"id": self.ids[row], "score": float(score)}
+        if include_metadata:
+            match["metadata"] = self._metadata(row)
+        return match
+
+    def _metadata(self, row):
+        return {key: value for key, value in self.metadata.iloc[row].items() if not (np.isscalar(value) and pd.isna(value))}
+
+    def query(self, vector, top_k, include_metadata=True, filter=None):
+        return self.query_many([vector], top_k, include_metadata=include_metadata, filter=filter)[0]
+
+    def query_many(self, vectors, top_k, include_metadata=True, filter=None):
+        mask = filter_mask(self.metadata, filter)
+        results = []
+        for rows, scores in self._top_k(vectors, top_k, mask):
+            results.append({"matches": [self._match(row, score, include_metadata) for row, score in zip(rows, scores)]})
+        return results
+
+    def fetch(self, ids):
+        vectors = {}
+        for chunk_id in ids:
+            row = self.rows.get(chunk_id)
+            if row is not None:
+                vectors[chunk_id] = {"id": chunk_id, "values": self.vectors[row].tolist(), "metadata": self._metadata(row)}
+        return {"vectors": vectors}
+
+    # Building ###########################################################################
+    @staticmethod
+    def build(root, ids, vectors, metadata, n_lists=None, seed=0):
+        """
+        Write a store to `root` from parallel sequences of ids, vectors (N x dim)
+        and metadata dicts. An IVF layout is trained when there are enough rows.
+        """
+        os.makedirs(root, exist_ok=True)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        count, dim = vectors.shape
+
+        out = np.memmap(os.path.join(root, "vectors.f32.tmp"), dtype=np.float32, mode="w+", shape=(count, dim))
+        out[:] = vectors
+        out.flush()
+        del out
+        os.replace(os.path.join(root, "vectors.f32.tmp"), os.path.join(root, "vectors.f32"))
+
+        frame = pd.DataFrame(list(metadata))
+        for column in METADATA_COLUMNS:
+            if column not in frame.columns:
+                frame[column] = None
+        frame.insert(0, "id", list(ids))
+        frame.to_parquet(os.path.join(root, "metadata.parquet"), index=False)
+
+        n_lists = n_lists or int(np.sqrt(count))
+        ivf_path = os.path.join(root, "ivf.npz")
+        if count >= 1000 and n_lists >= 2:
+            centroids, assignments = train_ivf(vectors, n_lists, seed=seed)
+            np.savez(ivf_path, centroids=centroids, assignments=assignments)
+        elif os.path.exists(ivf_path):
+            os.remove(ivf_path)
+
+        with open(os.path.join(root, "meta.json"), "w") as f:
+            json.dump({"count": count, "dim": dim}, f)
+
+
+def train_ivf(vectors, n_lists, iterations=10, sample=50_000, seed=0):
+    """Spherical k-means on a sample; returns (centroids, assignment of every row)."""
+    rng = np.random.default_rng(seed)
+    train = vectors[rng.choice(len(vectors), size=min(sample, len(vectors)), replace=False)]
+    centroids = train[rng.choice(len(train), size=n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        labels = np.argmax(train @ centroids.T, axis=1)
+        for i in range(n_lists):
+            members = train[labels == i]
+            if len(members):
+                centroid = members.sum(axis=0)
+                centroids[i] = centroid / max(np.linalg.norm(centroid), 1e-12)
+    assignments = np.concatenate([
+        np.argmax(vectors[start:start + 65536] @ centroids.T, axis=1)
+        for start in range(0, len(vectors), 65536)
+    ])
+    return centroids, assignments
+
+
+def open_vector_store():
+    """Open the backend named by the VECTOR_STORE secret: "pinecone" (default) or "local"."""
+    if st.secrets.get("VECTOR_STORE", "pinecone") == "local":
+        return LocalVectorStore(
+            st.secrets.get("LOCAL_VECTOR_STORE_PATH", os.path.join(CACHE_DIR, "vector_store")),
+            approximate=st.secrets.get("LOCAL_VECTOR_STORE_APPROXIMATE", False),
+        )
+    pc = Pinecone(api_key=st.secrets["PINECONE_API_KEY"])
+    index_name = st.secrets["PINECONE_INDEX_NAME"]
+    if index_name not in pc.list_indexes().names():
+        st.write("Index not found. Try again later.")
+        return None
+    from app.document_catalog import get_document_catalog
+    return PineconeVectorStore(pc.Index(index_name), get_document_catalog())
+
+
+def list_chunk_ids(store):
+    """Every chunk id in the store (Pinecone serverless indexes list ids in pages)."""
+    if isinstance(store, LocalVectorStore):
+        return list(store.ids)
+    return [chunk_id for page in store.index.list() for chunk_id in page]
+
+
+def export_pinecone(index, root, batch_size=100):
+    """Copy every vector and its metadata from a Pinecone serverless index into a local store."""
+    ids = [chunk_id for page in index.list() for chunk_id in page]
+    vectors, metadata = [], []
+    for start in range(0, len(ids), batch_size):
+        fetched = index.fetch(ids=ids[start:start + batch_size])["vectors"]
+        for chunk_id in ids[start:start + batch_size]:
+            vector = fetched[chunk_id]
+            vectors.append(vector["values"])
+            metadata.append(dict(vector.get("metadata") or {}))
+        print(f"Fetched {min(start + batch_size, len(ids))}/{len(ids)} vectors")
+    LocalVectorStore.build(root, ids, vectors, metadata)
+    return len(ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the local vector store")
+    parser.add_argument("command", choices=["export"])
+    parser.add_argument("--root", default=os.path.join(CACHE_DIR, "vector_store"))
+    args = parser.parse_args()
+
+    pc = Pinecone(api_key=st.secrets["PINECONE_API_KEY"])
+    count = export_pinecone(pc.Index(st.secrets["PINECONE_INDEX_NAME"]), args.root)
+    print(f"Wrote {count} vectors to {args.root}")
+
+    # Keep the BM25 index in step with the exported chunks
+    from app.lexical_index import LexicalIndex, lexical_index_path, sync_lexical_index
+
+    path = lexical_index_path()
+    lexical = LexicalIndex.load(path) if os.path.exists(path) else LexicalIndex()
+    store = LocalVectorStore(args.root)
+    added, removed = sync_lexical_index(lexical, store.ids, store.fetch)
+    lexical.save(path)
+    print(f"Lexical index: {added} chunks added, {removed} removed")
+
+    # ... and the Research Portal's document catalog
+    from app.document_catalog import get_document_catalog, sync_document_catalog
+
+    added, removed = sync_document_catalog(get_document_catalog(), store)
+    print(f"Document catalog: {added} chunks added, {removed} removed")
+
+
+if __name__ == "__main__":
+    main()
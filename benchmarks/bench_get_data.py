@@ -0,0 +1,70 @@
+"""
+Wall-clock comparison of the sequential and concurrent SharePoint snapshot fetch.
+
+Runs against a local mock Graph server with an artificial per-request latency and
+a simulated MSAL token handshake, so no credentials or network are required:
+
+    python -m benchmarks.bench_get_data --latency 0.3 --token-latency 0.4
+
+The sequential baseline reproduces the original behaviour of a new MSAL app,
+token and connection per file.
+"""
+import argparse
+import tempfile
+import time
+
+from benchmarks.mock_graph import MockGraphServer, MockTokenApp
+from utils import funcs
+from utils.graph_client import GraphClient
+from utils.snapshot_store import SnapshotStore
+
+SNAPSHOT_PATHS = [
+    "/ProfitLoss/data_2024-09-02-09-00.csv",
+    "/ProfitLoss/data_Cur2024-09-02-08-00.csv",
+    "/ProfitLoss/data_DV02024-09-02-08-00.csv",
+    "/ProfitLoss/data_VaR2024-09-02-08-00.csv",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.3, help="Seconds per mocked Graph request")
+    parser.add_argument("--token-latency", type=float, default=0.4, help="Seconds per simulated token handshake")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    credentials = ("client", "secret", "tenant")
+
+    with MockGraphServer(latency=args.latency) as server:
+        def new_client():
+            return GraphClient(*credentials, graph_url=server.url, app=MockTokenApp(args.token_latency))
+
+        sequential, concurrent = [], []
+        shared = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            for path in SNAPSHOT_PATHS:
+                client = new_client()
+                response = client.get(f"/sites/site/drive/root:{path}:/content")
+                funcs._parse_sharepoint_csv(response.content, path)
+            sequential.append(time.perf_counter() - start)
+
+            # A fresh shared client and an empty snapshot store per round so every
+            # round pays one handshake and downloads every file
+            shared = new_client()
+            store = SnapshotStore(root=tempfile.mkdtemp())
+            funcs.get_graph_client = lambda *a: shared
+            funcs.get_snapshot_store = lambda: store
+            start = time.perf_counter()
+            funcs.fetch_sharepoint_csvs(*credentials, "site", SNAPSHOT_PATHS)
+            concurrent.append(time.perf_counter() - start)
+
+    best_seq, best_conc = min(sequential), min(concurrent)
+    print(f"sequential: {best_seq:.3f}s  (4 requests + 4 token handshakes)")
+    print(f"concurrent: {best_conc:.3f}s  (4 parallel requests + 1 token handshake)")
+    print(f"speedup:    {best_seq / best_conc:.2f}x")
+    print(f"shared client stats: {shared.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Per-cell convert_to_float vs the vectorised coerce_numeric on a synthetic
+50k-row positions file:
+
+    python -m benchmarks.bench_numeric_coercion --rows 50000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.funcs import coerce_numeric_columns, convert_to_float
+
+EXCLUDE_COLUMNS = ['Book Name', 'Holding Scenario', 'Description', 'Active']
+PNL_COLUMNS = ['$ Daily P&L', '$ WTD P&L', '$ MTD P&L', '$ YTD P&L', '$ ITD P&L', '$ NMV', '$ Overall Cost']
+
+
+def make_positions(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    books = np.array(['DM FX', 'EM FX', 'USD rates', 'AUD Rates', 'FX options', 'Commodities'])
+
+    def accounting(values):
+        text = np.char.mod('%.2f', np.abs(values))
+        formatted = np.where(values < 0, np.char.add(np.char.add('($', text), ')'), np.char.add('$', text))
+        return pd.Series(formatted).str.replace(r'(\d)(?=(\d{3})+\.)', r'\1,', regex=True)
+
+    df = pd.DataFrame({
+        'Book Name': books[rng.integers(0, len(books), rows)],
+        'Holding Scenario': 'Base',
+        'Description': [f"AUD/USD {i}" for i in range(rows)],
+        'Active': 'Y',
+        'Quantity': rng.normal(0, 1e6, rows).round(),
+        'Book DV01': rng.normal(0, 1e4, rows),
+    })
+    for column in PNL_COLUMNS:
+        df[column] = accounting(rng.normal(0, 1e5, rows))
+    # A few non-numeric cells that must be preserved as strings
+    df.loc[rng.integers(0, rows, 20), '$ NMV'] = 'N/A'
+    df.loc[rng.integers(0, rows, 20), '$ Overall Cost'] = np.where(rng.random(20) < 0.5, 'USD 1,000', '')
+    return df
+
+
+def per_cell(df):
+    df = df.copy()
+    for column in df.columns:
+        if column not in EXCLUDE_COLUMNS:
+            df[column] = df[column].apply(convert_to_float)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_positions(args.rows)
+
+    timings = {}
+    for name, fn in [("apply(convert_to_float)", per_cell), ("coerce_numeric_columns", lambda d: coerce_numeric_columns(d, EXCLUDE_COLUMNS))]:
+        best = float('inf')
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = fn(df)
+            best = min(best, time.perf_counter() - start)
+        timings[name] = (best, result)
+
+    expected = timings["apply(convert_to_float)"][1]
+    actual = timings["coerce_numeric_columns"][1]
+    for column in df.columns:
+        pd.testing.assert_series_equal(actual[column].astype(object), expected[column].astype(object), check_names=False)
+
+    for name, (best, _) in timings.items():
+        print(f"{name:<26} {best * 1000:8.1f} ms")
+    print(f"speedup: {timings['apply(convert_to_float)'][0] / timings['coerce_numeric_columns'][0]:.1f}x (results identical)")
+
+
+if __name__ == "__main__":
+    main()
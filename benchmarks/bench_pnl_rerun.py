@@ -0,0 +1,82 @@
+"""
+Per-rerun cost of the P&L tab aggregations: the old groupby-per-chart code vs
+reading the book cube built once per snapshot.
+
+    python -m benchmarks.bench_pnl_rerun --rows 50000 --clicks 50
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.pnl_cube import build_book_cube
+from utils.report_schemas import PNL_COLUMNS
+
+BOOKS = ['DM FX', 'EM FX', 'USD rates', 'AUD Rates', 'FX options', 'Commodities', 'Equity trading', 'Short term trading']
+
+
+def make_positions(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'Book Name': pd.Categorical(np.array(BOOKS)[rng.integers(0, len(BOOKS), rows)]),
+        'Description': [f"AUD/USD {i}" for i in range(rows)],
+    })
+    for column in PNL_COLUMNS:
+        df[column] = rng.normal(0, 1e5, rows)
+    return df
+
+
+def groupby_per_click(data, selected_books):
+    # What pnl_report.py did on every rerun before the cube
+    df_filtered = data[data["Book Name"].isin(selected_books)]
+    total_pnl = df_filtered.groupby("Book Name", observed=True)['$ Daily P&L'].sum().reset_index()
+    total_itd_pnl = df_filtered.groupby("Book Name", observed=True)['$ ITD P&L'].sum().reset_index()
+    total_ytd_pnl = df_filtered.groupby("Book Name", observed=True)['$ YTD P&L'].sum().reset_index()
+    aggregated = df_filtered[['Book Name', '$ Daily P&L', '$ MTD P&L', '$ YTD P&L', '$ ITD P&L']].groupby("Book Name", as_index=False, observed=True).sum()
+    totals = aggregated[['$ Daily P&L', '$ MTD P&L', '$ YTD P&L', '$ ITD P&L']].sum()
+    return total_pnl, total_itd_pnl, total_ytd_pnl, aggregated, totals
+
+
+def cube_per_click(cube, selected_books):
+    book_totals = cube.select(selected_books)
+    return book_totals, cube.totals(selected_books)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--clicks", type=int, default=50)
+    args = parser.parse_args()
+
+    data = make_positions(args.rows)
+    rng = np.random.default_rng(1)
+    selections = [list(rng.choice(BOOKS, size=rng.integers(1, len(BOOKS) + 1), replace=False)) for _ in range(args.clicks)]
+
+    start = time.perf_counter()
+    for selected in selections:
+        expected = groupby_per_click(data, selected)
+    groupby_time = (time.perf_counter() - start) / args.clicks
+
+    start = time.perf_counter()
+    cube = build_book_cube(data)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for selected in selections:
+        book_totals, totals = cube_per_click(cube, selected)
+    cube_time = (time.perf_counter() - start) / args.clicks
+
+    # Same numbers for the last selection
+    np.testing.assert_allclose(book_totals['$ Daily P&L'].values, expected[0]['$ Daily P&L'].values)
+    np.testing.assert_allclose(totals[['$ Daily P&L', '$ MTD P&L', '$ YTD P&L', '$ ITD P&L']].values, expected[4].values)
+
+    print(f"rows={args.rows} clicks={args.clicks}")
+    print(f"groupby per click     {groupby_time * 1000:8.2f} ms")
+    print(f"cube build (once)     {build_time * 1000:8.2f} ms")
+    print(f"cube read per click   {cube_time * 1000:8.2f} ms")
+    print(f"per-click speedup: {groupby_time / cube_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
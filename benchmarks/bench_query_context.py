@@ -0,0 +1,62 @@
+"""
+Context-building time (everything before the first LLM token) for BRAG against a
+local fake index: the old one-fetch-per-match loop vs the batched, cached
+neighbour fetch in gen_query_context.
+
+    python -m benchmarks.bench_query_context --latency 0.05 --comprehensiveness 4.0
+"""
+import argparse
+import time
+
+from app.chunk_cache import NeighbourChunkCache
+from app.rag_service import gen_query_context
+from benchmarks.fakes import FakeIndex, HashingEncoder, make_corpus
+
+QUESTIONS = [
+    "What is the consensus for US payrolls and the fed guidance?",
+    "Summarise views on RBA rate cut timing and AUD",
+    "ECB inflation forecast and euro curve steepener",
+]
+
+
+def serial_neighbour_fetch(index, encoder, question, top_k):
+    # The pre-batching behaviour: one index.fetch round-trip per match
+    matches = index.query(vector=encoder([question])[0], top_k=top_k, include_metadata=True, filter={})
+    for m in matches["matches"]:
+        ids_to_fetch = [i for i in [m["metadata"]["prechunk_id"], m["metadata"]["postchunk_id"]] if i != '']
+        if ids_to_fetch:
+            index.fetch(ids=ids_to_fetch)
+    return matches
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--comprehensiveness", type=float, default=4.0)
+    args = parser.parse_args()
+
+    encoder = HashingEncoder()
+    index = FakeIndex(make_corpus(), encoder, latency=args.latency)
+    top_k = min(max(int(8 * args.comprehensiveness), 5), 30)
+
+    def run(label, fn):
+        index.reset_counts()
+        start = time.perf_counter()
+        for question in QUESTIONS:
+            fn(question)
+        elapsed = (time.perf_counter() - start) / len(QUESTIONS)
+        print(f"{label:<28} {elapsed * 1000:8.1f} ms/question  query calls={index.query_calls:<3} fetch calls={index.fetch_calls}")
+        return elapsed
+
+    serial = run("per-match fetch", lambda q: serial_neighbour_fetch(index, encoder, q, top_k))
+    batched = run("batched fetch (no cache)", lambda q: gen_query_context(q, index, encoder, [{}], args.comprehensiveness))
+    cache = NeighbourChunkCache()
+    run("batched fetch (cold cache)", lambda q: gen_query_context(q, index, encoder, [{}], args.comprehensiveness, chunk_cache=cache))
+    warm = run("batched fetch (warm cache)", lambda q: gen_query_context(q, index, encoder, [{}], args.comprehensiveness, chunk_cache=cache))
+
+    print(f"cache: {cache.stats()}")
+    print(f"time to context: {serial * 1000:.0f} ms -> {batched * 1000:.0f} ms batched, {warm * 1000:.0f} ms warm")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Offline regression harness for BRAG retrieval and prompting.
+
+A frozen corpus (the fake corpus, built once into a LocalVectorStore plus BM25
+index under --snapshot) and its labelled queries are loaded, then every query
+runs through gen_query_context and query_openai with a stubbed LLM for each
+retrieval variant. Reports p50/p95 latency, vector-store calls, prompt tokens
+and recall@k / MRR of the labelled document, and writes them to JSON:
+
+    python -m benchmarks.bench_rag --output .cache/bench/before.json
+    python -m benchmarks.bench_rag --output .cache/bench/after.json --compare .cache/bench/before.json
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from app.chunk_cache import NeighbourChunkCache
+from app.lexical_index import LexicalIndex, tokenize
+from app.rag_service import gen_query_context, query_openai
+from app.reranker import LexicalReranker
+from app.vector_store import LocalVectorStore
+from benchmarks.fakes import EVENTS, WORDS, CountingStore, FakeOpenAI, HashingEncoder, make_corpus, make_labelled_queries
+from utils.paths import CACHE_DIR
+
+RECALL_AT = (1, 3, 5, 10)
+
+
+def load_snapshot(root, docs, queries):
+    """Build the frozen store, lexical index and labelled queries under `root` on first use, then reuse them."""
+    queries_path = os.path.join(root, "queries.json")
+    lexical_path = os.path.join(root, "lexical.pkl")
+    vocabulary = set(WORDS) | {token for event in EVENTS for token in tokenize(event)}
+    encoder = HashingEncoder(vocabulary=vocabulary)
+
+    if not os.path.exists(queries_path):
+        print(f"Building benchmark snapshot in {root}")
+        corpus = make_corpus(docs=docs)
+        LocalVectorStore.build(root, [c[0] for c in corpus], encoder([c[1] for c in corpus]), [c[2] for c in corpus])
+        lexical = LexicalIndex()
+        for chunk_id, text, metadata in corpus:
+            lexical.add(chunk_id, text, metadata["document_title"], metadata)
+        lexical.save(lexical_path)
+        titles = {metadata["doc_id"]: metadata["document_title"] for _, _, metadata in corpus}
+        labelled = [{"question": question, "doc_id": doc_id, "title": titles[doc_id]}
+                    for question, doc_id in make_labelled_queries(corpus, count=queries)]
+        with open(queries_path, "w") as f:
+            json.dump(labelled, f, indent=1)
+
+    with open(queries_path) as f:
+        labelled = json.load(f)
+    return LocalVectorStore(root), LexicalIndex.load(lexical_path), encoder, labelled
+
+
+def percentiles(values):
+    return {"p50": round(float(np.percentile(values, 50)), 2), "p95": round(float(np.percentile(values, 95)), 2)}
+
+
+def run_variant(queries, store, encoder, llm, comprehensiveness, lexical_index=None, reranker=None, context_budget=None):
+    retrieval_ms, total_ms, query_calls, fetch_calls, prompt_tokens, ranks = [], [], [], [], [], []
+    chunk_cache = NeighbourChunkCache()
+    for item in queries:
+        store.reset_counts()
+        start = time.perf_counter()
+        chunks, sources = gen_query_context(item["question"], store, encoder, [{}], comprehensiveness,
+                                            chunk_cache=chunk_cache, lexical_index=lexical_index, reranker=reranker)
+        retrieval_ms.append((time.perf_counter() - start) * 1000)
+        query_calls.append(store.query_calls)
+        fetch_calls.append(store.fetch_calls)
+
+        # The rest of rag_pipeline, minus the answer cache, against the stub LLM
+        trace = {}
+        completion = query_openai(item["question"], chunks, "", llm, sources, trace=trace, context_budget=context_budget)
+        for _ in completion:
+            pass
+        total_ms.append((time.perf_counter() - start) * 1000)
+        prompt_tokens.append(trace["prompt_tokens"])
+
+        titles = [chunk["title"] for chunk in chunks]
+        ranks.append(titles.index(item["title"]) + 1 if item["title"] in titles else None)
+
+    result = {
+        "retrieval_ms": percentiles(retrieval_ms),
+        "end_to_end_ms": percentiles(total_ms),
+        "query_calls": round(float(np.mean(query_calls)), 2),
+        "fetch_calls": round(float(np.mean(fetch_calls)), 2),
+        "prompt_tokens": {"mean": round(float(np.mean(prompt_tokens)), 1), **percentiles(prompt_tokens)},
+        "mrr": round(float(np.mean([1 / rank if rank else 0.0 for rank in ranks])), 4),
+    }
+    for k in RECALL_AT:
+        result[f"recall@{k}"] = round(float(np.mean([bool(rank and rank <= k) for rank in ranks])), 4)
+    return result
+
+
+def compare(results, previous):
+    print("\nChange vs previous run:")
+    for name, metrics in results.items():
+        old = previous.get(name)
+        if old is None:
+            continue
+        deltas = [f"{key} {metrics[key][stat] - old[key][stat]:+.1f}" for key in ("retrieval_ms", "end_to_end_ms") for stat in ("p50", "p95")]
+        deltas += [f"{key} {metrics[key] - old[key]:+.3f}" for key in ["mrr"] + [f"recall@{k}" for k in RECALL_AT]]
+        print(f"{name:<8} " + "  ".join(deltas))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--snapshot", default=os.path.join(CACHE_DIR, "bench", "rag_corpus"), help="Frozen corpus directory (built if missing)")
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every vector-store call")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds before the stub LLM starts streaming")
+    parser.add_argument("--comprehensiveness", type=float, default=1.0)
+    parser.add_argument("--context-budget", type=int, default=None)
+    parser.add_argument("--output", default=os.path.join(CACHE_DIR, "bench", "bench_rag.json"))
+    parser.add_argument("--compare", default=None, help="A previous --output file to diff against")
+    args = parser.parse_args()
+
+    local, lexical, encoder, queries = load_snapshot(args.snapshot, args.docs, args.queries)
+    store = CountingStore(local, latency=args.latency)
+    llm = FakeOpenAI(latency=args.llm_latency)
+
+    variants = {
+        "vector": {},
+        "hybrid": {"lexical_index": lexical},
+        "rerank": {"lexical_index": lexical, "reranker": LexicalReranker()},
+    }
+    results = {}
+    print(f"{len(local)} chunks, {len(queries)} labelled queries")
+    print(f"{'variant':<8} {'retr p50':>9} {'retr p95':>9} {'e2e p95':>9} {'queries':>8} {'fetches':>8} {'tokens':>7} {'R@5':>6} {'MRR':>6}")
+    for name, options in variants.items():
+        r = run_variant(queries, store, encoder, llm, args.comprehensiveness, context_budget=args.context_budget, **options)
+        results[name] = r
+        print(f"{name:<8} {r['retrieval_ms']['p50']:>9.1f} {r['retrieval_ms']['p95']:>9.1f} {r['end_to_end_ms']['p95']:>9.1f} "
+              f"{r['query_calls']:>8.1f} {r['fetch_calls']:>8.1f} {r['prompt_tokens']['mean']:>7.0f} {r['recall@5']:>6.2f} {r['mrr']:>6.3f}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump({"run": {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), **vars(args)}, "results": results}, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f)["results"])
+
+
+if __name__ == "__main__":
+    main()
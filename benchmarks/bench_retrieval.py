@@ -0,0 +1,65 @@
+"""
+Retrieval quality of vector-only vs hybrid (vector + BM25, reciprocal rank fusion)
+vs hybrid over-fetched and reranked, on a fixed labelled query set over the fake corpus. Questions name a report
+by its code, which the fake encoder (like a dense embedding) cannot see.
+
+    python -m benchmarks.bench_retrieval
+"""
+import argparse
+import time
+
+from app.lexical_index import LexicalIndex, tokenize
+from app.rag_service import fuse_lexical_matches
+from app.reranker import LexicalReranker
+from benchmarks.fakes import EVENTS, WORDS, FakeIndex, HashingEncoder, make_corpus, make_labelled_queries
+
+
+def evaluate(search, queries, top_k):
+    precision = hits = 0.0
+    start = time.perf_counter()
+    for question, relevant in queries:
+        docs = [m["metadata"]["doc_id"] for m in search(question, top_k)["matches"]]
+        precision += sum(doc_id == relevant for doc_id in docs) / top_k
+        hits += relevant in docs
+    elapsed = (time.perf_counter() - start) / len(queries)
+    return precision / len(queries), hits / len(queries), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=40)
+    args = parser.parse_args()
+
+    corpus = make_corpus(docs=args.docs)
+    queries = make_labelled_queries(corpus, count=args.queries)
+    vocabulary = set(WORDS) | {token for event in EVENTS for token in tokenize(event)}
+    encoder = HashingEncoder(vocabulary=vocabulary)
+    index = FakeIndex(corpus, encoder, latency=0.0)
+
+    lexical = LexicalIndex()
+    for chunk_id, text, metadata in corpus:
+        lexical.add(chunk_id, text, metadata["document_title"], metadata)
+
+    def vector_only(question, top_k):
+        return index.query(vector=encoder([question])[0], top_k=top_k, include_metadata=True, filter={})
+
+    def hybrid(question, top_k):
+        return fuse_lexical_matches(question, vector_only(question, top_k), index, lexical, {}, top_k)
+
+    reranker = LexicalReranker()
+
+    def reranked(question, top_k):
+        candidates = hybrid(question, reranker.candidates(top_k))
+        return reranker.rerank(question, candidates, top_k)[0]
+
+    print(f"{len(corpus)} chunks, {len(queries)} labelled queries")
+    print(f"{'top_k':>5}  {'mode':<8} {'precision':>9} {'hit rate':>9} {'ms/query':>9}")
+    for top_k in (3, 5, 10, 20):
+        for name, search in [("vector", vector_only), ("hybrid", hybrid), ("rerank", reranked)]:
+            precision, hit_rate, elapsed = evaluate(search, queries, top_k)
+            print(f"{top_k:>5}  {name:<8} {precision:>9.2f} {hit_rate:>9.2f} {elapsed * 1000:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Cold vs warm load of a snapshot through get_csv_from_sharepoint_by_path.
+
+The first load downloads and parses the CSV from a local mock Graph server; the
+second is served from the on-disk snapshot store without touching the network:
+
+    python -m benchmarks.bench_snapshot_store --latency 0.3
+"""
+import argparse
+import tempfile
+import time
+
+from benchmarks.mock_graph import MockGraphServer, MockTokenApp
+from utils import funcs
+from utils.graph_client import GraphClient
+from utils.snapshot_store import SnapshotStore
+
+SNAPSHOT_PATH = "/ProfitLoss/data_2024-09-02-09-00.csv"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.3, help="Seconds per mocked Graph request")
+    args = parser.parse_args()
+
+    with MockGraphServer(latency=args.latency) as server:
+        client = GraphClient("client", "secret", "tenant", graph_url=server.url, app=MockTokenApp(0))
+        store = SnapshotStore(root=tempfile.mkdtemp())
+        funcs.get_graph_client = lambda *a: client
+        funcs.get_snapshot_store = lambda: store
+
+        start = time.perf_counter()
+        funcs.get_csv_from_sharepoint_by_path("client", "secret", "tenant", "site", SNAPSHOT_PATH)
+        cold = time.perf_counter() - start
+
+        start = time.perf_counter()
+        funcs.get_csv_from_sharepoint_by_path("client", "secret", "tenant", "site", SNAPSHOT_PATH)
+        warm = time.perf_counter() - start
+
+        requests_made = server.requests
+
+    print(f"cold load: {cold:.3f}s")
+    print(f"warm load: {warm:.3f}s")
+    print(f"graph requests: {requests_made}")
+    print(f"store stats: {store.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Local stand-ins for the Pinecone index, the OpenAI embedding encoder and the
+OpenAI chat client, so the retrieval benchmarks run offline with a controllable
+per-call latency.
+"""
+import hashlib
+import re
+import string
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+WORDS = ("rates inflation payrolls fed rba ecb boj curve steepener cpi gdp unemployment auction "
+         "yield spread dollar euro yen aud nzd cad gbp oil gold equities credit volatility "
+         "hawkish dovish cut hike pause guidance forecast survey consensus surprise risk").split()
+EVENTS = ["RBA minutes", "US payrolls", "ECB decision", "China CPI", "BoJ outlook", "UK gilts auction",
+          "NZ GDP", "Canada jobs", "Fed minutes", "Australia CPI"]
+
+
+class HashingEncoder:
+    """
+    Deterministic bag-of-words encoder with the same call shape as semantic_router's
+    encoders. With a `vocabulary`, other tokens (tickers, report codes) are ignored,
+    roughly how dense embeddings underweight rare exact terms.
+    """
+
+    def __init__(self, dim=256, latency=0.0, vocabulary=None):
+        self.dim = dim
+        self.latency = latency
+        self.vocabulary = set(vocabulary) if vocabulary is not None else None
+        self.calls = 0
+
+    def __call__(self, docs):
+        self.calls += 1
+        time.sleep(self.latency)
+        vectors = []
+        for doc in docs:
+            vector = np.zeros(self.dim, dtype=np.float32)
+            for token in re.findall(r'\w+', doc.lower()):
+                if self.vocabulary is not None and token not in self.vocabulary:
+                    continue
+                vector[int(hashlib.md5(token.encode()).hexdigest(), 16) % self.dim] += 1.0
+            norm = np.linalg.norm(vector)
+            vectors.append((vector / norm if norm else vector).tolist())
+        return vectors
+
+
+def make_corpus(docs=200, chunks_per_doc=12, seed=0):
+    """
+    Return [(chunk_id, text, metadata)] with linked prechunk/postchunk ids, like the
+    ingested index. Each document has a six-letter report code and an event in
+    its title, both repeated in its first chunks.
+    """
+    rng = np.random.default_rng(seed)
+    corpus = []
+    for d in range(docs):
+        doc_id = f"doc{d}"
+        code = "".join(rng.choice(list(string.ascii_uppercase), size=6))
+        event = EVENTS[d % len(EVENTS)]
+        title = f"{code} {event} note {d}"
+        created_at = 1_700_000_000 + d * 3600
+        for c in range(chunks_per_doc):
+            chunk_id = f"{doc_id}#{c}"
+            text = " ".join(rng.choice(WORDS, size=60))
+            if c < 3:
+                text = f"{code} {event}. {text}"
+            corpus.append((chunk_id, text, {
+                "content": text,
+                "document_title": title,
+                "doc_id": doc_id,
+                "web_url": f"https://example.invalid/{doc_id}",
+                "file_created_at": created_at,
+                "file_created_at_unix": created_at,
+                "file_sender": f"analyst{d % 7}@example.invalid",
+                "prechunk_id": f"{doc_id}#{c - 1}" if c > 0 else "",
+                "postchunk_id": f"{doc_id}#{c + 1}" if c < chunks_per_doc - 1 else "",
+            }))
+    return corpus
+
+
+def make_labelled_queries(corpus, count=40, seed=1):
+    """Return [(question, relevant_doc_id)] asking about a report by its code and event."""
+    rng = np.random.default_rng(seed)
+    titles = {}
+    for _, _, metadata in corpus:
+        titles.setdefault(metadata["doc_id"], metadata["document_title"])
+    doc_ids = sorted(titles)
+    queries = []
+    for doc_id in rng.choice(doc_ids, size=min(count, len(doc_ids)), replace=False):
+        code, rest = titles[doc_id].split(" ", 1)
+        event = rest.rsplit(" note", 1)[0]
+        queries.append((f"What does {code} say about the {event} and rates?", str(doc_id)))
+    return queries
+
+
+def matches_filter(metadata, query_filter):
+    for key, condition in (query_filter or {}).items():
+        value = metadata.get(key)
+        if isinstance(condition, dict):
+            for op, operand in condition.items():
+                if value is None:
+                    return False
+                if op == "$gte" and not value >= operand:
+                    return False
+                if op == "$lte" and not value <= operand:
+                    return False
+                if op == "$eq" and not value == operand:
+                    return False
+                if op == "$in" and value not in operand:
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+class FakeIndex:
+    """
+    In-memory index with Pinecone's query/fetch call shape. Every call sleeps
+    `latency` seconds to model the network round-trip and is counted.
+    """
+
+    def __init__(self, corpus, encoder, latency=0.05):
+        self.latency = latency
+        self.ids = [chunk_id for chunk_id, _, _ in corpus]
+        self.metadata = {chunk_id: metadata for chunk_id, _, metadata in corpus}
+        self.vectors = np.asarray(encoder([text for _, text, _ in corpus]), dtype=np.float32)
+        self.query_calls = 0
+        self.fetch_calls = 0
+        self._lock = threading.Lock()
+
+    def query(self, vector, top_k, include_metadata=True, filter=None):
+        with self._lock:
+            self.query_calls += 1
+        time.sleep(self.latency)
+        scores = self.vectors @ np.asarray(vector, dtype=np.float32)
+        order = np.argsort(-scores)
+        matches = []
+        for i in order:
+            metadata = self.metadata[self.ids[i]]
+            if matches_filter(metadata, filter):
+                matches.append({"id": self.ids[i], "score": float(scores[i]), "metadata": metadata})
+                if len(matches) == top_k:
+                    break
+        return {"matches": matches}
+
+    def fetch(self, ids):
+        with self._lock:
+            self.fetch_calls += 1
+        time.sleep(self.latency)
+        return {"vectors": {chunk_id: {"id": chunk_id, "metadata": self.metadata[chunk_id]} for chunk_id in ids if chunk_id in self.metadata}}
+
+    def reset_counts(self):
+        self.query_calls = 0
+        self.fetch_calls = 0
+
+
+class CountingStore:
+    """Wraps a vector store (e.g. a LocalVectorStore) to add per-call latency and count calls."""
+
+    def __init__(self, store, latency=0.0):
+        self.store = store
+        self.latency = latency
+        self.query_calls = 0
+        self.fetch_calls = 0
+        self._lock = threading.Lock()
+
+    def query(self, vector, top_k, include_metadata=True, filter=None):
+        with self._lock:
+            self.query_calls += 1
+        time.sleep(self.latency)
+        return self.store.query(vector, top_k, include_metadata=include_metadata, filter=filter)
+
+    def fetch(self, ids):
+        with self._lock:
+            self.fetch_calls += 1
+        time.sleep(self.latency)
+        return self.store.fetch(ids)
+
+    def corpus_version(self):
+        return self.store.corpus_version()
+
+    def reset_counts(self):
+        self.query_calls = 0
+        self.fetch_calls = 0
+
+
+class FakeOpenAI:
+    """
+    Stand-in for the OpenAI client: chat.completions.create waits `latency`
+    seconds, then streams `answer` a few words per chunk. The last request's
+    messages are kept for inspection.
+    """
+
+    def __init__(self, answer="The desk view is unchanged [1]. " * 20, latency=0.0, words_per_chunk=4):
+        self.answer = answer
+        self.latency = latency
+        self.words_per_chunk = words_per_chunk
+        self.calls = 0
+        self.last_messages = None
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model, messages, temperature=None, stream=False):
+        self.calls += 1
+        self.last_messages = messages
+        time.sleep(self.latency)
+        words = self.answer.split(" ")
+        pieces = [" ".join(words[i:i + self.words_per_chunk]) + " " for i in range(0, len(words), self.words_per_chunk)]
+        return (SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))]) for piece in pieces)
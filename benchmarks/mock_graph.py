@@ -0,0 +1,82 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SAMPLE_PNL_CSV = (
+    "Book Name,Holding Scenario,Description,Active,FundShortName,Quantity,$ Daily P&L,$ WTD P&L,$ MTD P&L,$ YTD P&L,$ ITD P&L\n"
+    + "".join(
+        f"DM FX,Base,AUD/USD {i},Y,MKR,\"{i * 1000:,}\",\"${i * 10:,}\",\"({i * 5:,})\",\"{i * 20:,}\",\"{i * 40:,}\",\"{i * 80:,}\"\n"
+        for i in range(1, 501)
+    )
+)
+
+
+class MockGraphServer:
+    """
+    Minimal stand-in for the Graph drive content endpoint.
+
+    Every GET sleeps for `latency` seconds to mimic a slow link and then returns
+    `body` (or the result of calling it with the request path).
+    """
+
+    def __init__(self, latency=0.25, body=SAMPLE_PNL_CSV):
+        self.latency = latency
+        self.body = body
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                time.sleep(server.latency)
+                content = server.body(self.path) if callable(server.body) else server.body
+                status = 200
+                if isinstance(content, tuple):
+                    status, content = content
+                payload = content.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "text/csv")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address
+        return f"http://{host}:{port}/v1.0"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+class MockTokenApp:
+    """Stands in for msal.ConfidentialClientApplication with a slow token handshake."""
+
+    def __init__(self, latency=0.4, expires_in=3600):
+        self.latency = latency
+        self.expires_in = expires_in
+
+    def acquire_token_for_client(self, scopes):
+        time.sleep(self.latency)
+        return {"access_token": "mock-token", "expires_in": self.expires_in}
@@ -1,9 +1,11 @@
+import asyncio
 import streamlit as st
 import pytz
 from datetime import datetime, timedelta
-from utils.chat_funcs import check_password, create_new_chat, update_chat_name, generate_subject, delete_chat, load_user_chats, save_user_chats
-from utils.funcs import get_mongo_access
-from app.rag_service import init_connections, rag_pipeline
+from utils.chat_funcs import check_password, create_new_chat, update_chat_name, generate_subject, delete_chat, load_user_chats, load_chat_messages, append_chat_messages, render_chat_history, chat_list_page, chat_list_controls, chat_list_pager
+from utils.chat_store import get_chat_store
+from app.rag_service import init_connections, rag_pipeline_async, stream_completion, StageTimer
+from app.embedding_cache import show_embedding_cache_stats
 import time
 
 ### Helper Functions ###########################################################################################
@@ -56,12 +58,10 @@ curr_country_dict = {
     "India 🇮🇳": "INR"
 }
 
-client = get_mongo_access()
-db = client[st.secrets["MONGO_DB_NAME"]]
-custom_chats_collection = db["chats.betterrag_user_chats"]
+chat_store = get_chat_store("chats.betterrag_user_chats")
 
 if 'chats' not in st.session_state:
-    st.session_state.chats = load_user_chats(st.session_state.logged_in_user, custom_chats_collection)
+    st.session_state.chats = load_user_chats(st.session_state.logged_in_user, chat_store)
 if 'current_chat_id' not in st.session_state:
     st.session_state.current_chat_id = None
 if 'preloaded_prompt_processed' not in st.session_state:
@@ -102,7 +102,7 @@ if preloaded_prompt:
         st.session_state.answer_detail = float(answer_detail)
     
     st.session_state.show_preloaded_buttons = False
-    create_new_chat()
+    create_new_chat(st.session_state.logged_in_user, chat_store)
     st.session_state.preloaded_prompt_processed = True
     st.query_params.clear()
 
@@ -171,16 +171,20 @@ encoder, index, oai_client = init_connections()
 
 # Configure Sidebar ###########################################################################################
 st.sidebar.title(f"Welcome, {st.session_state.logged_in_user}!")
+show_embedding_cache_stats()
+if st.session_state.get("rag_timings"):
+    st.sidebar.caption(f"Last answer: {st.session_state.rag_timings}")
 if st.sidebar.button("🏠", key="home_button", help="Return to BRAG Home", use_container_width=True):
     st.session_state.current_chat_id = None
     st.rerun()
 if st.sidebar.button("➕", key="new_chat", use_container_width=True):
     st.session_state.doc_filter = None
-    save_user_chats(st.session_state.logged_in_user, st.session_state.chats, custom_chats_collection)
-    create_new_chat()
+    create_new_chat(st.session_state.logged_in_user, chat_store)
 st.sidebar.divider()
 st.sidebar.write("Existing Chats:")
-for chat_id, chat_data in st.session_state.chats.items():
+search, page = chat_list_controls("sidebar_chats", st.sidebar)
+sidebar_chats, sidebar_pages = chat_list_page(st.session_state.chats, search, page)
+for chat_id, chat_data in sidebar_chats:
     if isinstance(chat_data, dict) and 'name' in chat_data:
         truncated_name = chat_data['name']
         col1, col2 = st.sidebar.columns([0.9, 0.1])
@@ -193,13 +197,14 @@ for chat_id, chat_data in st.session_state.chats.items():
                     st.session_state.current_chat_id = chat_id
         with col2:
             if st.button("🗑️", key=f"delete_{chat_id}", use_container_width=True):
-                delete_chat(chat_id, st.session_state.logged_in_user, custom_chats_collection, rerun=True)
+                delete_chat(chat_id, st.session_state.logged_in_user, chat_store, rerun=True)
+chat_list_pager("sidebar_chats", sidebar_pages, st.sidebar)
 st.divider()
 ###################################################################################################################
 
 # Chat UI #########################################################################################################
 if st.session_state.current_chat_id:
-    current_chat = st.session_state.chats[st.session_state.current_chat_id]
+    current_chat = load_chat_messages(st.session_state.current_chat_id, st.session_state.logged_in_user, chat_store)
     col1, col2 = st.columns([10, 1])
     with col1:
         title_placeholder = st.empty()
@@ -207,8 +212,7 @@ if st.session_state.current_chat_id:
     with col2:
         if st.button("➕", key="interior_new_chat", help="Create a new chat", use_container_width=True, type="secondary"):
             st.session_state.doc_filter = None
-            save_user_chats(st.session_state.logged_in_user, st.session_state.chats, custom_chats_collection)
-            create_new_chat()
+            create_new_chat(st.session_state.logged_in_user, chat_store)
             st.rerun()
 
     # No existing messages, show preloaded buttons
@@ -282,10 +286,8 @@ if st.session_state.current_chat_id:
                 st.session_state.show_preloaded_buttons = False
                 st.rerun()
     
-    # Show existing messages
-    for message in current_chat['messages']:
-        with st.chat_message(message['role'], avatar='images/icon.png' if message["role"] == "assistant" else "human"):
-            st.markdown(message['content'])
+    # Show the latest messages; older ones load on demand
+    render_chat_history(st.session_state.current_chat_id, st.session_state.logged_in_user, chat_store)
     
     # Show Chat Input Box
     prompt = st.chat_input(f"How can I help you this {'evening' if datetime.now(aest).hour >=18 else 'afternoon' if datetime.now(aest).hour>=12 else 'morning'}?")
@@ -295,17 +297,7 @@ if st.session_state.current_chat_id:
         st.session_state.autofill_prompt = None
         st.session_state.show_preloaded_buttons = False
         # st.session_state.preloaded_prompt_processed = True
-        # If no existing messages, generate a subject
-        if len(current_chat['messages']) == 0:
-            stream = generate_subject(prompt, oai_client)
-
-            full_chat_name = ""
-            for chunk in stream:
-                if chunk.choices[0].delta.content is not None:
-                    full_chat_name += chunk.choices[0].delta.content
-                    title_placeholder.subheader(full_chat_name)
-
-            update_chat_name(st.session_state.current_chat_id, full_chat_name)
+        first_message = len(current_chat['messages']) == 0
         
         # Add user prompt to the chat
         with st.chat_message("user"):
@@ -317,20 +309,30 @@ if st.session_state.current_chat_id:
         # Generate a response
         with st.chat_message("assistant", avatar="images/icon.png"):
             message_placeholder = st.empty()
-            full_response = ""
-            with st.spinner("Researching..."):
-                if st.session_state.doc_filter:
-                    completion, sources = rag_pipeline(prompt, index, conversation, encoder, oai_client, [st.session_state.pinecone_date_filter, st.session_state.doc_filter], st.session_state.search_comprehensiveness, st.session_state.answer_detail)
-                    # st.session_state.doc_filter = None
-                else:
-                    completion, sources = rag_pipeline(prompt, index, conversation, encoder, oai_client, [st.session_state.pinecone_date_filter], st.session_state.search_comprehensiveness, st.session_state.answer_detail)
-            for response in completion:
-                if isinstance(response, str):
-                    full_response += response
-                else:
-                    if response.choices[0].delta.content is not None:
-                        full_response += response.choices[0].delta.content
-                        message_placeholder.markdown(full_response + "▌")
+            message_placeholder.markdown("_Researching..._")
+            if st.session_state.doc_filter:
+                filters = [st.session_state.pinecone_date_filter, st.session_state.doc_filter]
+            else:
+                filters = [st.session_state.pinecone_date_filter]
+            timer = StageTimer()
+
+            async def name_chat():
+                # If no existing messages, generate a subject while the answer is being researched
+                stream = await asyncio.to_thread(generate_subject, prompt, oai_client)
+                return await stream_completion(stream, title_placeholder.subheader)
+
+            async def respond():
+                answer = rag_pipeline_async(prompt, index, conversation, encoder, oai_client, filters,
+                                            st.session_state.search_comprehensiveness, st.session_state.answer_detail,
+                                            on_text=lambda text: message_placeholder.markdown(text + "▌"), timer=timer)
+                if not first_message:
+                    return await answer
+                full_chat_name, result = await asyncio.gather(name_chat(), answer)
+                update_chat_name(st.session_state.current_chat_id, full_chat_name, st.session_state.logged_in_user, chat_store)
+                return result
+
+            full_response, sources = asyncio.run(respond())
+            st.session_state.rag_timings = timer.summary()
             
             if sources:
                 sources_md = "\n\n### Sources:\n"
@@ -342,20 +344,22 @@ if st.session_state.current_chat_id:
             message_placeholder.markdown(full_response)
 
         
-        current_chat['messages'].append({"role": "user", "content": prompt})
-        current_chat['messages'].append({"role": "assistant", "content": full_response})
-        save_user_chats(st.session_state.logged_in_user, st.session_state.chats, custom_chats_collection)
+        append_chat_messages(st.session_state.current_chat_id, [
+            {"role": "user", "content": prompt},
+            {"role": "assistant", "content": full_response}
+        ], st.session_state.logged_in_user, chat_store)
         st.rerun()
 else:
     st.info("Please create a new chat or select an existing one from below:")
     if st.button("➕", key="interior_new_chat", help="Create a new chat", use_container_width=True, type="secondary"):
         st.session_state.doc_filter = None
-        save_user_chats(st.session_state.logged_in_user, st.session_state.chats, custom_chats_collection)
-        create_new_chat()
+        create_new_chat(st.session_state.logged_in_user, chat_store)
         st.rerun()
 
     if len(st.session_state.chats) > 0:
-        for chat_id, chat_data in st.session_state.chats.items():
+        search, page = chat_list_controls("body_chats")
+        body_chats, body_pages = chat_list_page(st.session_state.chats, search, page)
+        for chat_id, chat_data in body_chats:
             if isinstance(chat_data, dict) and 'name' in chat_data:
                 col1, col2 = st.columns([9, 1])
                 with col1:
@@ -363,18 +367,18 @@ else:
                         st.session_state.current_chat_id = chat_id
                 with col2:
                     if st.button("🗑️", key=f"body_delete_{chat_id}", use_container_width=True, help="Delete the selected chat"):
-                        delete_chat(chat_id, st.session_state.logged_in_user, custom_chats_collection, rerun=True)
+                        delete_chat(chat_id, st.session_state.logged_in_user, chat_store, rerun=True)
+        chat_list_pager("body_chats", body_pages)
 
     if st.button("⚠️ Delete All", key="interior_delete_all", use_container_width=True):
         print(st.session_state.chats)
         chat_ids_to_delete = list(st.session_state.chats.keys())
         for chat_id in chat_ids_to_delete:
             print("Deleted chat", chat_id)
-            delete_chat(chat_id, st.session_state.logged_in_user, custom_chats_collection, rerun=False)
+            delete_chat(chat_id, st.session_state.logged_in_user, chat_store, rerun=False)
 
         st.session_state.chats = {}
         st.session_state.current_chat_id = None
-        save_user_chats(st.session_state.logged_in_user, st.session_state.chats, custom_chats_collection)
         st.rerun()
 ###################################################################################################################
 
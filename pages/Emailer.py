@@ -81,7 +81,7 @@ with col2:
     if st.button("Send Latest", key="send_latest", use_container_width=True):
         progress_bar = st.progress(0)
         print("Getting data")
-        most_recent_time, data, curr_exp_data, dv01_data, cvar_data = get_data()
+        most_recent_time, data, curr_exp_data, dv01_data, cvar_data = get_data(refresh=True)
         print("Data received")
         if data is not None:
             print("Data exists")
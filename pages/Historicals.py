@@ -7,6 +7,7 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from utils.funcs import create_heatmap, create_dv01_bar_chart, get_data, process_24h_data, get_historical_data
 from utils.chat_funcs import check_password
+from utils.snapshot_store import show_snapshot_cache_stats
 from datetime import datetime
 import pytz
 import plotly.io as pio
@@ -21,6 +22,7 @@ if not check_password():
     st.stop()
 
 st.sidebar.title(f"Welcome, {st.session_state.logged_in_user}!")
+show_snapshot_cache_stats()
 
 with tab1:
         if 'selected_date' not in st.session_state:
@@ -40,27 +42,42 @@ with tab1:
         formatted_date = selected_date.strftime('%Y-%m-%d')
         formatted_time = selected_time.strftime('%H-%M')    
     
+        if 'combined_df' not in st.session_state:
+            st.session_state.combined_df = None
+        if 'missing_hours' not in st.session_state:
+            st.session_state.missing_hours = []
+
         if st.button("Calculate Intraday P&L"):
             progress_bar = st.progress(0)
             status_text = st.empty()
             status_text.text("Loading data...")
-            st.session_state.combined_df = process_24h_data(f"{formatted_date}-{formatted_time}")
-            progress_bar.progress(100)
+
+            def show_progress(done, total, hour, loaded):
+                progress_bar.progress(done / total)
+                status_text.text(f"Loaded {done}/{total} files ({hour.strftime('%H:%M')} {'ok' if loaded else 'missing'})")
+
+            st.session_state.combined_df, st.session_state.missing_hours = process_24h_data(
+                f"{formatted_date}-{formatted_time}", progress_callback=show_progress
+            )
             status_text.text("Data Loaded!")
         else:
             combined_df = None
             st.warning("Please click 'Calculate Intraday P&L' to load the data.")
 
+        if st.session_state.missing_hours:
+            with st.expander(f"{len(st.session_state.missing_hours)} hourly file(s) missing"):
+                st.dataframe(pd.DataFrame(st.session_state.missing_hours, columns=['Hour', 'Reason']), hide_index=True)
+
         st.divider()
-        if st.session_state.combined_df is not None:
+        if st.session_state.combined_df is not None and st.session_state.combined_df.empty:
+            st.warning("No hourly files were available for the selected period.")
+        elif st.session_state.combined_df is not None:
             combined_df = st.session_state.combined_df
             # Drop rows with null in 'Book Name' column
             combined_df = combined_df.dropna(subset=['FundShortName'])
 
-            combined_df['date'] = pd.to_datetime(combined_df['date'], format='%Y-%m-%d-%H-%M')
-
             # Group by date and book name, then sum the '$ Daily P&L'
-            grouped = combined_df.groupby(['date', 'Book Name'])['$ Daily P&L'].sum().reset_index()
+            grouped = combined_df.groupby(['date', 'Book Name'], observed=True)['$ Daily P&L'].sum().reset_index()
 
             # Calculate the total '$ Daily P&L' across all book names
             total_pnl = grouped.groupby('date')['$ Daily P&L'].sum().reset_index()
@@ -107,8 +124,13 @@ with tab2:
     if st.button("Calculate Historical P&L"):
         progress_bar = st.progress(0)
         status_text = st.empty()
-        status_text.text("Loading data...")
-        st.session_state.historical_data = get_historical_data()
+        status_text.text("Checking for new days...")
+
+        def show_history_progress(done, total, day, loaded):
+            progress_bar.progress(done / total)
+            status_text.text(f"Downloaded {done}/{total} new day(s) ({day})")
+
+        st.session_state.historical_data = get_historical_data(progress_callback=show_history_progress)
         progress_bar.progress(100)
         status_text.text("Data Loaded!")
     else:
@@ -116,18 +138,18 @@ with tab2:
         st.warning("Please click 'Calculate Historical P&L' to load the data.")
     st.divider()
 
-    if st.session_state.historical_data is not None:
+    if st.session_state.historical_data is not None and st.session_state.historical_data.empty:
+        st.warning("No historical data is available yet.")
+    elif st.session_state.historical_data is not None:
 
         hist_data = st.session_state.historical_data
 
         hist_data = hist_data.dropna(subset=['FundShortName'])
 
-        hist_data['date'] = pd.to_datetime(hist_data['date'], format='%Y-%m-%d-%H-%M')
-
         # Group by date and book name, then sum the '$ Daily P&L'
-        grouped_hist_daily = hist_data.groupby(['date', 'Book Name'])['$ Daily P&L'].sum().reset_index()
-        grouped_hist_ytd = hist_data.groupby(['date', 'Book Name'])['$ YTD P&L'].sum().reset_index()
-        grouped_hist_itd = hist_data.groupby(['date', 'Book Name'])['$ ITD P&L'].sum().reset_index()
+        grouped_hist_daily = hist_data.groupby(['date', 'Book Name'], observed=True)['$ Daily P&L'].sum().reset_index()
+        grouped_hist_ytd = hist_data.groupby(['date', 'Book Name'], observed=True)['$ YTD P&L'].sum().reset_index()
+        grouped_hist_itd = hist_data.groupby(['date', 'Book Name'], observed=True)['$ ITD P&L'].sum().reset_index()
 
         grouped_hist_daily['date'] = pd.to_datetime(grouped_hist_daily['date'], format='%Y-%m-%d').dt.strftime('%Y-%m-%d')
         grouped_hist_ytd['date'] = pd.to_datetime(grouped_hist_ytd['date'], format='%Y-%m-%d').dt.strftime('%Y-%m-%d')
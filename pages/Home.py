@@ -1,6 +1,8 @@
 import streamlit as st
 from utils.chat_funcs import check_password
 from utils.funcs import get_data
+from utils.snapshot_store import show_snapshot_cache_stats
+from utils.pnl_cube import get_book_cube
 import time
 import pandas as pd
 import math
@@ -108,10 +110,11 @@ if st.session_state.data is None:
     time.sleep(5)
     message_placeholder.empty()
 
-daily = "${:,.0f}".format(float(st.session_state.data.iloc[0]['$ Daily P&L']))
-weekly = "${:,.0f}".format(float(st.session_state.data.iloc[0]['$ WTD P&L']))
-yearly = "${:,.0f}".format(float(st.session_state.data.iloc[0]['$ YTD P&L']))
-inception = "${:,.0f}".format(float(st.session_state.data.iloc[0]['$ ITD P&L']))
+fund_totals = get_book_cube(str(st.session_state.update_time), st.session_state.data).fund_totals
+daily = "${:,.0f}".format(float(fund_totals['$ Daily P&L']))
+weekly = "${:,.0f}".format(float(fund_totals['$ WTD P&L']))
+yearly = "${:,.0f}".format(float(fund_totals['$ YTD P&L']))
+inception = "${:,.0f}".format(float(fund_totals['$ ITD P&L']))
 
 st.divider()
 mcol1, mcol2, mcol3, mcol4 = st.columns(4)
@@ -275,6 +278,7 @@ st.markdown(
 st.image("images/mt_aspiring.jpg", use_column_width=True)
 st.divider()
 
+show_snapshot_cache_stats()
 if st.sidebar.button("Logout"):
     for key in list(st.session_state.keys()):
         del st.session_state[key]
@@ -3,9 +3,8 @@ import pandas as pd
 import numpy as np
 from pinecone import Pinecone
 from pinecone_plugins.assistant.models.chat import Message
-from utils.chat_funcs import upload_files, list_and_delete_files, get_file_list, create_new_chat, update_chat_name, generate_subject, delete_chat, load_user_chats, save_user_chats, check_password
-from pymongo import MongoClient
-from utils.funcs import get_mongo_access
+from utils.chat_funcs import upload_files, list_and_delete_files, get_file_list, create_new_chat, update_chat_name, generate_subject, delete_chat, load_user_chats, load_chat_messages, load_full_chat_messages, append_chat_messages, render_chat_history, chat_list_page, chat_list_controls, chat_list_pager, check_password
+from utils.chat_store import get_chat_store
 
 if not check_password():
     st.stop()
@@ -16,10 +15,7 @@ assistant = pc.assistant.Assistant(
     assistant_name=st.secrets["PINECONE_ASSISTANT_NAME"]
 )
 
-# client = MongoClient(st.secrets["MONGO_URI"])
-client = get_mongo_access()
-db = client[st.secrets["MONGO_DB_NAME"]]
-chats_collection = db["chats.user_chats"]
+chat_store = get_chat_store("chats.user_chats")
 
 # st.image('images/Original Logo.png')
 
@@ -27,7 +23,7 @@ chats_collection = db["chats.user_chats"]
 tab1, tab2 = st.tabs(["Chat", "Manage Files"])
 
 if 'chats' not in st.session_state:
-    st.session_state.chats = load_user_chats(st.session_state.logged_in_user, chats_collection)
+    st.session_state.chats = load_user_chats(st.session_state.logged_in_user, chat_store)
 
 if 'current_chat_id' not in st.session_state:
     st.session_state.current_chat_id = None
@@ -36,12 +32,13 @@ if 'current_chat_id' not in st.session_state:
 st.sidebar.title(f"Welcome, {st.session_state.logged_in_user}!")
 
 if st.sidebar.button("New Chat", key="new_chat"):
-    create_new_chat()
-    save_user_chats(st.session_state.logged_in_user, st.session_state.chats, chats_collection)
+    create_new_chat(st.session_state.logged_in_user, chat_store)
 
 st.sidebar.write("Existing Chats:")
+search, page = chat_list_controls("sidebar_chats", st.sidebar)
+sidebar_chats, sidebar_pages = chat_list_page(st.session_state.chats, search, page)
 cols = st.sidebar.columns(2)  # Create 2 columns
-for i, (chat_id, chat_data) in enumerate(st.session_state.chats.items()):
+for i, (chat_id, chat_data) in enumerate(sidebar_chats):
     col = cols[i % 2]  # Alternate between columns
     with col:
         if isinstance(chat_data, dict) and 'name' in chat_data:
@@ -53,8 +50,8 @@ for i, (chat_id, chat_data) in enumerate(st.session_state.chats.items()):
                 st.session_state.current_chat_id = chat_id
             # Add delete button
             if chat_container.button("🗑️", key=f"delete_{chat_id}", use_container_width=True):
-                delete_chat(chat_id)
-                save_user_chats(st.session_state.logged_in_user, st.session_state.chats, chats_collection)
+                delete_chat(chat_id, st.session_state.logged_in_user, chat_store)
+chat_list_pager("sidebar_chats", sidebar_pages, st.sidebar)
 
 with tab1:
     # st.markdown("---")
@@ -66,43 +63,43 @@ with tab1:
         st.info("No files uploaded yet. You can upload files in the 'Manage Files' tab.")
 
     if st.session_state.current_chat_id:
-        current_chat = st.session_state.chats[st.session_state.current_chat_id]
+        current_chat = load_chat_messages(st.session_state.current_chat_id, st.session_state.logged_in_user, chat_store)
         st.subheader(f"Current Chat: {current_chat.get('name', 'Unnamed Chat')}")
 
-        # Display chat messages
-        if 'messages' in current_chat:
-            for message in current_chat['messages']:
-                with st.chat_message(message["role"], avatar='images/icon.png' if message["role"] == "assistant" else "human"):
-                    st.markdown(message["content"])
+        # Display the latest chat messages; older ones load on demand
+        render_chat_history(st.session_state.current_chat_id, st.session_state.logged_in_user, chat_store)
 
         # Chat input
         if prompt := st.chat_input("What would you like to know?"):
-            if 'messages' not in current_chat:
-                current_chat['messages'] = []
-            current_chat['messages'].append({"role": "user", "content": prompt})
             with st.chat_message("user"):
                 st.markdown(prompt)
 
-            if len(current_chat['messages']) == 1:
+            if len(current_chat['messages']) == 0:
                 new_chat_name = generate_subject(prompt)
-                update_chat_name(st.session_state.current_chat_id, new_chat_name)
+                update_chat_name(st.session_state.current_chat_id, new_chat_name, st.session_state.logged_in_user, chat_store)
  
             with st.chat_message("assistant", avatar='images/icon.png'):
                 message_placeholder = st.empty()
                 full_response = ""
-                chat_context = [Message(content=msg['content'], role=msg['role']) for msg in current_chat['messages']]
+                # The assistant gets the whole conversation, not just the displayed page
+                history = load_full_chat_messages(st.session_state.current_chat_id, st.session_state.logged_in_user, chat_store)
+                chat_context = [Message(content=msg['content'], role=msg['role']) for msg in history + [{"role": "user", "content": prompt}]]
                 for response in assistant.chat_completions(messages=chat_context, stream=True):
                     if response.choices[0].delta.content is not None:
                         full_response += response.choices[0].delta.content
                         message_placeholder.markdown(full_response + "▌")
                 message_placeholder.markdown(full_response)
-            current_chat['messages'].append({"role": "assistant", "content": full_response})
-            save_user_chats(st.session_state.logged_in_user, st.session_state.chats, chats_collection)
+            append_chat_messages(st.session_state.current_chat_id, [
+                {"role": "user", "content": prompt},
+                {"role": "assistant", "content": full_response}
+            ], st.session_state.logged_in_user, chat_store)
             st.rerun()
     else:
         st.info("Please create a new chat or select an existing one from below:")
+        search, page = chat_list_controls("body_chats")
+        body_chats, body_pages = chat_list_page(st.session_state.chats, search, page)
         body_cols = st.columns(2)  # Create 2 columns
-        for i, (chat_id, chat_data) in enumerate(st.session_state.chats.items()):
+        for i, (chat_id, chat_data) in enumerate(body_chats):
             col = body_cols[i % 2]  # Alternate between columns
             with col:
                 if isinstance(chat_data, dict) and 'name' in chat_data:
@@ -114,8 +111,8 @@ with tab1:
                         st.session_state.current_chat_id = chat_id
                     # Add delete button
                     if chat_container.button("🗑️", key=f"body_delete_{chat_id}", use_container_width=True):
-                        delete_chat(chat_id)
-                        save_user_chats(st.session_state.logged_in_user, st.session_state.chats, chats_collection)
+                        delete_chat(chat_id, st.session_state.logged_in_user, chat_store)
+        chat_list_pager("body_chats", body_pages)
         
 
 with tab2:
@@ -27,7 +27,7 @@ if st.button("Refresh Data"):
     progress_bar = st.progress(0)
     status_text = st.empty()
     status_text.text("Loading data...")
-    st.session_state.update_time, st.session_state.data, st.session_state.curr_exp_data, st.session_state.dv01_data, st.session_state.cvar_data  = get_data()
+    st.session_state.update_time, st.session_state.data, st.session_state.curr_exp_data, st.session_state.dv01_data, st.session_state.cvar_data  = get_data(refresh=True)
     progress_bar.progress(100)
     status_text.text("Data Loaded!")
 st.divider()    
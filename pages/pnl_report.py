@@ -11,6 +11,8 @@ from st_pages import add_page_title, get_nav_from_toml
 
 from utils.funcs import extract_currency_pair, get_data
 from utils.chat_funcs import check_password
+from utils.snapshot_store import show_snapshot_cache_stats
+from utils.pnl_cube import get_book_cube
 
 pio.templates.default = "plotly"
 aest = pytz.timezone('Australia/Sydney')
@@ -30,6 +32,7 @@ if not check_password():
     st.stop()
 
 st.sidebar.title(f"Welcome, {st.session_state.logged_in_user}!")
+show_snapshot_cache_stats()
 
 st.divider()
 if 'use_latest' not in st.session_state:
@@ -69,7 +72,7 @@ else:
         progress_bar = st.progress(0)
         status_text = st.empty()
         status_text.text("Loading data...")
-        st.session_state.update_time, st.session_state.data, st.session_state.curr_exp_data, st.session_state.dv01_data, st.session_state.cvar_data  = get_data()
+        st.session_state.update_time, st.session_state.data, st.session_state.curr_exp_data, st.session_state.dv01_data, st.session_state.cvar_data  = get_data(refresh=True)
         progress_bar.progress(100)
         status_text.text("Data Loaded!")
 
@@ -83,6 +86,7 @@ else:
     dv01_data = st.session_state.dv01_data
     dv01_data = dv01_data.set_index('Currency')
     cvar_data = st.session_state.cvar_data
+    cube = get_book_cube(str(st.session_state.update_time), data)
     current_date = datetime.now(aest).strftime('%m/%d/%Y')
     current_hour = datetime.now(aest).hour
  
@@ -119,7 +123,7 @@ else:
         # Create Book Selector
         container = st.container()
         all = st.checkbox("Select all")
-        all_books = data['Book Name'].unique()
+        all_books = cube.books.index.tolist()
         
         if all:
             selected_books = container.multiselect("Select Book Name(s):",
@@ -130,14 +134,10 @@ else:
 
         # Prepare Data
         df_filtered = data[data["Book Name"].isin(selected_books)]
-        total_pnl = df_filtered.groupby("Book Name")['$ Daily P&L'].sum().reset_index()
-        total_pnl.columns = ['Book Name', 'Total Daily P&L']
-
-        total_itd_pnl = df_filtered.groupby("Book Name")['$ ITD P&L'].sum().reset_index()
-        total_itd_pnl.columns = ['Book Name', 'Total ITD P&L']
-
-        total_ytd_pnl = df_filtered.groupby("Book Name")['$ YTD P&L'].sum().reset_index()
-        total_ytd_pnl.columns = ['Book Name', 'Total YTD P&L']
+        book_totals = cube.select(selected_books)
+        total_pnl = book_totals[['Book Name', '$ Daily P&L']].rename(columns={'$ Daily P&L': 'Total Daily P&L'})
+        total_itd_pnl = book_totals[['Book Name', '$ ITD P&L']].rename(columns={'$ ITD P&L': 'Total ITD P&L'})
+        total_ytd_pnl = book_totals[['Book Name', '$ YTD P&L']].rename(columns={'$ YTD P&L': 'Total YTD P&L'})
 
         # Create Plots
         fig = px.bar(df_filtered, x="Book Name", y='$ Daily P&L', title='Contributors to Daily P&L by Book', hover_data=['Description', 'Quantity', 'Par Swap Rate'])
@@ -153,7 +153,7 @@ else:
 
         st.plotly_chart(fig_total, use_container_width=True)
         
-        dv01_total_for_print = dv01_data.drop(columns=['Description', 'Date']).groupby('Currency').sum().sum(axis=1)[:-1]['Grand Total']
+        dv01_total_for_print = dv01_data.drop(columns=['Description', 'Date']).groupby('Currency', observed=True).sum().sum(axis=1)[:-1]['Grand Total']
         st.write(f"Total DV01: ${dv01_total_for_print:,.2f}")
         st.write(f"Total CVaR: ${cvar_data.iloc[-1]['Daily Fund CVaR']:,.2f}")
         st.write(f"Total USD Exposure: ${curr_exp_data[curr_exp_data['Currency']=='USD']['Book NMV (Total)'].values[0]:,.2f}")
@@ -178,16 +178,10 @@ else:
             st.dataframe(df_filtered[['Book Name', 'Description', 'Quantity','Par Swap Rate', '$ Daily P&L', '$ YTD P&L', '$ ITD P&L']], use_container_width=True)
         else:
             
-            aggregated_data = df_filtered[['Book Name', '$ Daily P&L', '$ MTD P&L', '$ YTD P&L', '$ ITD P&L']].groupby("Book Name", as_index=False).sum()
-            aggregated_data['$ Daily P&L'] = pd.to_numeric(aggregated_data['$ Daily P&L'], errors='coerce')
-            aggregated_data['$ Daily P&L'] = aggregated_data['$ Daily P&L'].fillna(0)
-
-            total_daily_pnl = aggregated_data['$ Daily P&L'].sum()
-            total_monthly_pnl = aggregated_data['$ MTD P&L'].sum()
-            total_yearly_pnl = aggregated_data['$ YTD P&L'].sum()
-            total_itd_pnl = aggregated_data['$ ITD P&L'].sum()
-            
-            aggregated_data = pd.concat([aggregated_data, pd.DataFrame({'Book Name': ['Total'], '$ Daily P&L': [total_daily_pnl], '$ MTD P&L': [total_monthly_pnl], '$ YTD P&L': [total_yearly_pnl], '$ ITD P&L': [total_itd_pnl]})])#, ignore_index=True)
+            aggregated_data = book_totals[['Book Name', '$ Daily P&L', '$ MTD P&L', '$ YTD P&L', '$ ITD P&L']]
+            totals = cube.totals(selected_books)
+
+            aggregated_data = pd.concat([aggregated_data, pd.DataFrame({'Book Name': ['Total'], '$ Daily P&L': [totals['$ Daily P&L']], '$ MTD P&L': [totals['$ MTD P&L']], '$ YTD P&L': [totals['$ YTD P&L']], '$ ITD P&L': [totals['$ ITD P&L']]})])#, ignore_index=True)
             st.dataframe(aggregated_data, use_container_width=True)
 
         st.divider()
@@ -225,17 +219,13 @@ else:
         st.divider()
 
         # Currency Exposure Report
-        curr_data = st.session_state.data
-        # Convert Description to String object
-        curr_data['Description'] = curr_data['Description'].astype(str)
-        curr_data['Currency'] = curr_data['Description'].apply(extract_currency_pair)
-        curr_data = curr_data[['Currency', '$ NMV']]
+        curr_data = pd.DataFrame({
+            'Currency': data['Description'].str.extract(r'([A-Z]{3}/[A-Z]{3})', expand=False),
+            '$ NMV': data['$ NMV'].fillna(0),
+        })
 
         # Drop na in currency
         curr_data = curr_data.dropna(subset=["Currency"], how="any")
-        # to_numeric
-        curr_data['$ NMV'] = pd.to_numeric(curr_data['$ NMV'], errors='coerce')
-        curr_data['$ NMV'] = curr_data['$ NMV'].fillna(0)
         curr_data = curr_data.groupby("Currency").sum()
         # Add total
         total = curr_data.sum()
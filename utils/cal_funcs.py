@@ -7,7 +7,9 @@ from pinecone import Pinecone
 from pinecone_plugins.assistant.models.chat import Message
 import io
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pymongo import MongoClient
+from tenacity import retry, stop_after_attempt, wait_exponential
 from utils.funcs import get_mongo_access
 
 curr_country_dict = {
@@ -101,28 +103,123 @@ country_curr_dict = {
 }
 
 
-def generate_batch_prompt(events: pd.DataFrame) -> str:
-    curr_exp_data = st.session_state.curr_exp_data
+EXPOSURE_BUCKET_USD = 1_000_000
+PREVIEW_CONCURRENCY = 4
+
+
+def currency_exposure(country, curr_exp_data):
+    """Total book NMV in the country's currency, or None if we hold none."""
+    curr = country_curr_dict.get(country)
+    if curr_exp_data is None or curr is None:
+        return None
+    positions = curr_exp_data.loc[curr_exp_data['Currency'] == curr, 'Book NMV (Total)']
+    return positions.values[0] if not positions.empty else None
+
+
+def exposure_bucket(position, bucket_size=EXPOSURE_BUCKET_USD):
+    # Small moves in a position should not invalidate a cached analysis
+    return None if position is None else int(position // bucket_size)
+
+
+def generate_batch_prompt(events: pd.DataFrame, curr_exp_data=None) -> str:
+    if curr_exp_data is None:
+        curr_exp_data = st.session_state.get('curr_exp_data')
     
     prompt = "Using the reports we have stored from our preferred analysts, please could you provide a brief analysis for the following upcoming economic events. For each event, consider its potential impact on the market, what traders should watch for, and how it might affect the relevant currency exchange rate. If you do not have any relevant information on the particular event, please write 'No Information Available'.\n\n"
     
     for _, event in events.iterrows():
         prompt += f"- {event['EVENT_NAME']} ({event['COUNTRY_NAME']}, Impact: {event['RELEVANCY']}, Time: {event['RELEASE_DATE_TIME']})\n"
-        curr = country_curr_dict[event['COUNTRY_NAME']]
-        if curr_exp_data is not None:
-            position = curr_exp_data.loc[curr_exp_data['Currency'] == curr, 'Book NMV (Total)'].values[0] if not curr_exp_data.loc[curr_exp_data['Currency'] == curr, 'Book NMV (Total)'].empty else None
-            if position is not None:
-                prompt += f"For reference, we have a total of USD ${round(position)} exposure to the {curr} currency.\n"
+        position = currency_exposure(event['COUNTRY_NAME'], curr_exp_data)
+        if position is not None:
+            prompt += f"For reference, we have a total of USD ${round(position)} exposure to the {country_curr_dict[event['COUNTRY_NAME']]} currency.\n"
     prompt += "\nPlease provide your analysis for each event separately."
     print(prompt)
     return prompt
 
-def generate_day_ahead_preview(cal_events, assistant):
+
+@retry(stop=stop_after_attempt(4), wait=wait_exponential(multiplier=1, min=1, max=20), reraise=True)
+def analyse_event(assistant, prompt):
+    # Retried with exponential backoff on rate limits and dropped streams
+    chat_context = [Message(content=prompt, role="user")]
+    rag_response = ""
+    for response in assistant.chat_completions(messages=chat_context, stream=True):
+        if response.choices[0].delta.content is not None:
+            rag_response += response.choices[0].delta.content
+    return rag_response
+
+
+def preview_cache_key(event, curr_exp_data, bucket_size=EXPOSURE_BUCKET_USD):
+    event_id = event['ID'] if 'ID' in event and isinstance(event['ID'], str) and event['ID'] else f"{event['EVENT_NAME']}|{event['COUNTRY_NAME']}"
+    return {
+        "event_id": event_id,
+        "release_date": str(event['RELEASE_DATE_TIME']),
+        "exposure_bucket": exposure_bucket(currency_exposure(event['COUNTRY_NAME'], curr_exp_data), bucket_size),
+    }
+
+
+def get_preview_cache():
+    client = get_mongo_access()
+    db = client[st.secrets["MONGO_DB_NAME"]]
+    return db["DocumentStore.preview_analyses"]
+
+
+def generate_event_analyses(events, assistant, curr_exp_data=None, cache=None, max_workers=None, refresh=False):
+    """
+    Analyse each event with the assistant, up to `max_workers` at a time.
+    Analyses are cached by (event ID, release date, exposure bucket), so only new
+    or changed events are sent again unless `refresh` is set. Returns one
+    analysis per event, in the order given.
+    """
+    max_workers = max_workers or st.secrets.get("PREVIEW_CONCURRENCY", PREVIEW_CONCURRENCY)
+    bucket_size = st.secrets.get("PREVIEW_EXPOSURE_BUCKET_USD", EXPOSURE_BUCKET_USD)
+    if curr_exp_data is None:
+        curr_exp_data = st.session_state.get('curr_exp_data')
+    # Prompts and keys are built here, on the script thread, before any work is handed out
+    keys = [preview_cache_key(event, curr_exp_data, bucket_size) for event in events]
+    prompts = [generate_batch_prompt(pd.DataFrame([event]), curr_exp_data) for event in events]
+
+    analyses = [None] * len(events)
+    if cache is not None and not refresh:
+        for i, key in enumerate(keys):
+            cached = cache.find_one(key)
+            if cached:
+                analyses[i] = cached["analysis"]
+    todo = [i for i, analysis in enumerate(analyses) if analysis is None]
+    print(f"Day ahead preview: {len(events) - len(todo)} cached, {len(todo)} to generate")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(analyse_event, assistant, prompts[i]): i for i in todo}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                analyses[i] = future.result()
+            except Exception as e:
+                print(f"Analysis failed for {keys[i]['event_id']}: {e}")
+                analyses[i] = "Analysis not available."
+                continue
+            if cache is not None:
+                cache.update_one(keys[i], {"$set": {"analysis": analyses[i], "created_at": datetime.now()}}, upsert=True)
+    return analyses
+
+
+def format_event(event, event_analysis):
+    return (
+        "<div class='event'>"
+        f"<h3>{event['EVENT_NAME']}</h3>"
+        f"<p class='event-details'>Time: {event['RELEASE_DATE_TIME']} | Impact: {event['RELEVANCY']} | Prior: {event['PRIOR'] if not math.isnan(event['PRIOR']) else 'No Prior'} | Frequency: {event['RELEASE_FREQ']} | BBG Median: {event['SURVEY_MEDIAN'] if not math.isnan(event['SURVEY_MEDIAN']) else 'No Survey'} | BBG STD: {round(event['SURVEY_STANDARD_DEVIATION'], 2) if not math.isnan(event['SURVEY_STANDARD_DEVIATION']) else 'No Survey'} </p>"
+        "<div class='analysis'>"
+        f"<p>{event_analysis}</p>"
+        "</div>"
+        "</div>"
+    )
+
+
+def generate_day_ahead_preview(cal_events, assistant, cache=None, max_workers=None, refresh=False):
     # Filter events for today
     
     today = datetime.now().date()
     today_events = cal_events[cal_events['RELEASE_DATE_TIME'].dt.date == today]
-    today_events = today_events.reset_index(drop=True)
+    today_events = today_events.sort_values('RELEASE_DATE_TIME', kind='stable').reset_index(drop=True)
     
     report = io.StringIO()
     report.write("""
@@ -143,67 +240,20 @@ def generate_day_ahead_preview(cal_events, assistant):
         report.write("<p>No events scheduled for today.</p>")
         return report.getvalue()
     
-    # Group events by currency
+    events = [event for _, event in today_events.iterrows()]
+    if cache is None:
+        cache = get_preview_cache()
+    analyses = generate_event_analyses(events, assistant, cache=cache, max_workers=max_workers, refresh=refresh)
+
+    # Group events by country, countries in order of their first release, events by time
     events_by_country = defaultdict(list)
-    for _, event in today_events.iterrows():
-        events_by_country[event['COUNTRY_NAME']].append(event)
+    for event, event_analysis in zip(events, analyses):
+        events_by_country[event['COUNTRY_NAME']].append((event, event_analysis))
     
-    for country, events in events_by_country.items():
+    for country, country_events in events_by_country.items():
         report.write(f"<h2>{country} Events</h2>")
-        
-        # Calculate the number of batches
-        batch_size = 1
-        num_batches = math.ceil(len(events) / batch_size)
-        
-        for i in range(num_batches):
-            start_idx = i * batch_size
-            end_idx = min((i + 1) * batch_size, len(events))
-            batch_events = events[start_idx:end_idx]
-            
-            # Generate prompt for the batch
-            prompt = generate_batch_prompt(pd.DataFrame(batch_events))
-            
-            # Process with RAG assistant
-            chat_context = [Message(content=prompt, role="user")]
-            rag_response = ""
-            for response in assistant.chat_completions(messages=chat_context, stream=True):
-                if response.choices[0].delta.content is not None:
-                    rag_response += response.choices[0].delta.content
-            
-            # Display results for each event in the batch
-            for event in batch_events:
-                report.write("<div class='event'>")
-                report.write(f"<h3>{event['EVENT_NAME']}</h3>")
-                print(type(event['SURVEY_MEDIAN']))
-                print((event['SURVEY_MEDIAN']))
-                report.write(f"<p class='event-details'>Time: {event['RELEASE_DATE_TIME']} | Impact: {event['RELEVANCY']} | Prior: {event['PRIOR'] if not math.isnan(event['PRIOR']) else 'No Prior'} | Frequency: {event['RELEASE_FREQ']} | BBG Median: {event['SURVEY_MEDIAN'] if not math.isnan(event['SURVEY_MEDIAN']) else 'No Survey'} | BBG STD: {round(event['SURVEY_STANDARD_DEVIATION'], 2) if not math.isnan(event['SURVEY_STANDARD_DEVIATION']) else 'No Survey'} </p>")
-                event_analysis = rag_response
-                # Extract the relevant part of the analysis for this event
-                # event_analysis = rag_response.split(event['EVENT_NAME'])[1].split("###")[0] if event['EVENT_NAME'] in rag_response else "Analysis not available."
-                # print(rag_response)
-                # # event_analysis = next((analysis for analysis in rag_response.split('-') if event['EVENT_NAME'] in analysis), "Analysis not available.")
-                # if rag_response.strip():
-                #     # Extract the relevant part of the analysis for this event
-                #     event_header = f"### {event['EVENT_NAME']}"
-                #     next_event_header = "### "
-                #     start_index = rag_response.find(event_header)
-                #     end_index = rag_response.find(next_event_header, start_index + len(event_header))
-                    
-                #     if start_index != -1:
-                #         if end_index != -1:
-                #             event_analysis = rag_response[start_index:end_index].strip()
-                #         else:
-                #             event_analysis = rag_response[start_index:].strip()
-                #     else:
-                #         event_analysis = "Analysis not available for this event."
-                # else:
-                #     event_analysis = "No analysis available due to empty response."
-                
-                report.write("<div class='analysis'>")
-                report.write(f"<p>{event_analysis}</p>")
-                # report.write(f"<p>{event_analysis.strip()}</p>")
-                report.write("</div>")
-                report.write("</div>")
+        for event, event_analysis in country_events:
+            report.write(format_event(event, event_analysis))
 
     return report.getvalue()
 
@@ -19,32 +19,35 @@ def generate_chat_url(prompt, doc_id = None, min_date=None, max_date=None, searc
     return chat_url
 
 
-def create_new_chat():
-    chat_id = f"chat_{len(st.session_state.chats) + 1}"
+def create_new_chat(username, chat_store):
+    # Number past the highest existing id so a deleted chat's id is never reused
+    numbers = [int(c.split('_')[-1]) for c in st.session_state.chats if c.split('_')[-1].isdigit()]
+    chat_id = f"chat_{max(numbers, default=0) + 1}"
     st.session_state.chats[chat_id] = {
         'name': f"New Chat {len(st.session_state.chats) + 1}",
         'messages': [],
+        'message_count': 0,
         'created_at': datetime.now().timestamp()  # Add timestamp as created_at field
     }
+    chat_store.create_chat(username, chat_id, st.session_state.chats[chat_id]['name'], st.session_state.chats[chat_id]['created_at'])
     st.session_state.show_preloaded_buttons = True
     st.session_state.current_chat_id = chat_id
 
-def delete_chat(chat_id, username, chats_collection, rerun=True):
+def delete_chat(chat_id, username, chat_store, rerun=True):
     if chat_id in st.session_state.chats:
         del st.session_state.chats[chat_id]
         if st.session_state.current_chat_id == chat_id:
             st.session_state.current_chat_id = None
 
-        chats_collection.update_one(
-            {"username": username},
-            {"$unset": {f"chats.{chat_id}": ""}}
-        )
+        chat_store.delete_chat(username, chat_id)
     if rerun:
         st.rerun()
 
-def update_chat_name(chat_id, new_name):
+def update_chat_name(chat_id, new_name, username=None, chat_store=None):
     if chat_id in st.session_state.chats:
         st.session_state.chats[chat_id]['name'] = new_name
+        if chat_store is not None:
+            chat_store.rename_chat(username, chat_id, new_name)
 
 def generate_subject(question, openai_client):
     prompt = "Please generate a concise subject for the following question capturing core information. Only output the subject and nothing else."
@@ -94,29 +97,95 @@ def check_password():
     login_form()
     return False
 
-def initialize_user(username, chats_collection):
-    new_user = {
-        "username":username,
-        "chats":{}
-    }
-    chats_collection.insert_one(new_user)
-    return new_user["chats"]
+def load_user_chats(username, chat_store):
+    # Names and counts only; messages are loaded when a chat is opened
+    chats = chat_store.list_chats(username)
+    if not chats:
+        st.info(f"Welcome, {username}! Initializing your account.")
+    return chats
+
+CHAT_PAGE_MESSAGES = 20
+CHAT_LIST_PAGE_SIZE = 15
+
+def load_chat_messages(chat_id, username, chat_store, limit=CHAT_PAGE_MESSAGES):
+    # Only the latest `limit` messages; older ones are fetched by load_earlier_messages
+    chat = st.session_state.chats[chat_id]
+    if 'messages' not in chat:
+        messages = chat_store.load_messages(username, chat_id, limit=limit)
+        chat['first_seq'] = messages[0]['seq'] if messages else 0
+        chat['messages'] = [{"role": m["role"], "content": m["content"]} for m in messages]
+    return chat
 
-def load_user_chats(username, chats_collection):
-    user_chats = chats_collection.find_one({"username": username})
-    if user_chats:
-        return user_chats["chats"]
+def load_earlier_messages(chat_id, username, chat_store, limit=CHAT_PAGE_MESSAGES):
+    chat = st.session_state.chats[chat_id]
+    if chat.get('first_seq', 0) <= 0:
+        return
+    messages = chat_store.load_messages(username, chat_id, before=chat['first_seq'], limit=limit)
+    if messages:
+        chat['first_seq'] = messages[0]['seq']
+        chat['messages'] = [{"role": m["role"], "content": m["content"]} for m in messages] + chat['messages']
     else:
-        st.info(f"Welcome, {username}! Initializing your account.")
-        return initialize_user(username, chats_collection)
-    return {}
-
-def save_user_chats(username, chats, chats_collection):
-    chats_collection.update_one(
-        {"username": username},
-        {"$set": {"chats": chats}},
-        upsert=True
-    )
+        chat['first_seq'] = 0
+
+def load_full_chat_messages(chat_id, username, chat_store):
+    # The whole history, for model context; the display window is unaffected
+    chat = load_chat_messages(chat_id, username, chat_store)
+    if chat.get('first_seq', 0) > 0:
+        messages = chat_store.load_messages(username, chat_id, before=chat['first_seq'])
+        chat['messages'] = [{"role": m["role"], "content": m["content"]} for m in messages] + chat['messages']
+        chat['first_seq'] = 0
+    return chat['messages']
+
+def render_chat_history(chat_id, username, chat_store, page_size=CHAT_PAGE_MESSAGES):
+    """Show the latest `page_size` messages, with a button that reveals (and if needed fetches) older ones."""
+    chat = st.session_state.chats[chat_id]
+    visible = chat.setdefault('visible', page_size)
+    hidden = chat.get('first_seq', 0) + max(0, len(chat['messages']) - visible)
+    if hidden:
+        if st.button(f"Show earlier messages ({hidden} more)", key=f"earlier_{chat_id}", use_container_width=True):
+            chat['visible'] = visible = visible + page_size
+            if visible > len(chat['messages']):
+                load_earlier_messages(chat_id, username, chat_store, visible - len(chat['messages']))
+    for message in chat['messages'][-visible:]:
+        with st.chat_message(message['role'], avatar='images/icon.png' if message["role"] == "assistant" else "human"):
+            st.markdown(message['content'])
+
+def chat_list_page(chats, search="", page=1, page_size=CHAT_LIST_PAGE_SIZE):
+    """One page of (chat_id, chat) pairs, newest first, whose names contain `search`; and the page count."""
+    search = (search or "").lower()
+    items = [(chat_id, chat) for chat_id, chat in chats.items()
+             if isinstance(chat, dict) and 'name' in chat and search in chat['name'].lower()]
+    items.sort(key=lambda item: item[1].get('created_at') or 0, reverse=True)
+    pages = max(1, -(-len(items) // page_size))
+    page = min(max(page, 1), pages)
+    return items[(page - 1) * page_size:page * page_size], pages
+
+def chat_list_controls(key, container=st):
+    """Search box for a chat list; returns (search text, current page)."""
+    search = container.text_input("Search chats", key=f"{key}_search", placeholder="Search chats", label_visibility="collapsed")
+    if st.session_state.get(f"{key}_last_search") != search:
+        st.session_state[f"{key}_last_search"] = search
+        st.session_state[f"{key}_page"] = 1
+    return search, st.session_state.get(f"{key}_page", 1)
+
+def chat_list_pager(key, pages, container=st):
+    if pages <= 1:
+        return
+    page = min(st.session_state.get(f"{key}_page", 1), pages)
+    col1, col2, col3 = container.columns([1, 2, 1])
+    if col1.button("◀", key=f"{key}_prev", disabled=page <= 1, use_container_width=True):
+        st.session_state[f"{key}_page"] = page - 1
+        st.rerun()
+    col2.caption(f"Page {page} of {pages}")
+    if col3.button("▶", key=f"{key}_next", disabled=page >= pages, use_container_width=True):
+        st.session_state[f"{key}_page"] = page + 1
+        st.rerun()
+
+def append_chat_messages(chat_id, messages, username, chat_store):
+    chat = st.session_state.chats[chat_id]
+    chat.setdefault('messages', []).extend(messages)
+    chat['message_count'] = chat.get('message_count', 0) + len(messages)
+    chat_store.append_messages(username, chat_id, messages)
 
 # LEGACY CODE
 def refresh_file_list(assistant):
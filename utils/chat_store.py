@@ -0,0 +1,95 @@
+from datetime import datetime
+
+import pymongo
+import streamlit as st
+
+
+class ChatStore:
+    """
+    Chat history with one Mongo document per chat and one per message.
+
+    `{name}.chats` holds each chat's name, timestamps and message count, so
+    listing a user's chats never reads message bodies. `{name}.messages` holds
+    the turns, numbered by `seq` within their chat; appending a turn is an
+    insert plus a counter update, whatever the length of the history.
+
+    `name` is the collection that used to hold every chat of a user in one
+    document; those are copied over the first time the user's chats are listed.
+    """
+
+    def __init__(self, db, name):
+        self.legacy = db[name]
+        self.chats = db[f"{name}.chats"]
+        self.messages = db[f"{name}.messages"]
+        self.chats.create_index([("username", pymongo.ASCENDING), ("chat_id", pymongo.ASCENDING)], unique=True)
+        self.chats.create_index([("username", pymongo.ASCENDING), ("created_at", pymongo.ASCENDING)])
+        self.messages.create_index([("username", pymongo.ASCENDING), ("chat_id", pymongo.ASCENDING), ("seq", pymongo.ASCENDING)], unique=True)
+
+    def _migrate(self, username):
+        legacy = self.legacy.find_one({"username": username, "migrated": {"$ne": True}})
+        if not legacy:
+            return
+        for chat_id, chat in (legacy.get("chats") or {}).items():
+            if not isinstance(chat, dict) or self.chats.count_documents({"username": username, "chat_id": chat_id}, limit=1):
+                continue
+            self.create_chat(username, chat_id, chat.get("name", "Unnamed Chat"), chat.get("created_at"))
+            self.append_messages(username, chat_id, chat.get("messages") or [])
+        self.legacy.update_one({"_id": legacy["_id"]}, {"$set": {"migrated": True}})
+        print(f"Chat store: migrated {len(legacy.get('chats') or {})} chats for {username}")
+
+    def list_chats(self, username):
+        """{chat_id: {"name", "created_at", "message_count"}} in creation order, without messages."""
+        self._migrate(username)
+        cursor = self.chats.find({"username": username}, {"_id": 0, "chat_id": 1, "name": 1, "created_at": 1, "message_count": 1})
+        return {
+            chat["chat_id"]: {"name": chat.get("name", "Unnamed Chat"), "created_at": chat.get("created_at"), "message_count": chat.get("message_count", 0)}
+            for chat in cursor.sort("created_at", pymongo.ASCENDING)
+        }
+
+    def create_chat(self, username, chat_id, name, created_at=None):
+        now = datetime.now().timestamp()
+        self.chats.update_one(
+            {"username": username, "chat_id": chat_id},
+            {"$setOnInsert": {"name": name, "created_at": created_at or now, "updated_at": now, "message_count": 0}},
+            upsert=True
+        )
+
+    def rename_chat(self, username, chat_id, name):
+        self.chats.update_one({"username": username, "chat_id": chat_id}, {"$set": {"name": name}})
+
+    def append_messages(self, username, chat_id, messages):
+        """Append turns to a chat; each is written once, as its own document."""
+        if not messages:
+            return
+        chat = self.chats.find_one_and_update(
+            {"username": username, "chat_id": chat_id},
+            {"$inc": {"message_count": len(messages)}, "$set": {"updated_at": datetime.now().timestamp()}},
+            upsert=True,
+            return_document=pymongo.ReturnDocument.AFTER
+        )
+        first = chat["message_count"] - len(messages)
+        self.messages.insert_many([
+            {"username": username, "chat_id": chat_id, "seq": first + i, "role": m["role"], "content": m["content"]}
+            for i, m in enumerate(messages)
+        ])
+
+    def load_messages(self, username, chat_id, before=None, limit=None):
+        """A chat's messages in order; with `limit`, only the last `limit` before seq `before`."""
+        query = {"username": username, "chat_id": chat_id}
+        if before is not None:
+            query["seq"] = {"$lt": before}
+        cursor = self.messages.find(query, {"_id": 0, "seq": 1, "role": 1, "content": 1})
+        if limit:
+            return list(cursor.sort("seq", pymongo.DESCENDING).limit(limit))[::-1]
+        return list(cursor.sort("seq", pymongo.ASCENDING))
+
+    def delete_chat(self, username, chat_id):
+        self.chats.delete_one({"username": username, "chat_id": chat_id})
+        self.messages.delete_many({"username": username, "chat_id": chat_id})
+
+
+@st.cache_resource
+def get_chat_store(name):
+    from utils.funcs import get_mongo_access
+
+    return ChatStore(get_mongo_access()[st.secrets["MONGO_DB_NAME"]], name)
@@ -1,5 +1,4 @@
 # Library Imports
-import requests
 import streamlit as st
 import pandas as pd
 from io import StringIO
@@ -9,28 +8,16 @@ import plotly.express as px
 import plotly.graph_objects as go
 import plotly.io as pio
 from plotly.subplots import make_subplots
-from msal import ConfidentialClientApplication
 import base64
 import os
 import mimetypes
-import msal
 from datetime import datetime
 import uuid
+from utils.graph_client import get_mail_client
+from utils.funcs import coerce_numeric_columns
 
 
 def send_email(interval, recipients, data, dv01_data, cvar_data, curr_exp_data, formatted_date):
-    def convert_to_float(value):
-        if isinstance(value, str):
-            value = value.replace(',', '').replace('$', '').replace('(', '-').replace(')', '')
-            value = value.replace('USD', '')
-            try:
-                return float(value)
-            except ValueError:
-                return value
-        elif isinstance(value, (int, float)):
-            return float(value)
-        return value
-
     def extract_currency_pair(description):
         if not isinstance(description, str):
             description = str(description)
@@ -40,7 +27,7 @@ def send_email(interval, recipients, data, dv01_data, cvar_data, curr_exp_data,
         return None
 
     def generate_pnl_charts(data, interval):
-        total_pnl = data.groupby("Book Name")[f'$ {interval} P&L'].sum().reset_index()
+        total_pnl = data.groupby("Book Name", observed=True)[f'$ {interval} P&L'].sum().reset_index()
         total_pnl.columns = ['Book Name', f'Total {interval} P&L']
         # Overall PNL
         fig_total = px.bar(total_pnl, x='Book Name', y=f'Total {interval} P&L', title = f'Total {interval} P&L by Book')
@@ -243,23 +230,9 @@ def send_email(interval, recipients, data, dv01_data, cvar_data, curr_exp_data,
         return message
     
     def send_email_with_attachment(json_message, user_email, file_path=None):
-        tenant_id = st.secrets['MAIL_TENANT_ID']
-        authority_url = f'https://login.microsoftonline.com/{tenant_id}'
-        scopes = ['https://graph.microsoft.com/.default']
-
-        app = msal.ConfidentialClientApplication(
-            st.secrets['MAIL_CLIENT_ID'],
-            authority=authority_url,
-            client_credential=st.secrets['MAIL_CLIENT_SECRET'],
-        )
-
-        result = app.acquire_token_for_client(scopes=scopes)
-
-        if 'access_token' in result:
-            access_token = result['access_token']
-        else:
+        client = get_mail_client()
+        if client.get_token() is None:
             print('Error obtaining access token')
-            print(result)
             return None
 
         # Prepare the attachment
@@ -286,13 +259,12 @@ def send_email(interval, recipients, data, dv01_data, cvar_data, curr_exp_data,
         }
 
         # Send the email with attachment
-        endpoint = f'https://graph.microsoft.com/v1.0/users/{user_email}/sendMail'
+        endpoint = f'/users/{user_email}/sendMail'
         headers = {
-            'Authorization': f'Bearer {access_token}',
             'Content-Type': 'application/json',
         }
 
-        response = requests.post(endpoint, headers=headers, json=send_mail_body)
+        response = client.post(endpoint, headers=headers, json=send_mail_body)
 
         if response.status_code == 202:
             print('Email sent successfully with attachment')
@@ -308,13 +280,8 @@ def send_email(interval, recipients, data, dv01_data, cvar_data, curr_exp_data,
     date_spt = today.strftime("%Y-%m-%d")
     pio.templates.default = "plotly"
 
-    df = data
-
     exclude_columns = ['Book Name', 'Holding Scenario', 'Description', 'Active']
-
-    for column in df.columns:
-        if column not in exclude_columns:
-            df[column] = df[column].apply(convert_to_float)
+    df = coerce_numeric_columns(data, exclude_columns)
 
     total_pnl_df = generate_pnl_charts(df, interval)
     total_pnl_df[f'Total {interval} P&L'] = total_pnl_df[f'Total {interval} P&L'].apply(lambda x: f'${x:,.2f}')
@@ -334,7 +301,7 @@ def send_email(interval, recipients, data, dv01_data, cvar_data, curr_exp_data,
     
     subject = f"P&L Update - {formatted_date}"
     if dv01_data is not None and cvar_data is not None and curr_exp_data is not None:
-        dv01_total = dv01_data.drop(columns=['Description', 'Date']).groupby('Currency').sum().sum(axis=1)[:-1]['Grand Total']
+        dv01_total = dv01_data.drop(columns=['Description', 'Date']).groupby('Currency', observed=True).sum().sum(axis=1)[:-1]['Grand Total']
         cvar_total = cvar_data.iloc[-1]['Daily Fund CVaR']
         total_USD = curr_exp_data[curr_exp_data['Currency']=='USD']['Book NMV (Total)'].values[0]
 
@@ -425,23 +392,9 @@ def send_html_email(subject, html_content, recipients):
         return message
     
     def send_email_with_attachment(json_message, user_email, file_path=None):
-        tenant_id = st.secrets['MAIL_TENANT_ID']
-        authority_url = f'https://login.microsoftonline.com/{tenant_id}'
-        scopes = ['https://graph.microsoft.com/.default']
-
-        app = msal.ConfidentialClientApplication(
-            st.secrets['MAIL_CLIENT_ID'],
-            authority=authority_url,
-            client_credential=st.secrets['MAIL_CLIENT_SECRET'],
-        )
-
-        result = app.acquire_token_for_client(scopes=scopes)
-
-        if 'access_token' in result:
-            access_token = result['access_token']
-        else:
+        client = get_mail_client()
+        if client.get_token() is None:
             print('Error obtaining access token')
-            print(result)
             return None
 
         # Prepare the attachment
@@ -468,13 +421,12 @@ def send_html_email(subject, html_content, recipients):
         }
 
         # Send the email with attachment
-        endpoint = f'https://graph.microsoft.com/v1.0/users/{user_email}/sendMail'
+        endpoint = f'/users/{user_email}/sendMail'
         headers = {
-            'Authorization': f'Bearer {access_token}',
             'Content-Type': 'application/json',
         }
 
-        response = requests.post(endpoint, headers=headers, json=send_mail_body)
+        response = client.post(endpoint, headers=headers, json=send_mail_body)
 
         if response.status_code == 202:
             print('Email sent successfully with attachment')
@@ -0,0 +1,193 @@
+import bisect
+import re
+import threading
+import time
+from datetime import datetime
+
+import streamlit as st
+
+from utils.graph_client import get_graph_client
+
+# data_2024-09-02-09-00.csv, data_Cur2024-09-02-08-00.csv, data_DV0..., data_VaR...
+FILE_NAME_PATTERN = re.compile(r'^data_(Cur|DV0|VaR)?(\d{4}-\d{1,2}-\d{1,2}-\d{1,2}-\d{1,2})\.csv$')
+FILE_KINDS = ('', 'Cur', 'DV0', 'VaR')
+
+
+def parse_file_name(file_name):
+    """Return (kind, timestamp) for a /ProfitLoss report file, or None."""
+    match = FILE_NAME_PATTERN.match(file_name)
+    if not match:
+        return None
+    try:
+        return match.group(1) or '', datetime.strptime(match.group(2), '%Y-%m-%d-%H-%M')
+    except ValueError:
+        return None
+
+
+class FolderCatalog:
+    """
+    Sorted per-kind index of the report files in a SharePoint folder.
+
+    Each file name is parsed once into (kind, timestamp). The first refresh
+    lists the folder; later refreshes replay the drive's delta feed (SharePoint
+    only supports delta on the drive root) and keep the items whose parent is
+    this folder, so only added, renamed or deleted files are processed. Lookups are binary searches
+    over the sorted timestamps of one kind.
+    """
+
+    def __init__(self, client, site_id, folder_path="/ProfitLoss", min_refresh_interval=60):
+        self.client = client
+        self.site_id = site_id
+        self.folder_path = folder_path
+        self.min_refresh_interval = min_refresh_interval
+
+        self._lock = threading.Lock()
+        self._times = {kind: [] for kind in FILE_KINDS}
+        self._names = {kind: {} for kind in FILE_KINDS}
+        self._ids = {}
+        self._folder_id = None
+        self._delta_link = None
+        self._last_refresh = 0.0
+
+    @property
+    def ready(self):
+        return self._delta_link is not None
+
+    # Index maintenance ##################################################################
+    def _add(self, item_id, name):
+        if item_id in self._ids:
+            self._remove(item_id)
+        parsed = parse_file_name(name)
+        if parsed is None:
+            return
+        kind, ts = parsed
+        self._ids[item_id] = name
+        if ts not in self._names[kind]:
+            bisect.insort(self._times[kind], ts)
+        self._names[kind][ts] = name
+
+    def _remove(self, item_id):
+        name = self._ids.pop(item_id, None)
+        parsed = parse_file_name(name) if name else None
+        if parsed is None:
+            return
+        kind, ts = parsed
+        if self._names[kind].get(ts) == name:
+            del self._names[kind][ts]
+            times = self._times[kind]
+            times.pop(bisect.bisect_left(times, ts))
+
+    def _reset(self):
+        self._times = {kind: [] for kind in FILE_KINDS}
+        self._names = {kind: {} for kind in FILE_KINDS}
+        self._ids = {}
+        self._delta_link = None
+
+    def _in_folder(self, item):
+        # Delta items carry the parent's id but never its path
+        return item.get('parentReference', {}).get('id') == self._folder_id
+
+    # Syncing ############################################################################
+    def _full_sync(self):
+        response = self.client.get(f"/sites/{self.site_id}/drive/root:{self.folder_path}?$select=id")
+        if response is None or response.status_code != 200:
+            print(f"Error: could not find {self.folder_path}")
+            return False
+        folder_id = response.json()['id']
+
+        # Take the delta cursor before listing so changes made during the listing
+        # are picked up by the next delta round.
+        response = self.client.get(f"/sites/{self.site_id}/drive/root/delta?token=latest")
+        if response is None or response.status_code != 200:
+            print(f"Error: could not start delta tracking for {self.folder_path}")
+            return False
+        delta_link = response.json().get('@odata.deltaLink')
+
+        self._reset()
+        self._folder_id = folder_id
+        api_url = f"/sites/{self.site_id}/drive/items/{folder_id}/children?$select=id,name,file"
+        while api_url:
+            response = self.client.get(api_url)
+            if response is None or response.status_code != 200:
+                print(f"Error: could not list {self.folder_path}")
+                return False
+            data = response.json()
+            for item in data.get('value', []):
+                if item.get('file'):
+                    self._add(item['id'], item['name'])
+            api_url = data.get('@odata.nextLink')
+
+        self._delta_link = delta_link
+        return True
+
+    def _apply_delta(self):
+        api_url = self._delta_link
+        while api_url:
+            response = self.client.get(api_url)
+            if response is None:
+                return False
+            if response.status_code == 410:
+                # The delta token expired; start again from a full listing
+                return self._full_sync()
+            if response.status_code != 200:
+                print(f"Error: {response.status_code}, {response.text}")
+                return False
+            data = response.json()
+            for item in data.get('value', []):
+                if 'deleted' in item:
+                    self._remove(item['id'])
+                elif item.get('file') and self._in_folder(item):
+                    self._add(item['id'], item['name'])
+                elif item['id'] in self._ids:
+                    # Moved out of the folder
+                    self._remove(item['id'])
+            api_url = data.get('@odata.nextLink')
+            if not api_url:
+                self._delta_link = data.get('@odata.deltaLink', self._delta_link)
+        return True
+
+    def refresh(self, force=False):
+        """Bring the index up to date. Returns False if SharePoint could not be reached."""
+        with self._lock:
+            if not force and self.ready and time.monotonic() - self._last_refresh < self.min_refresh_interval:
+                return True
+            ok = self._apply_delta() if self.ready else self._full_sync()
+            if ok:
+                self._last_refresh = time.monotonic()
+            return ok
+
+    # Queries ############################################################################
+    def latest(self, kind=''):
+        """Return (timestamp, file_name) of the newest file of `kind`, or None."""
+        with self._lock:
+            times = self._times[kind]
+            if not times:
+                return None
+            return times[-1], self._names[kind][times[-1]]
+
+    def at_or_before(self, kind, when):
+        """Return (timestamp, file_name) of the newest file of `kind` at or before `when`."""
+        with self._lock:
+            times = self._times[kind]
+            i = bisect.bisect_right(times, when)
+            if i == 0:
+                return None
+            return times[i - 1], self._names[kind][times[i - 1]]
+
+    def range(self, kind, start, end):
+        """Return [(timestamp, file_name)] for files of `kind` with start <= timestamp <= end."""
+        with self._lock:
+            times = self._times[kind]
+            lo = bisect.bisect_left(times, start)
+            hi = bisect.bisect_right(times, end)
+            return [(ts, self._names[kind][ts]) for ts in times[lo:hi]]
+
+    def names(self, kind=''):
+        with self._lock:
+            return [self._names[kind][ts] for ts in self._times[kind]]
+
+
+@st.cache_resource
+def get_profitloss_catalog():
+    client = get_graph_client(st.secrets["CLIENT_ID"], st.secrets["CLIENT_SECRET"], st.secrets["TENANT_ID"])
+    return FolderCatalog(client, st.secrets["SITE_ID"], folder_path="/ProfitLoss")
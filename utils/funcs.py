@@ -1,58 +1,93 @@
-import requests
-from msal import ConfidentialClientApplication
 import streamlit as st
 import pandas as pd
-from io import StringIO
 import re
 import plotly.express as px
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pytz
 from pymongo import MongoClient
+from utils.graph_client import get_graph_client
+from utils.snapshot_store import get_snapshot_store, is_immutable_path
+from utils.history_store import get_history_store
+from utils.folder_catalog import get_profitloss_catalog
+from utils.report_schemas import schema_for_path
+from utils.snapshot_service import Snapshot, get_snapshot_service
 
 aest = pytz.timezone('Australia/Sydney')
 
 
+def _parse_sharepoint_csv(csv_bytes, file_path):
+    schema = schema_for_path(file_path)
+    df = schema.read(csv_bytes)
+    problems = schema.validate(df)
+    if problems:
+        print(f"Schema problems in {file_path}: {'; '.join(problems)}")
+    return df
+
+
 def get_csv_from_sharepoint_by_path(client_id, client_secret, tenant_id, site_id, file_path):
-    graph_url = "https://graph.microsoft.com/v1.0"
-    
-    app = ConfidentialClientApplication(
-        client_id,
-        authority=f"https://login.microsoftonline.com/{tenant_id}",
-        client_credential=client_secret
-    )
-    
-    result = app.acquire_token_for_client(scopes=["https://graph.microsoft.com/.default"])
-    
-    if "access_token" in result:
-        api_url = f"{graph_url}/sites/{site_id}/drive/root:{file_path}:/content"
-        
-        headers = {
-            'Authorization': 'Bearer ' + result['access_token']
-        }
+    store = get_snapshot_store()
+    entry = store.lookup(file_path)
 
-        response = requests.get(api_url, headers=headers)
-        
-        if response.status_code == 200:
-            csv_content = StringIO(response.text)
-            if 'DV0' in file_path:
-                df = pd.read_csv(csv_content, header=[1])
-            elif 'Cur' in file_path:
-                df = pd.read_csv(csv_content)
-            else:
-                df = pd.read_csv(csv_content)
+    # Write-once snapshots are served straight from disk
+    if entry is not None and is_immutable_path(file_path):
+        df = store.load(entry)
+        if df is not None:
+            return df
+
+    headers = {}
+    if entry is not None:
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        elif entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+
+    client = get_graph_client(client_id, client_secret, tenant_id)
+    api_url = f"/sites/{site_id}/drive/root:{file_path}:/content"
+    response = client.get(api_url, headers=headers)
 
-                exclude_columns = ['Book Name', 'Holding Scenario', 'Description', 'Active']
+    if response is None:
+        st.error(file_path)
+        st.error("Failed to acquire token")
+        return None
 
-                for column in df.columns:
-                    if column not in exclude_columns:
-                        df[column] = df[column].apply(convert_to_float)
+    if response.status_code == 304:
+        df = store.load(entry, revalidated=True)
+        if df is not None:
             return df
-        else:
+        response = client.get(api_url)
+        if response is None:
+            st.error(file_path)
+            st.error("Failed to acquire token")
             return None
+
+    if response.status_code == 200:
+        df = _parse_sharepoint_csv(response.content, file_path)
+        store.save(file_path, df, response.content,
+                   etag=response.headers.get('ETag'),
+                   last_modified=response.headers.get('Last-Modified'))
+        return df
     else:
-        st.error(file_path)
-        st.error("Failed to acquire token")
         return None
+
+
+def fetch_sharepoint_csvs(client_id, client_secret, tenant_id, site_id, file_paths, max_workers=4):
+    """
+    Download several SharePoint CSVs concurrently through the shared Graph client.
+
+    Returns the DataFrames (or None for files that failed) in the same order as
+    file_paths.
+    """
+    client = get_graph_client(client_id, client_secret, tenant_id)
+    if client.get_token() is None:
+        st.error("Failed to acquire token")
+        return [None] * len(file_paths)
+
+    def fetch(file_path):
+        return get_csv_from_sharepoint_by_path(client_id, client_secret, tenant_id, site_id, file_path)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(fetch, file_paths))
     
 # def get_files_from_sharepoint_folder(client_id, client_secret, tenant_id, site_id, folder_path):
 #     graph_url = "https://graph.microsoft.com/v1.0"
@@ -85,36 +120,24 @@ def get_csv_from_sharepoint_by_path(client_id, client_secret, tenant_id, site_id
 #         print("Failed to acquire token")
 #         return None
 def get_files_from_sharepoint_folder(client_id, client_secret, tenant_id, site_id, folder_path):
-    graph_url = "https://graph.microsoft.com/v1.0"
-
-    app = ConfidentialClientApplication(
-        client_id,
-        authority=f"https://login.microsoftonline.com/{tenant_id}",
-        client_credential=client_secret
-    )
-
-    result = app.acquire_token_for_client(scopes=["https://graph.microsoft.com/.default"])
-    if "access_token" in result:
-        api_url = f"{graph_url}/sites/{site_id}/drive/root:{folder_path}:/children"
-        headers = {
-            'Authorization': 'Bearer ' + result['access_token']
-        }
-
-        file_list = []
-        while api_url:
-            response = requests.get(api_url, headers=headers)
-            if response.status_code == 200:
-                files_data = response.json()
-                file_list.extend([file['name'] for file in files_data.get('value', []) if file.get('file')])
-                api_url = files_data.get('@odata.nextLink', None)  # Get the next page URL if it exists
-            else:
-                print(f"Error: {response.status_code}, {response.text}")
-                return None
+    client = get_graph_client(client_id, client_secret, tenant_id)
+    api_url = f"/sites/{site_id}/drive/root:{folder_path}:/children"
+
+    file_list = []
+    while api_url:
+        response = client.get(api_url)
+        if response is None:
+            print("Failed to acquire token")
+            return None
+        if response.status_code == 200:
+            files_data = response.json()
+            file_list.extend([file['name'] for file in files_data.get('value', []) if file.get('file')])
+            api_url = files_data.get('@odata.nextLink', None)  # Get the next page URL if it exists
+        else:
+            print(f"Error: {response.status_code}, {response.text}")
+            return None
 
-        return file_list
-    else:
-        print("Failed to acquire token")
-        return None
+    return file_list
 
     
 def convert_to_float(value):
@@ -129,6 +152,42 @@ def convert_to_float(value):
         return float(value)
     return value
 
+# Thousands separators, currency markers and the closing half of accounting parentheses
+NUMERIC_NOISE_PATTERN = r'[,$)]|USD'
+
+
+def coerce_numeric(series):
+    """
+    Vectorised equivalent of series.apply(convert_to_float).
+
+    Strings have commas, '$' and 'USD' stripped and accounting parentheses
+    turned into a leading minus. If every value parses the result is float64;
+    otherwise the strings that do not parse are left untouched and the column
+    stays object dtype, as with convert_to_float.
+    """
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype('float64')
+    if not pd.api.types.is_object_dtype(series) and not pd.api.types.is_string_dtype(series):
+        return series
+
+    try:
+        text = series.str.replace(NUMERIC_NOISE_PATTERN, '', regex=True).str.replace('(', '-', regex=False).str.strip()
+    except AttributeError:
+        # No string values at all
+        return pd.to_numeric(series, errors='coerce')
+
+    parsed = pd.to_numeric(text.where(text.notna(), series), errors='coerce')
+    unparsed = parsed.isna() & text.notna() & (text != 'nan')
+    if unparsed.any():
+        return series.where(unparsed, parsed)
+    return parsed.astype('float64')
+
+
+def coerce_numeric_columns(df, exclude_columns=()):
+    """Return a copy of df with every column not in exclude_columns passed through coerce_numeric."""
+    return df.assign(**{column: coerce_numeric(df[column]) for column in df.columns if column not in exclude_columns})
+
+
 def extract_currency_pair(description):
     # Use regex to find the currency pair pattern
     match = re.search(r'[A-Z]{3}/[A-Z]{3}', description)
@@ -139,63 +198,93 @@ def extract_currency_pair(description):
 def generate_file_path(today, base="/ProfitLoss/data"):
     return f"{base}_{today}.csv"
 
-def process_24h_data(input_time):
+def process_24h_data(input_time, progress_callback=None, max_workers=8):
+    """
+    Load the 24 hourly P&L snapshots ending at input_time in parallel.
+
+    progress_callback(done, total, hour, loaded) is called from the calling
+    thread as each file finishes, so it can safely update Streamlit elements.
+
+    Returns (combined_df, missing_hours): one frame with a datetime64 `date`
+    column in chronological order, and a list of (hour, reason) for every hour
+    that could not be loaded.
+    """
     CLIENT_ID = st.secrets["CLIENT_ID"]
     CLIENT_SECRET = st.secrets["CLIENT_SECRET"]
     TENANT_ID = st.secrets["TENANT_ID"]
     SITE_ID = st.secrets["SITE_ID"]
 
-    end_time = datetime.strptime(input_time, '%Y-%m-%d-%H-%M')
+    end_time = datetime.strptime(input_time, '%Y-%m-%d-%H-%M').replace(minute=0, second=0, microsecond=0)
+    hours = [end_time - timedelta(hours=i) for i in range(23, -1, -1)]
+
+    frames = {}
+    missing = {}
+
+    # Hours the catalog knows have no file are reported without a request. If the
+    # catalog cannot be built every hour is tried directly.
+    available = {}
+    catalog = get_profitloss_catalog()
+    if catalog.refresh() or catalog.ready:
+        available = dict(catalog.range('', hours[0], hours[-1]))
+        for hour in hours:
+            if hour not in available:
+                missing[hour] = "not in /ProfitLoss"
+
+    def load(hour):
+        file_name = available.get(hour, f"data_{hour.strftime('%Y-%m-%d-%H-%M')}.csv")
+        return get_csv_from_sharepoint_by_path(CLIENT_ID, CLIENT_SECRET, TENANT_ID, SITE_ID, f"/ProfitLoss/{file_name}")
+
+    to_fetch = [hour for hour in hours if hour not in missing]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(load, hour): hour for hour in to_fetch}
+        for done, future in enumerate(as_completed(futures), start=1):
+            hour = futures[future]
+            try:
+                df = future.result()
+            except Exception as e:
+                missing[hour] = f"{type(e).__name__}: {e}"
+            else:
+                if df is None:
+                    missing[hour] = "file not found"
+                elif df.empty:
+                    missing[hour] = "file is empty"
+                else:
+                    frames[hour] = df.assign(date=hour)
+            if progress_callback:
+                progress_callback(done, len(to_fetch), hour, hour in frames)
+
+    # Concatenate once, in chronological order
+    if frames:
+        combined_df = pd.concat([frames[hour] for hour in hours if hour in frames], ignore_index=True)
+        combined_df['date'] = pd.to_datetime(combined_df['date'])
+    else:
+        combined_df = pd.DataFrame()
 
-    file_names = []
-    for i in range(24):
-        current_time = end_time - timedelta(hours=i)
-        current_time = current_time.replace(minute=0, second=0, microsecond=0) 
-        file_name = f"/ProfitLoss/data_{current_time.strftime('%Y-%m-%d-%H-%M')}.csv"
-        file_names.insert(0, file_name)  # Insert at beginning to maintain chronological order
-    
-    # Process each file and combine into one dataframe
-    combined_df = pd.DataFrame()
-    for file_name in file_names:
-        try:
-            df = get_csv_from_sharepoint_by_path(CLIENT_ID, CLIENT_SECRET, TENANT_ID, SITE_ID, file_name)
-            if df is not None and not df.empty:
-                date_str = file_name.split('_')[1].replace('.csv', '')
-                df['date'] = date_str
-                combined_df = pd.concat ([combined_df, df], ignore_index=True)
-        except Exception as e:
-            continue
-    return combined_df
+    missing_hours = [(hour.strftime('%Y-%m-%d %H:%M'), missing[hour]) for hour in hours if hour in missing]
+    return combined_df, missing_hours
 
 
-def get_historical_data():
+def get_historical_data(progress_callback=None):
+    """
+    Return the daily 09:00 P&L history from the local history store, first
+    downloading any days that have been published since the last refresh.
+    """
     CLIENT_ID = st.secrets["CLIENT_ID"]
     CLIENT_SECRET = st.secrets["CLIENT_SECRET"]
     TENANT_ID = st.secrets["TENANT_ID"]
     SITE_ID = st.secrets["SITE_ID"]
     
-    files = get_files_from_sharepoint_folder(CLIENT_ID, CLIENT_SECRET, TENANT_ID, SITE_ID, folder_path="/ProfitLoss")
-
-    to_map = []
-    
-        # If f contains 09-00 as the time field
-    pattern = r'data_\d{4}-\d{1,2}-\d{1,2}-09-00'
-
-    to_map = [f for f in files if re.search(pattern, f)]
-
-    # Process each file and combine into one dataframe
-    combined_df = pd.DataFrame()
-    for f_path in to_map:
-        try:
-            f_path = f"/ProfitLoss/{f_path}"
-            df = get_csv_from_sharepoint_by_path(CLIENT_ID, CLIENT_SECRET, TENANT_ID, SITE_ID, f_path)
-            date_str = f_path.split('_')[1].replace('.csv', '')
-            df['date'] = date_str
-            
-            combined_df = pd.concat([combined_df, df], ignore_index=True)
-        except Exception as e:
-            continue
-    return combined_df
+    catalog = get_profitloss_catalog()
+    catalog.refresh()
+
+    store = get_history_store()
+    if catalog.ready:
+        store.update(
+            catalog.names(''),
+            lambda f_path: get_csv_from_sharepoint_by_path(CLIENT_ID, CLIENT_SECRET, TENANT_ID, SITE_ID, f"/ProfitLoss/{f_path}"),
+            progress_callback=progress_callback
+        )
+    return store.load()
 
 def extract_datetime(file_name, data_type=''):
     pattern_mapping = {
@@ -214,7 +303,7 @@ def extract_datetime(file_name, data_type=''):
     return datetime.min
 
 def create_heatmap(data, title):
-    data = data.groupby('Currency').sum()
+    data = data.groupby('Currency', observed=True).sum()
     data['Total DV01'] = data.sum(axis=1)
     fig = px.imshow(data, 
                     labels=dict(x="Bucket", y="Currency", color="DV01"),
@@ -234,7 +323,7 @@ def create_dv01_bar_chart(data, title, x_title, y_title):
     fig.update_layout(height=600)
     return fig
 
-def get_data(selected_date = None):
+def get_data(selected_date = None, refresh = False):
     CLIENT_ID = st.secrets["CLIENT_ID"]
     CLIENT_SECRET = st.secrets["CLIENT_SECRET"]
     TENANT_ID = st.secrets["TENANT_ID"]
@@ -252,41 +341,37 @@ def get_data(selected_date = None):
         dv01_path = f"/ProfitLoss/data_DV0{risk_date}.csv"
         cvar_path = f"/ProfitLoss/data_VaR{risk_date}.csv"
 
-        df = get_csv_from_sharepoint_by_path(CLIENT_ID, CLIENT_SECRET, TENANT_ID, SITE_ID, data_path)
-        curr_exp_df = get_csv_from_sharepoint_by_path(CLIENT_ID, CLIENT_SECRET, TENANT_ID, SITE_ID, curr_exp_path)
-        dv01_df = get_csv_from_sharepoint_by_path(CLIENT_ID, CLIENT_SECRET, TENANT_ID, SITE_ID, dv01_path)
-        cvar_df = get_csv_from_sharepoint_by_path(CLIENT_ID, CLIENT_SECRET, TENANT_ID, SITE_ID, cvar_path)
+        df, curr_exp_df, dv01_df, cvar_df = fetch_sharepoint_csvs(
+            CLIENT_ID, CLIENT_SECRET, TENANT_ID, SITE_ID,
+            [data_path, curr_exp_path, dv01_path, cvar_path]
+        )
 
         return selected_date, df, curr_exp_df, dv01_df, cvar_df
 
-    current_hour = datetime.now(aest).hour
-
-    all_files = get_files_from_sharepoint_folder(CLIENT_ID, CLIENT_SECRET, TENANT_ID, SITE_ID, folder_path="/ProfitLoss")
-
-    most_recent_file = max(all_files, key=lambda file: extract_datetime(file, data_type=''))
-    most_recent_time = extract_datetime(most_recent_file)
-
-    most_recent_curr = max(all_files, key=lambda file: extract_datetime(file, data_type='Cur'))
-    most_recent_dv01 = max(all_files, key=lambda file: extract_datetime(file, data_type='DV0'))
-    most_recent_cvar = max(all_files, key=lambda file: extract_datetime(file, data_type='VaR'))
-    # max_date = max([datetime.strptime(f.split('_')[1].replace('.csv', ''), '%Y-%m-%d-%H-%M') for f in all_files])
-    # st.write(max_date)
-    # formatted_time = max_date
-    # formatted_time = f"{selected_date.strftime('%Y-%m-%d')}-08-00"
-    # formatted_time = f"{selected_date.strftime('%Y-%m-%d')}-{current_hour:02d}-00"
-
-   
-    
-    # FILE_PATH = generate_file_path(formatted_time)
-    FILE_PATH = f"/ProfitLoss/{most_recent_file}"
+    # The latest snapshot is shared by every session and kept fresh in the background
+    service = get_snapshot_service()
+    snapshot = service.refresh() if refresh else service.current()
+    if snapshot is None:
+        st.error("Could not load the latest P&L snapshot from /ProfitLoss")
+        return None, None, None, None, None
+    return tuple(snapshot)
+
+
+def locate_latest_snapshot():
+    """Return the newest (timestamp, file_name) of each report kind, or None if there is no P&L file."""
+    catalog = get_profitloss_catalog()
+    catalog.refresh()
+    latest = tuple(catalog.latest(kind) for kind in ('', 'Cur', 'DV0', 'VaR'))
+    if latest[0] is None:
+        return None
+    return latest
 
-    df = get_csv_from_sharepoint_by_path(CLIENT_ID, CLIENT_SECRET, TENANT_ID, SITE_ID, FILE_PATH)
 
-    curr_exposure_df = get_csv_from_sharepoint_by_path(CLIENT_ID, CLIENT_SECRET, TENANT_ID, SITE_ID, f'/ProfitLoss/{most_recent_curr}')
-    dv01_df = get_csv_from_sharepoint_by_path(CLIENT_ID, CLIENT_SECRET, TENANT_ID, SITE_ID, f'/ProfitLoss/{most_recent_dv01}')
-    cvar_df = get_csv_from_sharepoint_by_path(CLIENT_ID, CLIENT_SECRET, TENANT_ID, SITE_ID, f'/ProfitLoss/{most_recent_cvar}')
-    
-    return most_recent_time, df, curr_exposure_df, dv01_df, cvar_df
+def load_snapshot(latest):
+    paths = [f"/ProfitLoss/{entry[1]}" for entry in latest if entry]
+    frames = iter(fetch_sharepoint_csvs(st.secrets["CLIENT_ID"], st.secrets["CLIENT_SECRET"], st.secrets["TENANT_ID"], st.secrets["SITE_ID"], paths))
+    df, curr_exposure_df, dv01_df, cvar_df = [next(frames) if entry else None for entry in latest]
+    return Snapshot(latest[0][0], df, curr_exposure_df, dv01_df, cvar_df)
 
 @st.cache_resource
 def get_mongo_access():
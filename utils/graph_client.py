@@ -0,0 +1,122 @@
+import threading
+import time
+
+import requests
+import streamlit as st
+from msal import ConfidentialClientApplication
+from requests.adapters import HTTPAdapter
+
+GRAPH_URL = "https://graph.microsoft.com/v1.0"
+GRAPH_SCOPES = ["https://graph.microsoft.com/.default"]
+
+
+class GraphClient:
+    """
+    Process-wide Microsoft Graph client.
+
+    The app-only token is cached until `expiry_margin` seconds before it expires
+    and refreshed under a lock, so concurrent callers trigger a single MSAL
+    round-trip. Requests go through one keep-alive session whose connection pool
+    is sized for the thread pools used by the SharePoint loaders.
+    """
+
+    def __init__(self, client_id, client_secret, tenant_id, pool_size=16, expiry_margin=300,
+                 graph_url=GRAPH_URL, app=None):
+        self.graph_url = graph_url
+        self.expiry_margin = expiry_margin
+        self._app = app or ConfidentialClientApplication(
+            client_id,
+            authority=f"https://login.microsoftonline.com/{tenant_id}",
+            client_credential=client_secret
+        )
+        self._token = None
+        self._token_expires_at = 0.0
+        self._token_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.token_acquisitions = 0
+        self.requests_sent = 0
+
+    def get_token(self):
+        if self._token and time.monotonic() < self._token_expires_at:
+            return self._token
+
+        with self._token_lock:
+            # Another thread may have refreshed the token while we waited
+            if self._token and time.monotonic() < self._token_expires_at:
+                return self._token
+
+            result = self._app.acquire_token_for_client(scopes=GRAPH_SCOPES)
+            self.token_acquisitions += 1
+            if "access_token" not in result:
+                print(f"Failed to acquire token: {result.get('error_description', result)}")
+                return None
+
+            self._token = result["access_token"]
+            self._token_expires_at = time.monotonic() + int(result.get("expires_in", 3600)) - self.expiry_margin
+            return self._token
+
+    def invalidate_token(self):
+        with self._token_lock:
+            self._token = None
+            self._token_expires_at = 0.0
+
+    def request(self, method, url, headers=None, **kwargs):
+        """
+        Send an authenticated request. `url` may be absolute (e.g. an
+        @odata.nextLink) or a path relative to the Graph endpoint.
+        Returns None if no token could be acquired.
+        """
+        if not url.startswith("http"):
+            url = f"{self.graph_url}{url}"
+
+        for attempt in range(2):
+            token = self.get_token()
+            if token is None:
+                return None
+
+            request_headers = dict(headers or {})
+            request_headers['Authorization'] = f'Bearer {token}'
+            response = self.session.request(method, url, headers=request_headers, **kwargs)
+            with self._stats_lock:
+                self.requests_sent += 1
+
+            # A token can be revoked before its advertised expiry; retry once with a fresh one
+            if response.status_code != 401 or attempt:
+                return response
+            self.invalidate_token()
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def stats(self):
+        connections_opened = 0
+        for adapter in set(self.session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is not None:
+                    connections_opened += pool.num_connections
+        return {
+            "token_acquisitions": self.token_acquisitions,
+            "requests": self.requests_sent,
+            "connections_opened": connections_opened,
+            "connections_reused": max(self.requests_sent - connections_opened, 0),
+        }
+
+
+@st.cache_resource
+def get_graph_client(client_id, client_secret, tenant_id):
+    return GraphClient(client_id, client_secret, tenant_id)
+
+
+def get_mail_client():
+    return get_graph_client(st.secrets['MAIL_CLIENT_ID'], st.secrets['MAIL_CLIENT_SECRET'], st.secrets['MAIL_TENANT_ID'])
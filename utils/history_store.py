@@ -0,0 +1,171 @@
+import argparse
+import os
+import re
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+
+from utils.paths import CACHE_DIR
+from utils.snapshot_store import read_frame, write_frame
+
+# The 09:00 snapshot is the daily close used for the historical series
+HISTORY_FILE_PATTERN = re.compile(r'data_(\d{4}-\d{1,2}-\d{1,2})-09-00')
+
+
+def history_day(file_name):
+    match = HISTORY_FILE_PATTERN.search(file_name)
+    if match:
+        return datetime.strptime(match.group(1), '%Y-%m-%d').strftime('%Y-%m-%d')
+    return None
+
+
+class HistoryStore:
+    """
+    Local columnar history of the daily 09:00 P&L snapshot.
+
+    Each day is written once to <root>/<YYYY-MM>/<YYYY-MM-DD>.parquet, so a
+    refresh only needs to download the days that are not on disk yet and a
+    date-bounded load only opens the months it needs.
+    """
+
+    def __init__(self, root=os.path.join(CACHE_DIR, "history")):
+        self.root = root
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _partitions(self):
+        for month in sorted(os.listdir(self.root)):
+            month_dir = os.path.join(self.root, month)
+            if not os.path.isdir(month_dir):
+                continue
+            for name in sorted(os.listdir(month_dir)):
+                day, ext = os.path.splitext(name)
+                if ext in (".parquet", ".pkl"):
+                    yield day, os.path.join(month_dir, name)
+
+    def ingested_days(self):
+        return {day for day, _ in self._partitions()}
+
+    def pending(self, file_names):
+        """Return [(day, file_name)] for history files whose day is not stored yet."""
+        ingested = self.ingested_days()
+        pending = {}
+        for file_name in file_names:
+            day = history_day(file_name)
+            if day and day not in ingested:
+                pending[day] = file_name
+        return sorted(pending.items())
+
+    def ingest(self, day, df):
+        month_dir = os.path.join(self.root, day[:7])
+        os.makedirs(month_dir, exist_ok=True)
+        df = df.assign(date=pd.Timestamp(day) + pd.Timedelta(hours=9))
+        write_frame(df, os.path.join(month_dir, day))
+
+    def update(self, file_names, fetch, progress_callback=None, max_workers=8):
+        """
+        Download and store every history day missing from disk.
+
+        fetch(file_name) returns a DataFrame or None. Returns the list of days
+        that were added.
+        """
+        with self._lock:
+            pending = self.pending(file_names)
+            added = []
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {executor.submit(fetch, file_name): day for day, file_name in pending}
+                for done, future in enumerate(as_completed(futures), start=1):
+                    day = futures[future]
+                    try:
+                        df = future.result()
+                    except Exception as e:
+                        print(f"Failed to load history for {day}: {e}")
+                        df = None
+                    if df is not None and not df.empty:
+                        self.ingest(day, df)
+                        added.append(day)
+                    if progress_callback:
+                        progress_callback(done, len(pending), day, df is not None)
+            return sorted(added)
+
+    def load(self, start=None, end=None):
+        """Load the stored history, optionally bounded to 'YYYY-MM-DD' days."""
+        frames = [
+            read_frame(path) for day, path in self._partitions()
+            if (start is None or day >= start) and (end is None or day <= end)
+        ]
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+    def verify(self, file_names):
+        """Check every partition is readable and matches the remote day list."""
+        remote_days = {day for day in map(history_day, file_names) if day}
+        stored_days = set()
+        unreadable = []
+        for day, path in self._partitions():
+            stored_days.add(day)
+            try:
+                df = read_frame(path)
+                if df.empty or (df['date'].dt.strftime('%Y-%m-%d') != day).any():
+                    unreadable.append(day)
+            except Exception:
+                unreadable.append(day)
+        return {
+            "stored": len(stored_days),
+            "remote": len(remote_days),
+            "missing": sorted(remote_days - stored_days),
+            "orphaned": sorted(stored_days - remote_days),
+            "unreadable": sorted(unreadable),
+        }
+
+    def clear(self):
+        with self._lock:
+            shutil.rmtree(self.root, ignore_errors=True)
+            os.makedirs(self.root, exist_ok=True)
+
+
+@st.cache_resource
+def get_history_store():
+    return HistoryStore()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the local historical P&L store.")
+    parser.add_argument("command", choices=["update", "rebuild", "verify"])
+    args = parser.parse_args()
+
+    # Imported here to avoid a circular import with utils.funcs
+    from utils.funcs import get_csv_from_sharepoint_by_path, get_files_from_sharepoint_folder
+
+    credentials = (st.secrets["CLIENT_ID"], st.secrets["CLIENT_SECRET"], st.secrets["TENANT_ID"], st.secrets["SITE_ID"])
+    file_names = get_files_from_sharepoint_folder(*credentials, folder_path="/ProfitLoss")
+    if file_names is None:
+        raise SystemExit("Could not list /ProfitLoss")
+
+    store = HistoryStore()
+    if args.command == "verify":
+        report = store.verify(file_names)
+        for key, value in report.items():
+            print(f"{key}: {value}")
+        if report["missing"] or report["unreadable"]:
+            raise SystemExit(1)
+        return
+
+    if args.command == "rebuild":
+        store.clear()
+
+    def progress(done, total, day, loaded):
+        print(f"[{done}/{total}] {day} {'ok' if loaded else 'missing'}")
+
+    added = store.update(file_names, lambda f: get_csv_from_sharepoint_by_path(*credentials, f"/ProfitLoss/{f}"),
+                         progress_callback=progress)
+    print(f"Added {len(added)} day(s); {len(store.ingested_days())} stored")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+import os
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.path.join(APP_DIR, ".cache")
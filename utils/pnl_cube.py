@@ -0,0 +1,44 @@
+import pandas as pd
+import streamlit as st
+
+from utils.report_schemas import PNL_COLUMNS
+
+
+class BookCube:
+    """
+    Book x horizon P&L sums for one snapshot.
+
+    `books` has one row per Book Name and one column per P&L horizon (Daily,
+    WTD, MTD, YTD, ITD). `fund_totals` is the report's leading fund row, which
+    is what the Home page metrics have always shown.
+    """
+
+    def __init__(self, books, fund_totals):
+        self.books = books
+        self.fund_totals = fund_totals
+
+    def select(self, book_names=None):
+        """Return a 'Book Name' + horizons frame for `book_names` (all books if None), in cube order."""
+        books = self.books
+        if book_names is not None:
+            books = books[books.index.isin(list(book_names))]
+        return books.reset_index()
+
+    def totals(self, book_names=None):
+        return self.select(book_names)[PNL_COLUMNS].sum()
+
+
+def build_book_cube(data):
+    columns = [column for column in PNL_COLUMNS if column in data.columns]
+    books = data.groupby('Book Name', observed=True)[columns].sum()
+    books.index = books.index.astype(str)
+    books.index.name = 'Book Name'
+    books = books.reindex(columns=PNL_COLUMNS, fill_value=0.0)
+    fund_totals = data[columns].iloc[0].reindex(PNL_COLUMNS) if len(data) else pd.Series(0.0, index=PNL_COLUMNS)
+    return BookCube(books, fund_totals)
+
+
+@st.cache_resource(max_entries=16)
+def get_book_cube(snapshot_id, _data):
+    # `_data` is not hashed; the snapshot id alone identifies the frame
+    return build_book_cube(_data)
@@ -0,0 +1,115 @@
+import os
+from io import BytesIO
+
+import pandas as pd
+
+from utils.folder_catalog import parse_file_name
+
+PNL_COLUMNS = ['$ Daily P&L', '$ WTD P&L', '$ MTD P&L', '$ YTD P&L', '$ ITD P&L']
+# Bump whenever REPORT_SCHEMAS or ReportSchema parsing changes, so frames
+# cached by an older parser are re-parsed instead of served
+SCHEMA_VERSION = 1
+
+
+def _as_text(series):
+    # Keep missing values missing rather than turning them into 'nan'
+    return series.where(series.isna(), series.astype(str))
+
+
+class ReportSchema:
+    """
+    Declared layout of one SharePoint report type.
+
+    `numeric_columns` are parsed strictly to float64 (anything unparsable becomes
+    NaN and is reported by validate). When `coerce_other_columns` is set, every
+    remaining column that is not declared as text or categorical is parsed
+    leniently, leaving non-numeric strings in place.
+    """
+
+    def __init__(self, kind, required_columns=(), numeric_columns=(), categorical_columns=(), text_columns=(),
+                 fill_values=None, coerce_other_columns=True, read_options=None):
+        self.kind = kind
+        self.required_columns = list(required_columns)
+        self.numeric_columns = list(numeric_columns)
+        self.categorical_columns = list(categorical_columns)
+        self.text_columns = list(text_columns)
+        self.fill_values = fill_values or {}
+        self.coerce_other_columns = coerce_other_columns
+        self.read_options = read_options or {}
+
+    def read(self, csv_bytes):
+        df = pd.read_csv(BytesIO(csv_bytes), engine="pyarrow", **self.read_options)
+        return self.apply(df)
+
+    def apply(self, df):
+        # Imported here to avoid a circular import with utils.funcs
+        from utils.funcs import coerce_numeric
+
+        columns = {}
+        for column in df.columns:
+            series = df[column]
+            if column in self.numeric_columns:
+                columns[column] = pd.to_numeric(coerce_numeric(series), errors='coerce').astype('float64')
+            elif column in self.categorical_columns:
+                columns[column] = _as_text(series).astype('category')
+            elif column in self.text_columns:
+                columns[column] = _as_text(series)
+            elif self.coerce_other_columns:
+                columns[column] = coerce_numeric(series)
+        df = df.assign(**columns)
+        if self.fill_values:
+            df = df.fillna({column: value for column, value in self.fill_values.items() if column in df.columns})
+        return df
+
+    def validate(self, df):
+        """Return a list of human-readable problems; empty if the frame matches the schema."""
+        problems = [f"missing column '{column}'" for column in self.required_columns if column not in df.columns]
+        for column in self.numeric_columns:
+            if column in df.columns and df[column].dtype != 'float64':
+                problems.append(f"'{column}' is {df[column].dtype}, expected float64")
+        for column in self.categorical_columns:
+            if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype):
+                problems.append(f"'{column}' is {df[column].dtype}, expected category")
+        return problems
+
+
+REPORT_SCHEMAS = {
+    '': ReportSchema(
+        kind='',
+        required_columns=['Book Name', 'Description', 'Quantity'] + PNL_COLUMNS,
+        numeric_columns=['Quantity', 'Par Swap Rate', 'Book DV01', '$ NMV', '$ Overall Cost'] + PNL_COLUMNS,
+        categorical_columns=['Book Name', 'Holding Scenario'],
+        text_columns=['Description', 'Active', 'FundShortName'],
+        fill_values={'Description': ''},
+    ),
+    'Cur': ReportSchema(
+        kind='Cur',
+        required_columns=['Currency', 'Book NMV (Total)'],
+        numeric_columns=['Book NMV (Total)'],
+        categorical_columns=['Currency'],
+    ),
+    'DV0': ReportSchema(
+        kind='DV0',
+        required_columns=['Currency', 'Description', 'Date'],
+        categorical_columns=['Currency'],
+        text_columns=['Description', 'Date'],
+        # The first line of the DV01 export is a title row
+        read_options={'skiprows': 1},
+    ),
+    'VaR': ReportSchema(
+        kind='VaR',
+        required_columns=['Daily Fund CVaR'],
+        numeric_columns=['Daily Fund CVaR'],
+    ),
+}
+
+
+def schema_for_path(file_path):
+    parsed = parse_file_name(os.path.basename(file_path))
+    if parsed is not None:
+        return REPORT_SCHEMAS[parsed[0]]
+    if 'DV0' in file_path:
+        return REPORT_SCHEMAS['DV0']
+    if 'Cur' in file_path:
+        return REPORT_SCHEMAS['Cur']
+    return REPORT_SCHEMAS['']
@@ -3,12 +3,10 @@ import plotly.graph_objects as go
 import streamlit as st
 
 
-def display_metrics(documents):
-    # Convert file_created_at to datetime
-    documents_df = pd.DataFrame(documents)
-    documents_df['file_created_at'] = pd.to_datetime(documents_df['file_created_at'], errors='coerce', utc=True)
-    # Group by file_created_at and count the number of documents
-    documents_by_day = documents_df.groupby(documents_df['file_created_at'].dt.date).size().reset_index(name='count')
+def display_metrics(daily_counts):
+    # [(YYYY-MM-DD, number of documents)] from the document catalog
+    documents_by_day = pd.DataFrame(daily_counts, columns=['file_created_at', 'count'])
+    documents_by_day['file_created_at'] = pd.to_datetime(documents_by_day['file_created_at'], errors='coerce')
     
     # Create the plotly figure
     fig = go.Figure()
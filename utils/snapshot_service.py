@@ -0,0 +1,84 @@
+import threading
+from collections import namedtuple
+
+import streamlit as st
+
+# The same five values get_data() has always returned
+Snapshot = namedtuple('Snapshot', ['update_time', 'data', 'curr_exp_data', 'dv01_data', 'cvar_data'])
+
+
+class SnapshotService:
+    """
+    Process-wide holder of the latest P&L / Cur / DV0 / VaR snapshot.
+
+    Every session reads the same frames, so they must be treated as read-only.
+    `locate` returns the key of the newest snapshot (the four file names) and is
+    cheap; `load` downloads the frames for a key and is only called when the key
+    changes. A daemon thread polls `locate` and swaps in new snapshots once all
+    four frames have loaded, so a session never waits on SharePoint unless
+    nothing has been loaded yet.
+    """
+
+    def __init__(self, locate, load, poll_interval=120):
+        self.locate = locate
+        self.load = load
+        self.poll_interval = poll_interval
+
+        self._lock = threading.Lock()
+        self._key = None
+        self._snapshot = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def snapshot_id(self):
+        return self._key
+
+    def current(self):
+        """Return the latest snapshot, loading it synchronously on first use."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return self.refresh()
+        return snapshot
+
+    def refresh(self):
+        """Load the newest snapshot if its key changed. Returns the current snapshot (or None)."""
+        with self._lock:
+            key = self.locate()
+            if key is None or key == self._key:
+                return self._snapshot
+            snapshot = self.load(key)
+            if snapshot is None or any(frame is None for frame in snapshot[1:]):
+                # Keep serving the previous snapshot; leaving _key alone makes the next refresh retry
+                print(f"Snapshot service: incomplete snapshot for {key}, keeping {self._key}")
+                return self._snapshot
+            # A single reference assignment, so readers never see a half-built snapshot
+            self._key, self._snapshot = key, snapshot
+            print(f"Snapshot service: now serving {key}")
+            return self._snapshot
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="snapshot-refresher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Snapshot refresh failed: {e}")
+
+
+@st.cache_resource
+def get_snapshot_service():
+    # Imported here to avoid a circular import with utils.funcs
+    from utils.funcs import locate_latest_snapshot, load_snapshot
+
+    service = SnapshotService(locate_latest_snapshot, load_snapshot,
+                              poll_interval=st.secrets.get("SNAPSHOT_POLL_SECONDS", 120))
+    service.start()
+    return service
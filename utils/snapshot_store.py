@@ -0,0 +1,204 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+import streamlit as st
+
+from utils.paths import CACHE_DIR
+from utils.report_schemas import SCHEMA_VERSION
+
+# Hourly P&L snapshots are written once and never modified, so a cached copy
+# can be served without asking SharePoint. Everything else is revalidated.
+IMMUTABLE_PATH_PATTERN = re.compile(r'/ProfitLoss/data_\d{4}-\d{2}-\d{2}-\d{2}-\d{2}\.csv$')
+
+
+def is_immutable_path(file_path):
+    return bool(IMMUTABLE_PATH_PATTERN.search(file_path))
+
+
+def write_frame(df, path_stem):
+    """
+    Write a DataFrame next to `path_stem` as Parquet and return the file path.
+    Frames with mixed-type object columns (which Arrow cannot represent) fall
+    back to a pickle so they round-trip unchanged.
+    """
+    parquet_path = path_stem + ".parquet"
+    # Unique per writer, so two threads saving the same content never share a temp file
+    tmp_suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+    tmp_path = parquet_path + tmp_suffix
+    try:
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, parquet_path)
+        return parquet_path
+    except (ValueError, TypeError):
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    pickle_path = path_stem + ".pkl"
+    tmp_path = pickle_path + tmp_suffix
+    df.to_pickle(tmp_path)
+    os.replace(tmp_path, pickle_path)
+    return pickle_path
+
+
+def read_frame(path):
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    return pd.read_pickle(path)
+
+
+class SnapshotStore:
+    """
+    Content-addressed on-disk cache of parsed SharePoint CSVs.
+
+    Each SharePoint path maps to the ETag / Last-Modified it was downloaded with
+    and to a blob named after the SHA-256 of the raw file, so identical files
+    share storage. Blobs are evicted least-recently-used once the store grows
+    past `max_bytes`.
+
+    Entries record the `schema_version` they were parsed with; an entry from any
+    other version is a miss, and its blob is never reused.
+    """
+
+    def __init__(self, root=os.path.join(CACHE_DIR, "snapshots"), max_bytes=512 * 1024 * 1024,
+                 schema_version=SCHEMA_VERSION):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.schema_version = schema_version
+        os.makedirs(os.path.join(root, "blobs"), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, "index.sqlite"), check_same_thread=False)
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                path TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                blob TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(entries)")}
+        if "schema_version" not in columns:
+            # Entries written before versioning are left at 0 and so never match
+            self._db.execute("ALTER TABLE entries ADD COLUMN schema_version INTEGER NOT NULL DEFAULT 0")
+        self._db.commit()
+
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    def lookup(self, file_path):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, last_modified, blob, schema_version FROM entries WHERE path = ?", (file_path,)
+            ).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, blob, schema_version = row
+        if schema_version != self.schema_version or not os.path.exists(blob):
+            self._forget(file_path, blob)
+            return None
+        return {"path": file_path, "etag": etag, "last_modified": last_modified, "blob": blob}
+
+    def load(self, entry, revalidated=False):
+        try:
+            df = read_frame(entry["blob"])
+        except Exception as e:
+            print(f"Discarding unreadable cache entry for {entry['path']}: {e}")
+            self._discard_blob(entry["blob"])
+            return None
+
+        with self._lock:
+            self._db.execute("UPDATE entries SET last_access = ? WHERE path = ?", (time.time(), entry["path"]))
+            self._db.commit()
+            if revalidated:
+                self.revalidated += 1
+            else:
+                self.hits += 1
+        return df
+
+    def save(self, file_path, df, raw_bytes, etag=None, last_modified=None):
+        digest = hashlib.sha256(raw_bytes).hexdigest()
+        stem = os.path.join(self.root, "blobs", f"{digest}.v{self.schema_version}")
+        # Always rewrite the blob: a file already at this name may be a partial or corrupt copy
+        blob = write_frame(df, stem)
+        for stale in (stem + ext for ext in (".parquet", ".pkl")):
+            if stale != blob and os.path.exists(stale):
+                os.remove(stale)
+
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (path, etag, last_modified, blob, size, last_access, schema_version) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (file_path, etag, last_modified, blob, os.path.getsize(blob), time.time(), self.schema_version)
+            )
+            self._db.commit()
+            self.misses += 1
+            self._evict()
+
+    def _discard_blob(self, blob):
+        # Drop a bad blob and every path pointing at it
+        with self._lock:
+            self._db.execute("DELETE FROM entries WHERE blob = ?", (blob,))
+            self._db.commit()
+            if os.path.exists(blob):
+                os.remove(blob)
+
+    def _forget(self, file_path, blob=None):
+        with self._lock:
+            self._db.execute("DELETE FROM entries WHERE path = ?", (file_path,))
+            self._db.commit()
+            # Drop the blob too once no other path shares it
+            if blob and os.path.exists(blob) and not self._db.execute(
+                    "SELECT 1 FROM entries WHERE blob = ? LIMIT 1", (blob,)).fetchone():
+                os.remove(blob)
+
+    def _evict(self):
+        # Caller holds self._lock
+        blobs = self._db.execute(
+            "SELECT blob, MAX(size), MAX(last_access) AS accessed FROM entries GROUP BY blob ORDER BY accessed"
+        ).fetchall()
+        total = sum(size for _, size, _ in blobs)
+        for blob, size, _ in blobs:
+            if total <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM entries WHERE blob = ?", (blob,))
+            if os.path.exists(blob):
+                os.remove(blob)
+            total -= size
+        self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            size = self._db.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM (SELECT MAX(size) AS size FROM entries GROUP BY blob)"
+            ).fetchone()[0]
+        return {
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "entries": entries,
+            "bytes": size,
+        }
+
+
+@st.cache_resource
+def get_snapshot_store():
+    return SnapshotStore()
+
+
+def show_snapshot_cache_stats():
+    stats = get_snapshot_store().stats()
+    st.sidebar.caption(
+        f"Snapshot cache: {stats['hits']} hits, {stats['revalidated']} revalidated, "
+        f"{stats['misses']} misses ({stats['bytes'] / 1e6:,.1f} MB on disk)"
+    )